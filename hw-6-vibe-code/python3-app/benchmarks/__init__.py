@@ -0,0 +1 @@
+"""Benchmarks for the Hospital Management Application storage paths."""
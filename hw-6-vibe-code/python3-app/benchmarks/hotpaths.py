@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Benchmark: storage hot paths, with JSON baselines and a regression check.
+
+Seeds fakeredis (or the Redis at --redis-url; the selected db is flushed)
+with each of --sizes hospitals, doctors and doctor-patient sets and times
+the handler code paths every request goes through:
+
+- get_entity_page: one full page of hospitals through the ID index
+- DoctorPatientHandler.get: one full page of relationships, rendered
+- create_entity: --ops hospital creates through the Lua script
+- get_next_id: --ops IDs from the block allocator
+- render hospital.html: one full page, template only
+- hospital page cached: one full hospital page served from the page cache
+
+Handlers are called directly with a stub connection, so no HTTP server is
+involved. Each scenario runs --repeat times and the median is reported.
+
+--save writes the results to a JSON baseline; --baseline compares a run
+against one and exits with status 1 when a scenario got slower by more than
+--threshold percent. Baselines are keyed by backend and size, so compare
+runs made on the same machine and backend only. For that reason no baseline
+is committed and no CI job runs the check: it is a local gate, comparing a
+change with a baseline saved on the same machine before it.
+
+Usage:
+    python -m benchmarks.hotpaths --sizes 1000 10000 --save baseline.json
+    python -m benchmarks.hotpaths --sizes 1000 10000 --baseline baseline.json --threshold 20
+    python -m benchmarks.hotpaths --sizes 100000 --redis-url redis://localhost:6379/15
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import sys
+import time
+from unittest.mock import Mock, patch
+
+import fakeredis
+import redis
+import tornado.httputil
+from tornado.options import options
+
+import main
+
+
+def seed(redis_conn, rows):
+    """Create rows hospitals, doctors and doctor-patient sets, plus the counters."""
+    redis_conn.flushdb()
+    pipe = redis_conn.pipeline(transaction=False)
+    for i in range(1, rows + 1):
+        pipe.hset(
+            f"{main.KEY_PREFIX_HOSPITAL}{i}",
+            mapping={
+                "name": f"Hospital {i}",
+                "address": "Street",
+                "phone": "1",
+                "beds_number": "100",
+            },
+        )
+        pipe.zadd(main.KEY_INDEX_HOSPITAL, {str(i): i})
+        pipe.hset(
+            f"{main.KEY_PREFIX_DOCTOR}{i}",
+            mapping={"surname": f"Doctor {i}", "profession": "GP", "hospital_ID": i},
+        )
+        pipe.zadd(main.KEY_INDEX_DOCTOR, {str(i): i})
+        pipe.sadd(f"{main.KEY_PREFIX_DOCTOR_PATIENT}{i}", i, i + 1)
+        pipe.zadd(main.KEY_INDEX_DOCTOR_PATIENT, {str(i): i})
+        if i % main.REDIS_PIPELINE_CHUNK_SIZE == 0:
+            pipe.execute()
+    for auto_id_key in (
+        main.KEY_AUTO_ID_HOSPITAL,
+        main.KEY_AUTO_ID_DOCTOR,
+        main.KEY_AUTO_ID_PATIENT,
+        main.KEY_AUTO_ID_DIAGNOSIS,
+    ):
+        pipe.set(auto_id_key, rows + 1)
+    pipe.set(main.KEY_DB_INITIATED, 1)
+    pipe.set(main.KEY_VERSION_HOSPITAL, 1)
+    pipe.execute()
+    for script in main.LUA_SCRIPTS:
+        redis_conn.script_load(script.source)
+    main.id_allocator.reset()
+    main.page_cache.reset()
+
+
+def make_handler(app, handler_class, uri):
+    """Create a handler for a GET of uri whose responses go to a stub connection."""
+    request = tornado.httputil.HTTPServerRequest(
+        method="GET", uri=uri, connection=Mock()
+    )
+    handler = handler_class(app, request)
+    # Normally set by RequestHandler._execute, which is bypassed here
+    handler._transforms = []
+    return handler
+
+
+async def entity_page(app, ops):
+    """Read one full page of hospitals through the ID index."""
+    uri = f"/hospital?limit={main.PAGE_SIZE_MAX}"
+    handler = make_handler(app, main.HospitalHandler, uri)
+    await handler.get_entity_page(main.KEY_PREFIX_HOSPITAL, main.KEY_INDEX_HOSPITAL)
+
+
+async def doctor_patient_page(app, ops):
+    """Read and render one full page of doctor-patient relationships."""
+    uri = f"/doctor-patient?limit={main.PAGE_SIZE_MAX}"
+    await make_handler(app, main.DoctorPatientHandler, uri).get()
+
+
+async def create_entity(app, ops):
+    """Create ops hospitals through the create script."""
+    handler = make_handler(app, main.HospitalHandler, "/hospital")
+    fields = {"name": "New", "address": "Street", "phone": "1", "beds_number": "1"}
+    for _ in range(ops):
+        await handler.create_entity(
+            main.KEY_PREFIX_HOSPITAL,
+            main.KEY_AUTO_ID_HOSPITAL,
+            main.KEY_INDEX_HOSPITAL,
+            fields,
+        )
+
+
+async def get_next_id(app, ops):
+    """Take ops doctor IDs from the block allocator."""
+    handler = make_handler(app, main.HospitalHandler, "/hospital")
+    for _ in range(ops):
+        await handler.get_next_id(main.KEY_AUTO_ID_DOCTOR)
+
+
+def render_page(app, ops):
+    """Return a callable rendering one prefetched full hospital page."""
+    uri = f"/hospital?limit={main.PAGE_SIZE_MAX}"
+    handler = make_handler(app, main.HospitalHandler, uri)
+    page = asyncio.run(
+        handler.get_entity_page(main.KEY_PREFIX_HOSPITAL, main.KEY_INDEX_HOSPITAL)
+    )
+
+    async def render(app, ops):
+        handler.render_string("templates/hospital.html", **page)
+
+    return render
+
+
+def cached_page(app, ops):
+    """Return a callable serving one full hospital page from the page cache."""
+    uri = f"/hospital?limit={main.PAGE_SIZE_MAX}"
+    asyncio.run(make_handler(app, main.HospitalHandler, uri).get())
+
+    async def serve(app, ops):
+        await make_handler(app, main.HospitalHandler, uri).get()
+
+    return serve
+
+
+# (name, coroutine function or factory returning one, factory?)
+SCENARIOS = [
+    ("get_entity_page", entity_page, False),
+    ("DoctorPatientHandler.get", doctor_patient_page, False),
+    ("create_entity", create_entity, False),
+    ("get_next_id", get_next_id, False),
+    ("render hospital.html", render_page, True),
+    ("hospital page cached", cached_page, True),
+]
+
+
+def measure(func, app, ops, repeat):
+    """Run func repeat times and return the median wall time in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        asyncio.run(func(app, ops))
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare results with a baseline.
+
+    Args:
+        results (dict): Scenario key -> median ms of this run
+        baseline (dict): Scenario key -> median ms of the baseline run
+        threshold (float): Allowed slow-down in percent
+
+    Returns:
+        list: (key, baseline_ms, ms, change_percent) of the scenarios that
+        regressed by more than threshold percent
+    """
+    regressions = []
+    for key, ms in results.items():
+        if key not in baseline:
+            continue
+        change = (ms / baseline[key] - 1) * 100
+        if change > threshold:
+            regressions.append((key, baseline[key], ms, change))
+    return regressions
+
+
+def run(argv=None):
+    parser = argparse.ArgumentParser(description="Storage hot path benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--ops", type=int, default=1000, help="creates and IDs per run")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--redis-url", help="benchmark a real Redis (db is flushed)")
+    parser.add_argument("--save", help="write the results to this JSON baseline")
+    parser.add_argument("--baseline", help="compare with this JSON baseline")
+    parser.add_argument(
+        "--threshold", type=float, default=20.0, help="allowed slow-down in percent"
+    )
+    args = parser.parse_args(argv)
+
+    if args.redis_url:
+        client = redis.StrictRedis.from_url(args.redis_url)
+        backend = "redis"
+    else:
+        client = fakeredis.FakeStrictRedis()
+        backend = "fakeredis"
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+
+    print(f"backend={backend} ops={args.ops} repeat={args.repeat}")
+    print(f"{'scenario':<40}{'median ms':>12}{'baseline':>12}{'change':>10}")
+    results = {}
+    with patch("main.r", client), patch("main.REDIS_ASYNC", False):
+        with patch.object(options.mockable(), "profile", "prod"):
+            app = main.make_app()
+        for size in args.sizes:
+            seed(client, size)
+            for name, func, factory in SCENARIOS:
+                if factory:
+                    func = func(app, args.ops)
+                key = f"{backend}/{size}/{name}"
+                results[key] = measure(func, app, args.ops, args.repeat)
+                line = f"{key:<40}{results[key]:>12.2f}"
+                if key in baseline:
+                    change = (results[key] / baseline[key] - 1) * 100
+                    line += f"{baseline[key]:>12.2f}{change:>+9.1f}%"
+                print(line)
+
+    if args.save:
+        with open(args.save, "w") as save_file:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "machine": platform.node(),
+                    "ops": args.ops,
+                    "results": results,
+                },
+                save_file,
+                indent=2,
+                sort_keys=True,
+            )
+        print(f"Saved baseline to {args.save}")
+
+    regressions = compare(results, baseline, args.threshold)
+    for key, baseline_ms, ms, change in regressions:
+        print(
+            f"REGRESSION {key}: {baseline_ms:.2f} ms -> {ms:.2f} ms "
+            f"({change:+.1f}% > {args.threshold:g}%)"
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
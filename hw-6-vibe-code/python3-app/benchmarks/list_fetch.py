@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Benchmark: sequential vs pipelined reads for the list endpoints.
+
+Seeds hospitals and doctor-patient sets (every other doctor has patients),
+then compares the original one-command-per-ID access pattern with the batched
+pipelines (fetch_pipelined) of the list pages: the hospital ID index read at
+once, and the index of linked doctors walked in pages of --page-size as
+read_link_page does. Reports Redis round trips and wall time for both.
+
+fakeredis has no network, so --rtt-ms adds a simulated network delay per
+round trip; use --redis-url to measure against a real Redis instead.
+
+Usage:
+    python -m benchmarks.list_fetch --rows 50000 --rtt-ms 0.2
+    python -m benchmarks.list_fetch --rows 50000 --redis-url redis://localhost:6379/15
+"""
+
+import argparse
+import asyncio
+import time
+
+import fakeredis
+import redis
+
+import main
+
+
+class RoundTripCounter:
+    """Proxy around a sync Redis client that counts network round trips."""
+
+    def __init__(self, client, rtt_seconds=0.0):
+        self.client = client
+        self.rtt_seconds = rtt_seconds
+        self.round_trips = 0
+
+    def _round_trip(self):
+        self.round_trips += 1
+        if self.rtt_seconds:
+            time.sleep(self.rtt_seconds)
+
+    def pipeline(self, *args, **kwargs):
+        pipe = self.client.pipeline(*args, **kwargs)
+        execute = pipe.execute
+
+        def counted_execute(*execute_args, **execute_kwargs):
+            self._round_trip()
+            return execute(*execute_args, **execute_kwargs)
+
+        pipe.execute = counted_execute
+        return pipe
+
+    def __getattr__(self, name):
+        command = getattr(self.client, name)
+
+        def counted_command(*args, **kwargs):
+            self._round_trip()
+            return command(*args, **kwargs)
+
+        return counted_command
+
+
+def seed(redis_conn, rows):
+    """Create rows hospitals and a doctor-patient set for every other doctor ID."""
+    redis_conn.flushdb()
+    pipe = redis_conn.pipeline(transaction=False)
+    for i in range(rows):
+        pipe.hset(
+            f"{main.KEY_PREFIX_HOSPITAL}{i}",
+            mapping={"name": f"Hospital {i}", "address": "Street", "phone": "1"},
+        )
+        pipe.zadd(main.KEY_INDEX_HOSPITAL, {str(i): i})
+        if i % 2 == 0:
+            pipe.sadd(f"{main.KEY_PREFIX_DOCTOR_PATIENT}{i}", i)
+            pipe.zadd(main.KEY_INDEX_DOCTOR_PATIENT, {str(i): i})
+    pipe.set(main.KEY_AUTO_ID_HOSPITAL, rows)
+    pipe.set(main.KEY_AUTO_ID_DOCTOR, rows)
+    pipe.execute()
+
+
+def sequential_hospitals(redis_conn):
+    """Original access pattern: one HGETALL per ID up to autoID."""
+    max_id = int(redis_conn.get(main.KEY_AUTO_ID_HOSPITAL))
+    items = []
+    for i in range(max_id):
+        result = redis_conn.hgetall(f"{main.KEY_PREFIX_HOSPITAL}{i}")
+        if result:
+            items.append(result)
+    return items
+
+
+def pipelined_hospitals(redis_conn, chunk_size):
+    """Current access pattern: ID index plus batched HGETALL pipelines."""
+    entity_ids = redis_conn.zrange(main.KEY_INDEX_HOSPITAL, 0, -1)
+    keys = [f"{main.KEY_PREFIX_HOSPITAL}{i.decode()}" for i in entity_ids]
+    results = asyncio.run(main.fetch_pipelined(redis_conn, "hgetall", keys, chunk_size))
+    return [result for result in results if result]
+
+
+def sequential_links(redis_conn):
+    """Original access pattern: one SMEMBERS per doctor ID."""
+    max_id = int(redis_conn.get(main.KEY_AUTO_ID_DOCTOR))
+    items = {}
+    for i in range(max_id):
+        result = redis_conn.smembers(f"{main.KEY_PREFIX_DOCTOR_PATIENT}{i}")
+        if result:
+            items[i] = result
+    return items
+
+
+def paged_links(redis_conn, chunk_size, page_size):
+    """Current access pattern: pages of the linked-doctor index, batched SMEMBERS."""
+
+    async def read_pages():
+        items = {}
+        cursor = None
+        while True:
+            doctor_ids, cursor, _ = await main.read_id_window(
+                redis_conn, main.KEY_INDEX_DOCTOR_PATIENT, page_size, cursor
+            )
+            keys = [f"{main.KEY_PREFIX_DOCTOR_PATIENT}{i}" for i in doctor_ids]
+            results = await main.fetch_pipelined(
+                redis_conn, "smembers", keys, chunk_size
+            )
+            items.update(
+                (int(i), result) for i, result in zip(doctor_ids, results) if result
+            )
+            if cursor is None:
+                return items
+
+    return asyncio.run(read_pages())
+
+
+def measure(client, rtt_seconds, func, *args):
+    """Run func once through a round trip counter and return (trips, seconds)."""
+    counter = RoundTripCounter(client, rtt_seconds)
+    started = time.perf_counter()
+    result = func(counter, *args)
+    elapsed = time.perf_counter() - started
+    return counter.round_trips, elapsed, len(result)
+
+
+def run(argv=None):
+    parser = argparse.ArgumentParser(description="Sequential vs pipelined list reads")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument(
+        "--chunk-size", type=int, default=main.REDIS_PIPELINE_CHUNK_SIZE
+    )
+    parser.add_argument("--page-size", type=int, default=main.PAGE_SIZE_MAX)
+    parser.add_argument(
+        "--rtt-ms",
+        type=float,
+        default=0.0,
+        help="simulated network latency added per round trip (fakeredis only)",
+    )
+    parser.add_argument("--redis-url", help="benchmark a real Redis (db is flushed)")
+    args = parser.parse_args(argv)
+
+    if args.redis_url:
+        client = redis.StrictRedis.from_url(args.redis_url)
+        rtt_seconds = 0.0
+    else:
+        client = fakeredis.FakeStrictRedis()
+        rtt_seconds = args.rtt_ms / 1000
+
+    seed(client, args.rows)
+
+    print(
+        f"rows={args.rows} chunk_size={args.chunk_size} "
+        f"page_size={args.page_size} rtt_ms={args.rtt_ms}"
+    )
+    print(f"{'scenario':<32}{'rows':>8}{'round trips':>14}{'wall ms':>12}")
+    scenarios = [
+        ("GET /hospital sequential", sequential_hospitals, ()),
+        ("GET /hospital pipelined", pipelined_hospitals, (args.chunk_size,)),
+        ("GET /doctor-patient sequential", sequential_links, ()),
+        (
+            "GET /doctor-patient paged",
+            paged_links,
+            (args.chunk_size, args.page_size),
+        ),
+    ]
+    for name, func, extra in scenarios:
+        trips, elapsed, rows = measure(client, rtt_seconds, func, *extra)
+        print(f"{name:<32}{rows:>8}{trips:>14}{elapsed * 1000:>12.1f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark: GET /hospital latency under the dev and prod runtime profiles.
+
+Serves the application in-process on a local port with fakeredis seeded with
+--rows hospitals and times --requests sequential page loads per profile. The
+dev profile re-parses hospital.html on every render; prod serves it from the
+compiled template cache.
+
+Usage:
+    python -m benchmarks.render --rows 1000 --limit 100 --requests 300
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from unittest.mock import patch
+
+import fakeredis
+import tornado.httpclient
+import tornado.httpserver
+import tornado.netutil
+from tornado.options import options
+
+import main
+
+
+def seed(redis_conn, rows):
+    """Create rows fully populated hospitals registered in the ID index."""
+    pipe = redis_conn.pipeline(transaction=False)
+    for i in range(1, rows + 1):
+        pipe.hset(
+            f"{main.KEY_PREFIX_HOSPITAL}{i}",
+            mapping={
+                "name": f"Hospital {i}",
+                "address": "Street",
+                "phone": "1",
+                "beds_number": "100",
+            },
+        )
+        pipe.zadd(main.KEY_INDEX_HOSPITAL, {str(i): i})
+    pipe.execute()
+
+
+async def measure(profile, requests, path):
+    """Serve the app with one profile and return per-request latencies in ms."""
+    with patch.object(options.mockable(), "profile", profile):
+        app = main.make_app()
+    [sock] = tornado.netutil.bind_sockets(0, "127.0.0.1")
+    server = tornado.httpserver.HTTPServer(app)
+    server.add_sockets([sock])
+    url = f"http://127.0.0.1:{sock.getsockname()[1]}{path}"
+    client = tornado.httpclient.AsyncHTTPClient()
+
+    await client.fetch(url)
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        await client.fetch(url)
+        latencies.append((time.perf_counter() - started) * 1000)
+    server.stop()
+    return latencies
+
+
+def run(argv=None):
+    parser = argparse.ArgumentParser(description="dev vs prod profile rendering")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=100, help="rows per page")
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args(argv)
+
+    client = fakeredis.FakeStrictRedis()
+    seed(client, args.rows)
+    path = f"/hospital?limit={args.limit}"
+
+    print(f"GET {path} rows={args.rows} requests={args.requests}")
+    print(f"{'profile':<10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'req/s':>10}")
+    with patch("main.r", client), patch("main.REDIS_ASYNC", False):
+        for profile in ("dev", "prod"):
+            latencies = asyncio.run(measure(profile, args.requests, path))
+            mean = statistics.mean(latencies)
+            p95 = statistics.quantiles(latencies, n=20)[-1]
+            print(
+                f"{profile:<10}{mean:>10.2f}{statistics.median(latencies):>10.2f}"
+                f"{p95:>10.2f}{1000 / mean:>10.0f}"
+            )
+
+
+if __name__ == "__main__":
+    run()
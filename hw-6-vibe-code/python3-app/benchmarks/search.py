@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark: surname prefix search latency over a large lexicographic index.
+
+Seeds the patient search index with --rows generated surnames (only the
+index, not the patient hashes) and times the /search storage path,
+read_search_matches: one search_prefix pipeline plus the pipelined HGETALL
+of the matches. Prefixes of 1 to 4 characters and full surnames are drawn
+from the seeded names, so short prefixes match hundreds of thousands of
+names and long ones a few.
+
+--compare-scan also times the alternative without an index: reading every
+indexed name and filtering in Python.
+
+Seeding 1M names into fakeredis takes about a minute; use --redis-url to
+measure against a real Redis (the selected db is flushed).
+
+Usage:
+    python -m benchmarks.search --rows 1000000 --queries 200
+    python -m benchmarks.search --rows 100000 --compare-scan
+    python -m benchmarks.search --rows 1000000 --redis-url redis://localhost:6379/15
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import fakeredis
+import redis
+
+import main
+
+SYLLABLES = ["an", "be", "ko", "mi", "ra", "so", "tu", "le", "vi", "do", "ner", "son"]
+
+
+def generate_surnames(rows, seed=1):
+    """Return rows pseudo-random surnames of 2 to 4 syllables."""
+    rng = random.Random(seed)
+    return [
+        "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+        for _ in range(rows)
+    ]
+
+
+def seed(redis_conn, surnames):
+    """Register surnames as patients 1..N in the patient search index."""
+    redis_conn.flushdb()
+    pipe = redis_conn.pipeline(transaction=False)
+    for entity_id, surname in enumerate(surnames, 1):
+        term = main.normalize_search_term(surname)
+        pipe.zadd(main.KEY_SEARCH_PATIENT, {f"{term}\0{entity_id}": 0})
+        if entity_id % 10000 == 0:
+            pipe.execute()
+    pipe.execute()
+
+
+async def indexed_search(redis_conn, prefix, limit):
+    """The /search storage path: prefix range read plus the match hashes."""
+    return await main.read_search_matches(
+        redis_conn, {main.KEY_SEARCH_PATIENT: main.KEY_PREFIX_PATIENT}, prefix, limit
+    )
+
+
+async def scan_search(redis_conn, prefix, limit):
+    """Search without using the index order: read every name and filter."""
+    term = main.normalize_search_term(prefix).encode()
+    members = await main.await_redis(redis_conn.zrange(main.KEY_SEARCH_PATIENT, 0, -1))
+    return [member for member in members if member.startswith(term)][:limit]
+
+
+def percentile(latencies, fraction):
+    """Return the given fraction's percentile of latencies."""
+    return sorted(latencies)[min(int(len(latencies) * fraction), len(latencies) - 1)]
+
+
+def measure(client, search, prefixes, limit):
+    """Run search for every prefix; return latencies (ms) and round trips per query."""
+    stats = main.RedisCallStats()
+    redis_conn = main.InstrumentedRedis(client, stats)
+    latencies = []
+    for prefix in prefixes:
+        started = time.perf_counter()
+        asyncio.run(search(redis_conn, prefix, limit))
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies, stats.round_trips / len(prefixes)
+
+
+def run(argv=None):
+    parser = argparse.ArgumentParser(description="Surname prefix search latency")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=200, help="per prefix length")
+    parser.add_argument("--limit", type=int, default=main.SEARCH_LIMIT_DEFAULT)
+    parser.add_argument(
+        "--compare-scan", action="store_true", help="also time a full index scan"
+    )
+    parser.add_argument("--redis-url", help="benchmark a real Redis (db is flushed)")
+    args = parser.parse_args(argv)
+
+    client = (
+        redis.StrictRedis.from_url(args.redis_url)
+        if args.redis_url
+        else fakeredis.FakeStrictRedis()
+    )
+    surnames = generate_surnames(args.rows)
+    started = time.perf_counter()
+    seed(client, surnames)
+    print(f"rows={args.rows} seeded in {time.perf_counter() - started:.1f}s")
+
+    rng = random.Random(2)
+    scenarios = [("search", indexed_search)]
+    if args.compare_scan:
+        scenarios.append(("scan", scan_search))
+    print(
+        f"{'scenario':<10}{'prefix':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+        f"{'round trips':>13}"
+    )
+    for length in (1, 2, 3, 4, None):
+        names = [rng.choice(surnames) for _ in range(args.queries)]
+        prefixes = [name if length is None else name[:length] for name in names]
+        label = "full" if length is None else str(length)
+        for name, search in scenarios:
+            queries = prefixes if name == "search" else prefixes[:3]
+            latencies, round_trips = measure(client, search, queries, args.limit)
+            print(
+                f"{name:<10}{label:>8}{statistics.median(latencies):>10.2f}"
+                f"{percentile(latencies, 0.95):>10.2f}"
+                f"{percentile(latencies, 0.99):>10.2f}{round_trips:>13.1f}"
+            )
+
+
+if __name__ == "__main__":
+    run()
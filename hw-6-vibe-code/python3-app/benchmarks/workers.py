@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Benchmark: requests per second as the number of worker processes grows.
+
+Starts `main.py --workers N` for each requested N, drives it with load
+generator processes that keep --connections keep-alive connections busy for
+--duration seconds, and reports throughput and the speed-up over the first
+worker count. The server calls init_db() at startup, so a Redis reachable
+through REDIS_HOST / REDIS_PORT is required.
+
+The load generators share the machine with the server: throughput stops
+scaling once workers plus --clients exceed the number of cores.
+
+Usage:
+    python -m benchmarks.workers --workers 1 2 4 --duration 10
+    python -m benchmarks.workers --workers 1 4 --path "/hospital?limit=20"
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+MAIN_PY = os.path.join(os.path.dirname(os.path.dirname(__file__)), "main.py")
+
+
+def wait_for_server(url, timeout):
+    """Poll url until the server answers or timeout seconds have passed."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server at {url} did not start within {timeout}s")
+
+
+async def keep_alive_loop(host, port, path, deadline):
+    """Send requests over one keep-alive connection until deadline."""
+    reader, writer = await asyncio.open_connection(host, port)
+    request = f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode()
+    completed = failed = 0
+    while time.monotonic() < deadline:
+        writer.write(request)
+        head = await reader.readuntil(b"\r\n\r\n")
+        status = int(head.split(b" ", 2)[1])
+        length = 0
+        for line in head.split(b"\r\n")[1:]:
+            name, _, value = line.partition(b":")
+            if name.strip().lower() == b"content-length":
+                length = int(value)
+        await reader.readexactly(length)
+        if status == 200:
+            completed += 1
+        else:
+            failed += 1
+    writer.close()
+    return completed, failed
+
+
+def generate_load(host, port, path, connections, duration):
+    """Run one load generator process; returns (completed, failed)."""
+
+    async def run_connections():
+        deadline = time.monotonic() + duration
+        results = await asyncio.gather(
+            *(keep_alive_loop(host, port, path, deadline) for _ in range(connections))
+        )
+        return tuple(map(sum, zip(*results)))
+
+    return asyncio.run(run_connections())
+
+
+def measure(workers, args):
+    """Start a server with the given worker count and return requests/second."""
+    server = subprocess.Popen(
+        [sys.executable, MAIN_PY, f"--port={args.port}", f"--workers={workers}"],
+        cwd=os.path.dirname(MAIN_PY),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        # Own process group, so the forked workers are stopped with the parent
+        start_new_session=True,
+    )
+    try:
+        wait_for_server(f"http://{args.host}:{args.port}{args.path}", timeout=15)
+        load = (args.host, args.port, args.path, args.connections, args.duration)
+        with multiprocessing.Pool(args.clients) as pool:
+            results = pool.starmap(generate_load, [load] * args.clients)
+    finally:
+        os.killpg(server.pid, signal.SIGTERM)
+        server.wait()
+    completed = sum(result[0] for result in results)
+    failed = sum(result[1] for result in results)
+    return completed / args.duration, failed
+
+
+def run(argv=None):
+    parser = argparse.ArgumentParser(description="Throughput per worker count")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        default=sorted({1, 2, os.cpu_count() or 1}),
+        help="worker counts to measure",
+    )
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--clients", type=int, default=2, help="load processes")
+    parser.add_argument(
+        "--connections", type=int, default=32, help="connections per load process"
+    )
+    parser.add_argument("--path", default="/stats")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8899)
+    args = parser.parse_args(argv)
+
+    print(
+        f"cores={os.cpu_count()} path={args.path} clients={args.clients} "
+        f"connections={args.clients * args.connections} duration={args.duration}s"
+    )
+    print(f"{'workers':>8}{'req/s':>12}{'speed-up':>10}{'errors':>8}")
+    baseline = None
+    for workers in args.workers:
+        rps, failed = measure(workers, args)
+        baseline = baseline or rps
+        print(f"{workers:>8}{rps:>12.0f}{rps / baseline:>9.2f}x{failed:>8}")
+
+
+if __name__ == "__main__":
+    run()
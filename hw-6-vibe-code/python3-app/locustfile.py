@@ -2,19 +2,51 @@
 """
 Locust load testing script for Hospital Management Application.
 
-This script simulates realistic user behavior with gradual load increase
-from 0 to 100 users, testing all major endpoints of the application.
+Each simulated user registers a hospital, a doctor and a patient when it
+starts and remembers the IDs returned in the "OK: ID n" responses. Its tasks
+then mix page views with creates that refer to those IDs: doctors in a known
+hospital, diagnoses of known patients and doctor-patient links, so every
+create exercises the referential checks with valid references.
+
+The load shape is chosen with LOAD_SHAPE (see SHAPES): gradual (default),
+step, spike, soak, or none to use --users/--spawn-rate/--run-time instead.
+LOAD_PEAK_USERS scales every shape and LOAD_SOAK_MINUTES sets the hold time
+of the soak shape.
+
+When the test stops, p50/p95/p99 latency and the error rate of every
+request type are written to PERF_SUMMARY (perf_summary.json) and compared
+with the limits in PERF_THRESHOLDS (perf_thresholds.json). Exceeding a limit
+makes locust exit with status 1, so a headless run works as a pass/fail gate.
 """
 
+import json
 import logging
+import os
 import random
+import re
 
 from locust import HttpUser, LoadTestShape, between, events, task
+from locust.runners import WorkerRunner
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+LOAD_SHAPE = os.environ.get("LOAD_SHAPE", "gradual")
+LOAD_PEAK_USERS = int(os.environ.get("LOAD_PEAK_USERS", "100"))
+LOAD_SOAK_MINUTES = float(os.environ.get("LOAD_SOAK_MINUTES", "60"))
+PERF_THRESHOLDS = os.environ.get(
+    "PERF_THRESHOLDS", os.path.join(os.path.dirname(__file__), "perf_thresholds.json")
+)
+PERF_SUMMARY = os.environ.get("PERF_SUMMARY", "perf_summary.json")
+
+# ID in the response of a successful create ("OK: ID 12 for Smith")
+CREATED_ID = re.compile(rb"OK: ID (\d+)")
+
+SURNAMES = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller"]
+PROFESSIONS = ["Cardiologist", "Surgeon", "Pediatrician", "Neurologist", "Oncologist"]
+DIAGNOSES = ["Flu", "Fracture", "Migraine", "Hypertension", "Asthma"]
+
 
 class HospitalUser(HttpUser):
     """
@@ -27,26 +59,53 @@ class HospitalUser(HttpUser):
 
     def on_start(self):
         """
-        Called when a user starts. Used to initialize data that will be
-        used throughout the user's session.
+        Called when a user starts. Creates one hospital, doctor and patient so
+        that the relationship tasks always have valid IDs to refer to.
         """
-        # Store IDs for created entities to use in relationships
+        # IDs of the entities this user created, used in relationships
         self.hospital_ids = []
         self.doctor_ids = []
         self.patient_ids = []
+        self.diagnosis_ids = []
+        self.create_hospital()
+        self.create_doctor()
+        self.create_patient()
         logger.info(f"New user started: {id(self)}")
 
+    def post_entity(self, path, data, created_ids):
+        """
+        POST a create form and remember the ID of the new entity.
+
+        Args:
+            path (str): Endpoint, also used as the request name
+            data (dict): Form fields
+            created_ids (list): List the new ID is appended to
+        """
+        with self.client.post(path, data=data, catch_response=True) as response:
+            match = CREATED_ID.search(response.content or b"")
+            if response.status_code == 200 and match:
+                created_ids.append(match.group(1).decode())
+                response.success()
+            else:
+                response.failure(
+                    f"{path} create failed: {response.status_code} {response.text[:100]}"
+                )
+
+    def view(self, path):
+        """GET a page and fail the request on any status other than 200."""
+        with self.client.get(path, catch_response=True) as response:
+            if response.status_code == 200:
+                response.success()
+            else:
+                response.failure(f"{path} returned {response.status_code}")
+
     @task(10)
     def view_main_page(self):
         """
         Task: View the main page (highest weight - most frequent action).
         Weight: 10 (executed most often)
         """
-        with self.client.get("/", catch_response=True) as response:
-            if response.status_code == 200:
-                response.success()
-            else:
-                response.failure(f"Main page returned {response.status_code}")
+        self.view("/")
 
     @task(5)
     def view_hospitals(self):
@@ -54,11 +113,7 @@ class HospitalUser(HttpUser):
         Task: View the list of hospitals.
         Weight: 5
         """
-        with self.client.get("/hospital", catch_response=True) as response:
-            if response.status_code == 200:
-                response.success()
-            else:
-                response.failure(f"Hospital list returned {response.status_code}")
+        self.view("/hospital")
 
     @task(3)
     def create_hospital(self):
@@ -72,16 +127,7 @@ class HospitalUser(HttpUser):
             "beds_number": str(random.randint(50, 500)),
             "phone": f"+1-555-{random.randint(1000, 9999)}",
         }
-
-        with self.client.post(
-            "/hospital", data=hospital_data, catch_response=True
-        ) as response:
-            if response.status_code == 200 and b"OK: ID" in response.content:
-                # Extract ID from response if needed
-                response.success()
-                logger.debug(f"Created hospital: {hospital_data['name']}")
-            else:
-                response.failure(f"Hospital creation failed: {response.status_code}")
+        self.post_entity("/hospital", hospital_data, self.hospital_ids)
 
     @task(5)
     def view_doctors(self):
@@ -89,49 +135,21 @@ class HospitalUser(HttpUser):
         Task: View the list of doctors.
         Weight: 5
         """
-        with self.client.get("/doctor", catch_response=True) as response:
-            if response.status_code == 200:
-                response.success()
-            else:
-                response.failure(f"Doctor list returned {response.status_code}")
+        self.view("/doctor")
 
     @task(3)
     def create_doctor(self):
         """
-        Task: Create a new doctor.
+        Task: Create a new doctor working in one of the user's hospitals.
         Weight: 3
         """
-        surnames = [
-            "Smith",
-            "Johnson",
-            "Williams",
-            "Brown",
-            "Jones",
-            "Garcia",
-            "Miller",
-        ]
-        professions = [
-            "Cardiologist",
-            "Surgeon",
-            "Pediatrician",
-            "Neurologist",
-            "Oncologist",
-        ]
-
+        hospital_id = random.choice(self.hospital_ids) if self.hospital_ids else ""
         doctor_data = {
-            "surname": random.choice(surnames),
-            "profession": random.choice(professions),
-            "hospital_ID": "",  # Empty for simplicity, can be populated if tracking IDs
+            "surname": random.choice(SURNAMES),
+            "profession": random.choice(PROFESSIONS),
+            "hospital_ID": hospital_id,
         }
-
-        with self.client.post(
-            "/doctor", data=doctor_data, catch_response=True
-        ) as response:
-            if response.status_code == 200 and b"OK: ID" in response.content:
-                response.success()
-                logger.debug(f"Created doctor: {doctor_data['surname']}")
-            else:
-                response.failure(f"Doctor creation failed: {response.status_code}")
+        self.post_entity("/doctor", doctor_data, self.doctor_ids)
 
     @task(5)
     def view_patients(self):
@@ -139,11 +157,7 @@ class HospitalUser(HttpUser):
         Task: View the list of patients.
         Weight: 5
         """
-        with self.client.get("/patient", catch_response=True) as response:
-            if response.status_code == 200:
-                response.success()
-            else:
-                response.failure(f"Patient list returned {response.status_code}")
+        self.view("/patient")
 
     @task(4)
     def create_patient(self):
@@ -151,23 +165,13 @@ class HospitalUser(HttpUser):
         Task: Create a new patient.
         Weight: 4
         """
-        surnames = ["Doe", "Jane", "Anderson", "Taylor", "Thomas", "Moore", "Martin"]
-
         patient_data = {
-            "surname": random.choice(surnames),
+            "surname": random.choice(["Doe", "Anderson", "Taylor", "Thomas", "Moore"]),
             "born_date": f"{random.randint(1950, 2010)}-{random.randint(1, 12):02d}-{random.randint(1, 28):02d}",
             "sex": random.choice(["M", "F"]),
             "mpn": str(random.randint(100000000, 999999999)),
         }
-
-        with self.client.post(
-            "/patient", data=patient_data, catch_response=True
-        ) as response:
-            if response.status_code == 200 and b"OK: ID" in response.content:
-                response.success()
-                logger.debug(f"Created patient: {patient_data['surname']}")
-            else:
-                response.failure(f"Patient creation failed: {response.status_code}")
+        self.post_entity("/patient", patient_data, self.patient_ids)
 
     @task(3)
     def view_diagnoses(self):
@@ -175,11 +179,22 @@ class HospitalUser(HttpUser):
         Task: View the list of diagnoses.
         Weight: 3
         """
-        with self.client.get("/diagnosis", catch_response=True) as response:
-            if response.status_code == 200:
-                response.success()
-            else:
-                response.failure(f"Diagnosis list returned {response.status_code}")
+        self.view("/diagnosis")
+
+    @task(3)
+    def create_diagnosis(self):
+        """
+        Task: Record a diagnosis of one of the user's patients.
+        Weight: 3
+        """
+        if not self.patient_ids:
+            return
+        diagnosis_data = {
+            "patient_ID": random.choice(self.patient_ids),
+            "type": random.choice(DIAGNOSES),
+            "information": "Load test",
+        }
+        self.post_entity("/diagnosis", diagnosis_data, self.diagnosis_ids)
 
     @task(2)
     def view_doctor_patient_relations(self):
@@ -187,37 +202,88 @@ class HospitalUser(HttpUser):
         Task: View doctor-patient relationships.
         Weight: 2 (least frequent read operation)
         """
-        with self.client.get("/doctor-patient", catch_response=True) as response:
-            if response.status_code == 200:
+        self.view("/doctor-patient")
+
+    @task(2)
+    def link_doctor_patient(self):
+        """
+        Task: Link one of the user's doctors to one of the user's patients.
+        Weight: 2
+        """
+        if not self.doctor_ids or not self.patient_ids:
+            return
+        link_data = {
+            "doctor_ID": random.choice(self.doctor_ids),
+            "patient_ID": random.choice(self.patient_ids),
+        }
+        with self.client.post(
+            "/doctor-patient", data=link_data, catch_response=True
+        ) as response:
+            if response.status_code == 200 and b"OK" in response.content:
                 response.success()
             else:
-                response.failure(f"Doctor-patient list returned {response.status_code}")
+                response.failure(f"Link creation failed: {response.status_code}")
 
 
-# Custom load shape for gradual increase to 100 users
-class GradualLoadShape(LoadTestShape):
+def shape_stages(shape, peak, soak_minutes):
     """
-    Custom load shape that gradually increases users from 0 to 100 over 5 minutes,
-    holds at 100 for 3 minutes, then gradually decreases.
+    Build the stages of a load shape.
 
-    Timeline:
-    - 0-5 min: Ramp up from 0 to 100 users
-    - 5-8 min: Hold at 100 users (peak load)
-    - 8-10 min: Ramp down to 0 users
-    """
+    Args:
+        shape (str): Shape name (see SHAPES)
+        peak (int): Highest number of users
+        soak_minutes (float): Time the soak shape holds the peak
 
-    stages = [
-        # (duration_seconds, target_user_count, spawn_rate)
-        {"duration": 60, "users": 20, "spawn_rate": 1},  # 0-1 min: 20 users
-        {"duration": 120, "users": 40, "spawn_rate": 1},  # 1-2 min: 40 users
-        {"duration": 180, "users": 60, "spawn_rate": 1},  # 2-3 min: 60 users
-        {"duration": 240, "users": 80, "spawn_rate": 1},  # 3-4 min: 80 users
-        {"duration": 300, "users": 100, "spawn_rate": 1},  # 4-5 min: 100 users (peak)
-        {"duration": 480, "users": 100, "spawn_rate": 0},  # 5-8 min: Hold at 100
-        {"duration": 540, "users": 50, "spawn_rate": 2},  # 8-9 min: Down to 50
-        {"duration": 600, "users": 0, "spawn_rate": 2},  # 9-10 min: Down to 0
+    Returns:
+        list: (end_second, users, spawn_rate) tuples in order
+    """
+    if shape == "step":
+        # Five equal steps of one minute each, then a minute at the peak
+        step = max(peak // 5, 1)
+        return [(60 * n, min(step * n, peak), step) for n in range(1, 6)] + [
+            (360, peak, step)
+        ]
+    if shape == "spike":
+        # Quiet baseline, sudden spike to the peak, then recovery
+        base = max(peak // 10, 1)
+        return [
+            (60, base, base),
+            (90, peak, peak),
+            (180, base, peak),
+            (240, base, base),
+        ]
+    if shape == "soak":
+        # Ramp up for two minutes and hold the peak for a long time
+        ramp = max(peak / 120, 1)
+        return [(120, peak, ramp), (120 + soak_minutes * 60, peak, ramp)]
+    # gradual: ramp to the peak over 5 minutes, hold 3, ramp down over 2
+    return [
+        (60, peak // 5, 1),
+        (120, peak * 2 // 5, 1),
+        (180, peak * 3 // 5, 1),
+        (240, peak * 4 // 5, 1),
+        (300, peak, 1),
+        (480, peak, 1),
+        (540, peak // 2, 2),
+        (600, 0, 2),
     ]
 
+
+SHAPES = ("gradual", "step", "spike", "soak", "none")
+
+
+class StagedLoadShape(LoadTestShape):
+    """
+    Load shape selected by LOAD_SHAPE and scaled to LOAD_PEAK_USERS users.
+
+    - gradual: 0-5 min ramp up to the peak, 5-8 min hold, 8-10 min ramp down
+    - step: +20% of the peak every minute, then one minute at the peak
+    - spike: 10% baseline, jump to the peak for 30 s, recover at 10%
+    - soak: 2 min ramp up, then LOAD_SOAK_MINUTES at the peak
+    """
+
+    stages = shape_stages(LOAD_SHAPE, LOAD_PEAK_USERS, LOAD_SOAK_MINUTES)
+
     def tick(self):
         """
         Returns a tuple with the current number of users and spawn rate.
@@ -225,13 +291,70 @@ class GradualLoadShape(LoadTestShape):
         """
         run_time = self.get_run_time()
 
-        for stage in self.stages:
-            if run_time < stage["duration"]:
-                return (stage["users"], stage["spawn_rate"])
+        for end, users, spawn_rate in self.stages:
+            if run_time < end:
+                return (users, spawn_rate)
 
         return None  # Test is complete
 
 
+if LOAD_SHAPE not in SHAPES:
+    raise ValueError(f"LOAD_SHAPE must be one of {', '.join(SHAPES)}")
+if LOAD_SHAPE == "none":
+    # Without a shape class Locust uses --users, --spawn-rate and --run-time
+    del StagedLoadShape
+
+
+def summarize(stats):
+    """
+    Latency percentiles and error rate of every request type.
+
+    Args:
+        stats: environment.stats of the finished run
+
+    Returns:
+        dict: "METHOD name" (and "Aggregated") -> requests, p50, p95 and p99
+        in milliseconds and error_rate as a fraction
+    """
+    entries = {
+        f"{entry.method} {entry.name}": entry for entry in stats.entries.values()
+    }
+    entries["Aggregated"] = stats.total
+    return {
+        name: {
+            "requests": entry.num_requests,
+            "p50": entry.get_response_time_percentile(0.5),
+            "p95": entry.get_response_time_percentile(0.95),
+            "p99": entry.get_response_time_percentile(0.99),
+            "error_rate": entry.fail_ratio,
+        }
+        for name, entry in entries.items()
+    }
+
+
+def check_thresholds(summary, thresholds):
+    """
+    Compare a run summary with the stored limits.
+
+    Args:
+        summary (dict): Output of summarize
+        thresholds (dict): Request type -> maximum p50/p95/p99/error_rate;
+            request types that were not sent are skipped
+
+    Returns:
+        list: Human readable description of every exceeded limit
+    """
+    violations = []
+    for name, limits in thresholds.items():
+        measured = summary.get(name)
+        if not measured or not measured["requests"]:
+            continue
+        for metric, limit in limits.items():
+            if measured[metric] > limit:
+                violations.append(f"{name} {metric}={measured[metric]:g} > {limit:g}")
+    return violations
+
+
 # Event listeners for custom metrics
 @events.test_start.add_listener
 def on_test_start(environment, **kwargs):
@@ -239,8 +362,7 @@ def on_test_start(environment, **kwargs):
     logger.info("=" * 60)
     logger.info("LOAD TEST STARTED")
     logger.info("Target: Hospital Management Application")
-    logger.info("Max Users: 100")
-    logger.info("Duration: ~10 minutes")
+    logger.info(f"Shape: {LOAD_SHAPE}, peak users: {LOAD_PEAK_USERS}")
     logger.info("=" * 60)
 
 
@@ -249,10 +371,33 @@ def on_test_stop(environment, **kwargs):
     """Called when the test stops."""
     logger.info("=" * 60)
     logger.info("LOAD TEST COMPLETED")
-    logger.info("Check the web UI or generated reports for detailed metrics")
+    logger.info(f"Latency percentiles and error rates written to {PERF_SUMMARY}")
     logger.info("=" * 60)
 
 
+@events.quitting.add_listener
+def on_quitting(environment, **kwargs):
+    """
+    Write the run summary and set the exit code from the thresholds.
+
+    With a thresholds file the limits (including error_rate) decide the
+    exit code; without one Locust's default applies (1 if any request failed).
+    """
+    if isinstance(environment.runner, WorkerRunner):
+        return  # Only the master has the complete statistics
+    summary = summarize(environment.stats)
+    with open(PERF_SUMMARY, "w") as summary_file:
+        json.dump(summary, summary_file, indent=2, sort_keys=True)
+
+    if not os.path.exists(PERF_THRESHOLDS):
+        return
+    with open(PERF_THRESHOLDS) as thresholds_file:
+        violations = check_thresholds(summary, json.load(thresholds_file))
+    for violation in violations:
+        logger.error(f"Threshold exceeded: {violation}")
+    environment.process_exit_code = 1 if violations else 0
+
+
 # Optional: Add custom metrics tracking
 @events.request.add_listener
 def on_request(request_type, name, response_time, response_length, exception, **kwargs):
@@ -6,16 +6,67 @@ A Tornado-based web application for managing hospitals, doctors, patients,
 diagnoses, and doctor-patient relationships using Redis as the data store.
 """
 
+import asyncio
+import bisect
+import collections
+import csv
+import hashlib
+import inspect
+import io
+import json
 import logging
 import os
 import redis
+import redis.asyncio
+import socket
+import threading
+import time
+import tornado.autoreload
+import tornado.httpserver
 import tornado.ioloop
+import tornado.iostream
+import tornado.netutil
+import tornado.options
+import tornado.process
 import tornado.web
 
 # Configuration constants
 PORT = 8888
 REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.environ.get("REDIS_PORT", "6379"))
+# Use the non-blocking redis.asyncio client (set REDIS_ASYNC=0 for the sync one)
+REDIS_ASYNC = os.environ.get("REDIS_ASYNC", "1") == "1"
+REDIS_POOL_SIZE = int(os.environ.get("REDIS_POOL_SIZE", "50"))
+REDIS_POOL_TIMEOUT = int(os.environ.get("REDIS_POOL_TIMEOUT", "20"))
+# Maximum number of commands sent in one pipeline by bulk reads
+REDIS_PIPELINE_CHUNK_SIZE = int(os.environ.get("REDIS_PIPELINE_CHUNK_SIZE", "500"))
+# Rows per list page when no limit is requested, and the largest allowed limit
+PAGE_SIZE_DEFAULT = int(os.environ.get("PAGE_SIZE_DEFAULT", "100"))
+PAGE_SIZE_MAX = int(os.environ.get("PAGE_SIZE_MAX", "1000"))
+# Matches returned by /search without a limit parameter, and the largest limit
+SEARCH_LIMIT_DEFAULT = int(os.environ.get("SEARCH_LIMIT_DEFAULT", "10"))
+SEARCH_LIMIT_MAX = int(os.environ.get("SEARCH_LIMIT_MAX", "100"))
+# Number of IDs each process reserves per autoID counter with one INCRBY
+ID_BLOCK_SIZE = int(os.environ.get("ID_BLOCK_SIZE", "1000"))
+# Rows written per pipeline by bulk imports, largest accepted upload in bytes,
+# largest row (line, or lines of a quoted CSV record) in bytes and number of
+# row errors listed in an import report
+IMPORT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", "1000"))
+IMPORT_MAX_BODY_SIZE = int(os.environ.get("IMPORT_MAX_BODY_SIZE", str(10 * 1024**3)))
+IMPORT_MAX_ROW_SIZE = int(os.environ.get("IMPORT_MAX_ROW_SIZE", str(64 * 1024)))
+IMPORT_MAX_ERRORS = int(os.environ.get("IMPORT_MAX_ERRORS", "1000"))
+# IDs read from an ID index per window (and flushed per chunk) by exports
+EXPORT_WINDOW_SIZE = int(os.environ.get("EXPORT_WINDOW_SIZE", "1000"))
+# Rendered list pages kept per process (0 disables the cache) and seconds a
+# cached page is served before it is rendered again
+PAGE_CACHE_SIZE = int(os.environ.get("PAGE_CACHE_SIZE", "256"))
+PAGE_CACHE_TTL = float(os.environ.get("PAGE_CACHE_TTL", "30"))
+# Keys of entities known to exist kept per process for referential checks
+# (0 disables the cache)
+KNOWN_ENTITIES_SIZE = int(os.environ.get("KNOWN_ENTITIES_SIZE", "100000"))
+# Entity hashes kept per process by the client-side cache, which needs Redis
+# 6 or later (0, the default, leaves it off)
+CLIENT_CACHE_SIZE = int(os.environ.get("CLIENT_CACHE_SIZE", "0"))
 
 # Redis key prefixes
 KEY_PREFIX_HOSPITAL = "hospital:"
@@ -23,21 +74,2006 @@ KEY_PREFIX_DOCTOR = "doctor:"
 KEY_PREFIX_PATIENT = "patient:"
 KEY_PREFIX_DIAGNOSIS = "diagnosis:"
 KEY_PREFIX_DOCTOR_PATIENT = "doctor-patient:"
+# Reverse reference indexes: set of the IDs of the doctors of one hospital,
+# of the diagnoses of one patient and of the doctors treating one patient
+KEY_PREFIX_HOSPITAL_DOCTOR = "hospital-doctor:"
+KEY_PREFIX_PATIENT_DIAGNOSIS = "patient-diagnosis:"
+KEY_PREFIX_PATIENT_DOCTOR = "patient-doctor:"
 KEY_AUTO_ID_HOSPITAL = "hospital:autoID"
 KEY_AUTO_ID_DOCTOR = "doctor:autoID"
 KEY_AUTO_ID_PATIENT = "patient:autoID"
 KEY_AUTO_ID_DIAGNOSIS = "diagnosis:autoID"
+# Sorted sets of existing entity IDs (score = ID, so members are in creation order)
+KEY_INDEX_HOSPITAL = "hospital:ids"
+KEY_INDEX_DOCTOR = "doctor:ids"
+KEY_INDEX_PATIENT = "patient:ids"
+KEY_INDEX_DIAGNOSIS = "diagnosis:ids"
+# Sorted set of the IDs of the doctors with at least one linked patient
+KEY_INDEX_DOCTOR_PATIENT = "doctor-patient:ids"
+# Hash of medical policy number -> patient ID, one entry per patient
+KEY_UNIQUE_MPN = "patient:mpn"
+# Lexicographic surname indexes: sorted sets with score 0 and members
+# "<casefolded surname>\0<ID>", searched by prefix with ZRANGEBYLEX
+KEY_SEARCH_PATIENT = "patient:surnames"
+KEY_SEARCH_DOCTOR = "doctor:surnames"
+# Change counters of each entity type, incremented by every create or link
+KEY_VERSION_HOSPITAL = "hospital:version"
+KEY_VERSION_DOCTOR = "doctor:version"
+KEY_VERSION_PATIENT = "patient:version"
+KEY_VERSION_DIAGNOSIS = "diagnosis:version"
+KEY_VERSION_DOCTOR_PATIENT = "doctor-patient:version"
+VERSION_KEYS = [
+    KEY_VERSION_HOSPITAL,
+    KEY_VERSION_DOCTOR,
+    KEY_VERSION_PATIENT,
+    KEY_VERSION_DIAGNOSIS,
+    KEY_VERSION_DOCTOR_PATIENT,
+]
 KEY_DB_INITIATED = "db_initiated"
+# Key prefixes of the entity hashes held by the client-side cache
+CLIENT_CACHE_PREFIXES = [
+    KEY_PREFIX_HOSPITAL,
+    KEY_PREFIX_DOCTOR,
+    KEY_PREFIX_PATIENT,
+    KEY_PREFIX_DIAGNOSIS,
+]
+# Pub/sub channel Redis publishes key invalidations on for RESP2 clients
+TRACKING_CHANNEL = "__redis__:invalidate"
+
+# Server-side Lua script creating an entity in one atomic round trip: check the
+# referenced entity, claim the unique value, write the hash and register the
+# ID in the ID index, the search index and the referenced entity's reverse
+# index, and bump the entity type's version.
+# Returns {id, value of the requested referenced field}, nil when the
+# referenced entity does not exist, or {nil, ID of the entity already holding
+# the unique value}.
+# KEYS: entity key, ID index, referenced entity key ("" for none),
+#       unique index hash ("" for none), search index ("" for none),
+#       reverse index set of the referenced entity ("" for none),
+#       version counter ("" for none)
+# ARGV: entity ID, referenced field to return ("" for none), unique value,
+#       search term, field/value pairs of the new entity
+CREATE_ENTITY_LUA = """
+local unpack = unpack or table.unpack
+if KEYS[3] ~= '' and redis.call('EXISTS', KEYS[3]) == 0 then
+    return false
+end
+if KEYS[4] ~= '' then
+    local holder = redis.call('HGET', KEYS[4], ARGV[3])
+    if holder then
+        return {false, holder}
+    end
+    redis.call('HSET', KEYS[4], ARGV[3], ARGV[1])
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 5))
+redis.call('ZADD', KEYS[2], ARGV[1], ARGV[1])
+if KEYS[5] ~= '' then
+    redis.call('ZADD', KEYS[5], 0, ARGV[4] .. '\\0' .. ARGV[1])
+end
+if KEYS[6] ~= '' then
+    redis.call('SADD', KEYS[6], ARGV[1])
+end
+if KEYS[7] ~= '' then
+    redis.call('INCR', KEYS[7])
+end
+local reference_value = false
+if ARGV[2] ~= '' then
+    reference_value = redis.call('HGET', KEYS[3], ARGV[2])
+end
+return {ARGV[1], reference_value}
+"""
+
+# Server-side Lua script finding an entity through a unique index in one round
+# trip. Returns {id, flat field/value list of the entity}, or nil when no
+# entity holds the value.
+# KEYS: unique index hash
+# ARGV: unique value, entity key prefix
+# The entity key is only known once the ID is read, so it is built from the
+# prefix instead of being declared in KEYS. Like CREATE_ENTITY_LUA, which
+# writes keys of several slots, this needs a single Redis node, not a cluster.
+FIND_UNIQUE_LUA = """
+local entity_id = redis.call('HGET', KEYS[1], ARGV[1])
+if not entity_id then
+    return false
+end
+return {entity_id, redis.call('HGETALL', ARGV[2] .. entity_id)}
+"""
+
+# Server-side Lua script reserving a block of IDs from an initialized autoID
+# counter. Returns the counter value after the reservation.
+# KEYS: autoID counter
+# ARGV: block size
+RESERVE_IDS_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return redis.error_reply('ERR autoID key ' .. KEYS[1] .. ' not found')
+end
+return redis.call('INCRBY', KEYS[1], ARGV[1])
+"""
+
+# Directories of the page templates and static files, next to this module
+# like the templates Tornado renders (not relative to the working directory)
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE_DIR = os.path.join(APP_DIR, "templates")
+STATIC_DIR = os.path.join(APP_DIR, "static")
+
+# Valid sex values for patients
+VALID_SEX_VALUES = ["M", "F"]
+
+# Formats of bulk imports and exports, and the Content-Type of each
+IMPORT_FORMAT_CSV = "csv"
+IMPORT_FORMAT_NDJSON = "ndjson"
+IMPORT_FORMATS = [IMPORT_FORMAT_CSV, IMPORT_FORMAT_NDJSON]
+CONTENT_TYPES = {
+    IMPORT_FORMAT_CSV: "text/csv; charset=UTF-8",
+    IMPORT_FORMAT_NDJSON: "application/x-ndjson",
+}
+
+# Error messages
+ERROR_REDIS_CONNECTION = "Redis connection refused"
+ERROR_SOMETHING_WRONG = "Something went terribly wrong"
+ERROR_INVALID_LIMIT = f"Limit must be an integer between 1 and {PAGE_SIZE_MAX}"
+ERROR_INVALID_CURSOR = "Invalid cursor"
+ERROR_INVALID_SEARCH_LIMIT = (
+    f"Limit must be an integer between 1 and {SEARCH_LIMIT_MAX}"
+)
+ERROR_INVALID_IMPORT_FORMAT = (
+    f"Import format must be one of: {', '.join(IMPORT_FORMATS)}"
+)
+ERROR_IMPORT_ROW_TOO_LONG = f"Row longer than {IMPORT_MAX_ROW_SIZE} bytes"
+
+# Pagination cursor prefixes: the page starts after / ends before the given ID
+CURSOR_AFTER = "after:"
+CURSOR_BEFORE = "before:"
+
+# Runtime profiles: values of the profile-dependent options below when they
+# are not set explicitly. dev re-reads templates and reloads code on change;
+# prod caches templates and static files, bounds idle connections and
+# Redis socket waits and ignores requests to log their Redis trace.
+PROFILES = {
+    "dev": {
+        "debug": True,
+        "template_cache": False,
+        "static_cache_max_age": 0,
+        "idle_connection_timeout": 3600.0,
+        "redis_socket_timeout": None,
+        "redis_socket_connect_timeout": None,
+        "trace_log": True,
+    },
+    "prod": {
+        "debug": False,
+        "template_cache": True,
+        "static_cache_max_age": 86400,
+        "idle_connection_timeout": 75.0,
+        "redis_socket_timeout": 5.0,
+        "redis_socket_connect_timeout": 2.0,
+        "trace_log": False,
+    },
+}
+
+
+def env_option(name, option_type):
+    """
+    Read the default of a runtime option from the environment.
+
+    Args:
+        name (str): Environment variable name
+        option_type (type): Option type (int, float or bool)
+
+    Returns:
+        The converted value, or None when the variable is not set
+    """
+    value = os.environ.get(name)
+    if value is None:
+        return None
+    if option_type is bool:
+        return value.lower() in ("1", "true", "yes", "on")
+    return option_type(value)
+
+
+# Runtime options: set on the command line (--name=value) or through the
+# environment variable given as default. Options defaulting to None take
+# their value from the selected profile (see get_setting).
+tornado.options.define(
+    "profile", default=os.environ.get("APP_PROFILE", "dev"), help="dev or prod"
+)
+tornado.options.define(
+    "port", default=int(os.environ.get("PORT", PORT)), type=int, help="Port"
+)
+tornado.options.define(
+    "workers",
+    default=int(os.environ.get("WORKERS", "1")),
+    type=int,
+    help="Worker processes to pre-fork (0 = one per CPU core); "
+    "more than one worker disables debug mode",
+)
+tornado.options.define(
+    "debug",
+    default=env_option("DEBUG", bool),
+    type=bool,
+    help="Debug mode (default: from profile)",
+)
+tornado.options.define(
+    "template_cache",
+    default=env_option("TEMPLATE_CACHE", bool),
+    type=bool,
+    help="Cache compiled templates (default: from profile)",
+)
+tornado.options.define(
+    "static_cache_max_age",
+    default=env_option("STATIC_CACHE_MAX_AGE", int),
+    type=int,
+    help="Cache-Control max-age of static files in seconds (default: from profile)",
+)
+tornado.options.define(
+    "max_buffer_size",
+    default=int(os.environ.get("MAX_BUFFER_SIZE", str(100 * 1024**2))),
+    type=int,
+    help="Largest request body buffered in memory in bytes",
+)
+tornado.options.define(
+    "idle_connection_timeout",
+    default=env_option("IDLE_CONNECTION_TIMEOUT", float),
+    type=float,
+    help="Seconds before idle keep-alive connections are closed (default: from profile)",
+)
+tornado.options.define(
+    "redis_pool_size",
+    default=REDIS_POOL_SIZE,
+    type=int,
+    help="Connections in the asyncio Redis pool of each worker",
+)
+tornado.options.define(
+    "redis_pool_timeout",
+    default=REDIS_POOL_TIMEOUT,
+    type=int,
+    help="Seconds to wait for a free pooled Redis connection",
+)
+tornado.options.define(
+    "redis_socket_timeout",
+    default=env_option("REDIS_SOCKET_TIMEOUT", float),
+    type=float,
+    help="Seconds to wait for a Redis reply (default: from profile)",
+)
+tornado.options.define(
+    "redis_socket_connect_timeout",
+    default=env_option("REDIS_SOCKET_CONNECT_TIMEOUT", float),
+    type=float,
+    help="Seconds to wait for a Redis connection (default: from profile)",
+)
+tornado.options.define(
+    "trace_log",
+    default=env_option("TRACE_LOG", bool),
+    type=bool,
+    help="Let requests log their Redis trace with X-Redis-Trace: log "
+    "(default: from profile)",
+)
+
+
+def get_setting(name):
+    """
+    Resolve a profile-dependent runtime option.
+
+    Args:
+        name (str): Option name (a key of the PROFILES entries)
+
+    Returns:
+        The option's value when set on the command line or in the
+        environment, otherwise the value of the selected profile
+
+    Raises:
+        tornado.options.Error: If the selected profile does not exist
+    """
+    value = tornado.options.options[name]
+    if value is not None:
+        return value
+    profile = tornado.options.options.profile
+    if profile not in PROFILES:
+        raise tornado.options.Error(
+            f"Unknown profile {profile!r}, expected one of: {', '.join(PROFILES)}"
+        )
+    return PROFILES[profile][name]
+
+
+# Initialize Redis connection (rebuilt from the runtime options by configure_redis)
+r = redis.StrictRedis(host=REDIS_HOST, port=REDIS_PORT, db=0)
+
+# Pooled asyncio Redis client, created lazily by get_async_redis()
+async_r = None
+
+
+def get_async_redis():
+    """
+    Get the pooled asyncio Redis client, creating it on first use.
+
+    The client is created lazily so that it is bound to the running IOLoop
+    and never shared between forked worker processes.
+
+    Returns:
+        redis.asyncio.StrictRedis: The asyncio Redis client
+    """
+    global async_r
+    if async_r is None:
+        pool = redis.asyncio.BlockingConnectionPool(
+            host=REDIS_HOST,
+            port=REDIS_PORT,
+            db=0,
+            max_connections=tornado.options.options.redis_pool_size,
+            timeout=tornado.options.options.redis_pool_timeout,
+            socket_timeout=get_setting("redis_socket_timeout"),
+            socket_connect_timeout=get_setting("redis_socket_connect_timeout"),
+        )
+        async_r = redis.asyncio.StrictRedis(connection_pool=pool)
+    return async_r
+
+
+def configure_redis():
+    """
+    Recreate the Redis clients with the socket timeouts of the runtime options.
+
+    The module-level client is created at import time, before the command
+    line is parsed, so the entry point calls this once options are final.
+    The asyncio client is created again on first use.
+    """
+    global r, async_r
+    r = redis.StrictRedis(
+        host=REDIS_HOST,
+        port=REDIS_PORT,
+        db=0,
+        socket_timeout=get_setting("redis_socket_timeout"),
+        socket_connect_timeout=get_setting("redis_socket_connect_timeout"),
+    )
+    async_r = None
+
+
+async def await_redis(result):
+    """
+    Resolve the result of a Redis call made with either client.
+
+    The asyncio client returns awaitables while the sync client returns
+    values directly, so handlers wrap every call with this helper to stay
+    agnostic of the selected client.
+
+    Args:
+        result: Return value of a Redis client or pipeline call
+
+    Returns:
+        The Redis reply
+    """
+    if inspect.isawaitable(result):
+        return await result
+    return result
+
+
+async def fetch_pipelined(redis_conn, command, keys, chunk_size=None, args=()):
+    """
+    Run one read command for many keys in batched pipelines.
+
+    Keys are sent in non-transactional pipelines of at most chunk_size
+    commands, so N reads cost ceil(N / chunk_size) round trips instead of N.
+
+    Args:
+        redis_conn: Redis client (sync or asyncio)
+        command (str): Name of the read command (e.g., "hgetall", "smembers")
+        keys (list): Redis keys to read
+        chunk_size (int): Commands per pipeline (defaults to REDIS_PIPELINE_CHUNK_SIZE)
+        args (tuple): Arguments sent after each key (e.g., the field of "hget")
+
+    Returns:
+        list: Replies in the same order as keys
+    """
+    chunk_size = chunk_size or REDIS_PIPELINE_CHUNK_SIZE
+    results = []
+    for start in range(0, len(keys), chunk_size):
+        pipe = redis_conn.pipeline(transaction=False)
+        for key in keys[start : start + chunk_size]:
+            getattr(pipe, command)(key, *args)
+        results.extend(await await_redis(pipe.execute()))
+    return results
+
+
+async def fetch_entities(redis_conn, entity_keys):
+    """
+    Read entity hashes, serving the ones held by client_cache from memory.
+
+    Hashes missing from the cache (or all of them while it is not tracking)
+    are read with fetch_pipelined and stored in the cache.
+
+    Args:
+        redis_conn: Redis client (sync or asyncio)
+        entity_keys (list): Keys of the entity hashes
+
+    Returns:
+        list: HGETALL replies in the order of entity_keys (empty dicts for
+        missing entities)
+    """
+    if not client_cache.tracking:
+        return await fetch_pipelined(redis_conn, "hgetall", entity_keys)
+    records = client_cache.get_many(entity_keys)
+    missing_keys = [key for key in entity_keys if key not in records]
+    if missing_keys:
+        client_cache.begin(missing_keys)
+        results = None
+        try:
+            results = await fetch_pipelined(redis_conn, "hgetall", missing_keys)
+        finally:
+            client_cache.end(missing_keys, results)
+        records.update(zip(missing_keys, results))
+    return [records[key] for key in entity_keys]
+
+
+async def search_prefix(redis_conn, search_keys, prefix, limit):
+    """
+    Find the entities whose search term starts with a prefix.
+
+    Reads at most limit members of every search index with ZRANGEBYLEX in one
+    pipeline, so the cost depends on limit and not on the number of indexed
+    entities.
+
+    Args:
+        redis_conn: Redis client (sync or asyncio)
+        search_keys (list): Search indexes to query (e.g., ["patient:surnames"])
+        prefix (str): Prefix to match, normalized with normalize_search_term
+        limit (int): Maximum number of matches
+
+    Returns:
+        list: (search_key, entity_id) pairs of the first limit matches,
+        ordered by term across all indexes
+    """
+    term = normalize_search_term(prefix).encode()
+    pipe = redis_conn.pipeline(transaction=False)
+    for search_key in search_keys:
+        # 0xff never occurs in UTF-8, so it sorts after every term with the prefix
+        pipe.zrangebylex(
+            search_key, b"[" + term, b"[" + term + b"\xff", start=0, num=limit
+        )
+    replies = await await_redis(pipe.execute())
+
+    matches = []
+    for search_key, members in zip(search_keys, replies):
+        for member in members:
+            indexed_term, _, entity_id = member.rpartition(b"\0")
+            matches.append((indexed_term, search_key, entity_id.decode()))
+    matches.sort(key=lambda match: match[:2])
+    return [(search_key, entity_id) for _, search_key, entity_id in matches[:limit]]
+
+
+def decode_record(entity_id, record):
+    """
+    Convert an entity hash read from Redis into a JSON-ready dictionary.
+
+    Args:
+        entity_id (str): ID of the entity
+        record (dict): HGETALL reply with bytes field names and values
+
+    Returns:
+        dict: {"id": entity_id, field: value, ...} with str values
+    """
+    result = {"id": entity_id}
+    result.update((field.decode(), value.decode()) for field, value in record.items())
+    return result
+
+
+def parse_cursor(cursor):
+    """
+    Split a pagination cursor into its direction and boundary ID.
+
+    Args:
+        cursor (str): Cursor such as "after:12" or "before:40"
+
+    Returns:
+        tuple: (prefix, entity_id) where prefix is CURSOR_AFTER or CURSOR_BEFORE
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    for prefix in (CURSOR_AFTER, CURSOR_BEFORE):
+        if cursor.startswith(prefix):
+            return prefix, int(cursor[len(prefix) :])
+    raise ValueError(f"Unknown cursor {cursor!r}")
+
+
+async def read_id_window(redis_conn, index_key, limit, cursor=None):
+    """
+    Read one window of IDs from an ID index sorted set.
+
+    Only the requested window is fetched (ZRANGEBYSCORE / ZREVRANGEBYSCORE
+    with LIMIT), one extra ID is read to detect whether another page exists.
+
+    Args:
+        redis_conn: Redis client (sync or asyncio)
+        index_key (str): Redis key of the ID index (e.g., "hospital:ids")
+        limit (int): Maximum number of IDs to return
+        cursor (str): Optional cursor from a previous page
+
+    Returns:
+        tuple: (entity_ids, next_cursor, prev_cursor) with IDs as strings in
+        ascending order and None for cursors that point past either end
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    if cursor:
+        prefix, boundary = parse_cursor(cursor)
+    else:
+        prefix, boundary = CURSOR_AFTER, None
+
+    if prefix == CURSOR_AFTER:
+        low = "-inf" if boundary is None else f"({boundary}"
+        window = await await_redis(
+            redis_conn.zrangebyscore(index_key, low, "+inf", start=0, num=limit + 1)
+        )
+        entity_ids = [entity_id.decode() for entity_id in window[:limit]]
+        has_next = len(window) > limit
+        has_prev = boundary is not None
+    else:
+        window = await await_redis(
+            redis_conn.zrevrangebyscore(
+                index_key, f"({boundary}", "-inf", start=0, num=limit + 1
+            )
+        )
+        entity_ids = [entity_id.decode() for entity_id in reversed(window[:limit])]
+        has_next = True
+        has_prev = len(window) > limit
+
+    next_cursor = None
+    prev_cursor = None
+    if entity_ids and has_next:
+        next_cursor = f"{CURSOR_AFTER}{entity_ids[-1]}"
+    if entity_ids and has_prev:
+        prev_cursor = f"{CURSOR_BEFORE}{entity_ids[0]}"
+    return entity_ids, next_cursor, prev_cursor
+
+
+async def read_entity_page(redis_conn, entity_prefix, index_key, limit, cursor):
+    """
+    Read one page of entities: a window of the ID index and its hashes.
+
+    Args:
+        redis_conn: Redis client (sync or asyncio)
+        entity_prefix (str): Redis key prefix for the entity type (e.g., "hospital:")
+        index_key (str): Redis key of the entity's ID index (e.g., "hospital:ids")
+        limit (int): Maximum number of entities on the page
+        cursor (str): Optional cursor from a previous page
+
+    Returns:
+        tuple: (items, next_cursor, prev_cursor) with items as (entity_id,
+        record) pairs of the entities that exist
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    entity_ids, next_cursor, prev_cursor = await read_id_window(
+        redis_conn, index_key, limit, cursor
+    )
+    entity_keys = [f"{entity_prefix}{entity_id}" for entity_id in entity_ids]
+    results = await fetch_entities(redis_conn, entity_keys)
+    items = [
+        (entity_id, result) for entity_id, result in zip(entity_ids, results) if result
+    ]
+    return items, next_cursor, prev_cursor
+
+
+async def read_link_page(redis_conn, limit, cursor):
+    """
+    Read the doctor-patient links of one page of linked doctors.
+
+    The page is a window of the index of linked doctors, so doctors without
+    patients are never read. The sets of the doctors in that window are read
+    in batched pipelines, then the surnames of those doctors and of their
+    patients in one more batch of pipelines.
+
+    Args:
+        redis_conn: Redis client (sync or asyncio)
+        limit (int): Maximum number of doctors on the page
+        cursor (str): Optional cursor from a previous page
+
+    Returns:
+        tuple: (items, next_cursor, prev_cursor) with items as (doctor_id,
+        doctor_surname, patient_id, patient_surname) tuples
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    doctor_ids, next_cursor, prev_cursor = await read_id_window(
+        redis_conn, KEY_INDEX_DOCTOR_PATIENT, limit, cursor
+    )
+    relationship_keys = [
+        f"{KEY_PREFIX_DOCTOR_PATIENT}{doctor_id}" for doctor_id in doctor_ids
+    ]
+    results = await fetch_pipelined(redis_conn, "smembers", relationship_keys)
+    links = {
+        doctor_id: sorted((patient_id.decode() for patient_id in result), key=int)
+        for doctor_id, result in zip(doctor_ids, results)
+        if result
+    }
+    patient_ids = sorted(
+        {patient_id for ids in links.values() for patient_id in ids}, key=int
+    )
+    surname_keys = [f"{KEY_PREFIX_DOCTOR}{doctor_id}" for doctor_id in links]
+    surname_keys += [f"{KEY_PREFIX_PATIENT}{patient_id}" for patient_id in patient_ids]
+    surnames = await fetch_pipelined(
+        redis_conn, "hget", surname_keys, args=("surname",)
+    )
+    surnames = [(surname or b"").decode() for surname in surnames]
+    doctor_surnames = dict(zip(links, surnames))
+    patient_surnames = dict(zip(patient_ids, surnames[len(links) :]))
+
+    items = [
+        (
+            doctor_id,
+            doctor_surnames[doctor_id],
+            patient_id,
+            patient_surnames[patient_id],
+        )
+        for doctor_id, ids in links.items()
+        for patient_id in ids
+    ]
+    return items, next_cursor, prev_cursor
+
+
+async def read_hospital_roster(redis_conn, hospital_id):
+    """
+    Read a hospital and its doctors through the hospital-doctor index.
+
+    The hospital record and its hospital-doctor set are read in one pipeline
+    and the doctor records with fetch_entities, so the cost depends on the
+    size of the roster and not on the number of doctors stored.
+
+    Args:
+        redis_conn: Redis client (sync or asyncio)
+        hospital_id (str): ID of the hospital
+
+    Returns:
+        tuple: (hospital, doctors) with the hospital's HGETALL reply (empty
+        when it does not exist) and (doctor_id, record) pairs in ID order
+    """
+    pipe = redis_conn.pipeline(transaction=False)
+    pipe.hgetall(f"{KEY_PREFIX_HOSPITAL}{hospital_id}")
+    pipe.smembers(f"{KEY_PREFIX_HOSPITAL_DOCTOR}{hospital_id}")
+    hospital, doctor_ids = await await_redis(pipe.execute())
+    if not hospital:
+        return hospital, []
+
+    doctor_ids = sorted((doctor_id.decode() for doctor_id in doctor_ids), key=int)
+    doctors = await fetch_entities(
+        redis_conn,
+        [f"{KEY_PREFIX_DOCTOR}{doctor_id}" for doctor_id in doctor_ids],
+    )
+    return hospital, [
+        (doctor_id, doctor) for doctor_id, doctor in zip(doctor_ids, doctors) if doctor
+    ]
+
+
+async def read_patient_chart(redis_conn, patient_id):
+    """
+    Read a patient with their diagnoses and doctors through the patient indexes.
+
+    The patient record and its patient-diagnosis and patient-doctor sets are
+    read in one pipeline, then every diagnosis and doctor record in a second
+    one, so a chart costs two round trips however many diagnoses and doctors
+    are stored (charts of more than REDIS_PIPELINE_CHUNK_SIZE records take
+    one more round trip per chunk).
+
+    Args:
+        redis_conn: Redis client (sync or asyncio)
+        patient_id (str): ID of the patient
+
+    Returns:
+        tuple: (patient, diagnoses, doctors) with the patient's HGETALL reply
+        (empty when it does not exist) and (id, record) pairs in ID order
+    """
+    pipe = redis_conn.pipeline(transaction=False)
+    pipe.hgetall(f"{KEY_PREFIX_PATIENT}{patient_id}")
+    pipe.smembers(f"{KEY_PREFIX_PATIENT_DIAGNOSIS}{patient_id}")
+    pipe.smembers(f"{KEY_PREFIX_PATIENT_DOCTOR}{patient_id}")
+    patient, diagnosis_ids, doctor_ids = await await_redis(pipe.execute())
+    if not patient:
+        return patient, [], []
+
+    diagnosis_ids = sorted((i.decode() for i in diagnosis_ids), key=int)
+    doctor_ids = sorted((i.decode() for i in doctor_ids), key=int)
+    records = await fetch_entities(
+        redis_conn,
+        [f"{KEY_PREFIX_DIAGNOSIS}{i}" for i in diagnosis_ids]
+        + [f"{KEY_PREFIX_DOCTOR}{i}" for i in doctor_ids],
+    )
+    diagnoses = zip(diagnosis_ids, records[: len(diagnosis_ids)])
+    doctors = zip(doctor_ids, records[len(diagnosis_ids) :])
+    return (
+        patient,
+        [
+            (diagnosis_id, diagnosis)
+            for diagnosis_id, diagnosis in diagnoses
+            if diagnosis
+        ],
+        [(doctor_id, doctor) for doctor_id, doctor in doctors if doctor],
+    )
+
+
+async def read_search_matches(redis_conn, entity_prefixes, prefix, limit):
+    """
+    Read the first entities whose indexed surname starts with a prefix.
+
+    One pipeline of ZRANGEBYLEX reads (see search_prefix) and one reading the
+    hashes of the matches, however many names are indexed.
+
+    Args:
+        redis_conn: Redis client (sync or asyncio)
+        entity_prefixes (dict): Search index key -> key prefix of its entities
+        prefix (str): Surname prefix as typed by the user
+        limit (int): Maximum number of matches
+
+    Returns:
+        list: (search_key, entity_id, record) tuples ordered by surname, for
+        the matches that exist
+    """
+    matches = await search_prefix(redis_conn, list(entity_prefixes), prefix, limit)
+    records = await fetch_entities(
+        redis_conn,
+        [
+            f"{entity_prefixes[search_key]}{entity_id}"
+            for search_key, entity_id in matches
+        ],
+    )
+    return [
+        (search_key, entity_id, record)
+        for (search_key, entity_id), record in zip(matches, records)
+        if record
+    ]
+
+
+class LuaScript:
+    """
+    Lua script executed server-side with EVALSHA.
+
+    The SHA1 digest is computed locally, so a call costs a single round trip.
+    When Redis does not know the script yet (first use, server restart or
+    SCRIPT FLUSH) it is registered with SCRIPT LOAD and the call is retried.
+    """
+
+    def __init__(self, source):
+        """
+        Args:
+            source (str): Lua source of the script
+        """
+        self.source = source
+        self.sha = hashlib.sha1(source.encode()).hexdigest()
+
+    async def load(self, redis_conn):
+        """
+        Register the script with SCRIPT LOAD.
+
+        Args:
+            redis_conn: Redis client (sync or asyncio)
+        """
+        await await_redis(redis_conn.script_load(self.source))
+
+    async def __call__(self, redis_conn, keys, args):
+        """
+        Run the script.
+
+        Args:
+            redis_conn: Redis client (sync or asyncio)
+            keys (list): Values for KEYS
+            args (list): Values for ARGV
+
+        Returns:
+            The script's reply
+        """
+        try:
+            return await await_redis(
+                redis_conn.evalsha(self.sha, len(keys), *keys, *args)
+            )
+        except redis.exceptions.NoScriptError:
+            await self.load(redis_conn)
+            return await await_redis(
+                redis_conn.evalsha(self.sha, len(keys), *keys, *args)
+            )
+
+    async def call_many(self, redis_conn, calls):
+        """
+        Run the script once per call in a single non-transactional pipeline.
+
+        Errors are returned in place of the failing call's reply instead of
+        being raised, so one bad call does not hide the results of the others.
+
+        Args:
+            redis_conn: Redis client (sync or asyncio)
+            calls (list): (keys, args) pairs, one per script run
+
+        Returns:
+            list: Replies (or exception instances) in the same order as calls
+        """
+        for _ in range(2):
+            pipe = redis_conn.pipeline(transaction=False)
+            for keys, args in calls:
+                pipe.evalsha(self.sha, len(keys), *keys, *args)
+            results = await await_redis(pipe.execute(raise_on_error=False))
+            if not any(
+                isinstance(result, redis.exceptions.NoScriptError) for result in results
+            ):
+                break
+            await self.load(redis_conn)
+        return results
+
+
+def create_entity_call(
+    entity_prefix,
+    index_key,
+    entity_id,
+    fields_dict,
+    reference_key="",
+    reference_field="",
+    unique_key="",
+    unique_value="",
+    search_key="",
+    search_term="",
+    reverse_key="",
+    version_key="",
+):
+    """
+    Build the KEYS and ARGV of CREATE_ENTITY_LUA for one new entity.
+
+    Args:
+        entity_prefix (str): Redis key prefix for the entity type (e.g., "doctor:")
+        index_key (str): Redis key of the entity's ID index (e.g., "doctor:ids")
+        entity_id (str): Allocated ID of the new entity
+        fields_dict (dict): Dictionary mapping field names to values
+        reference_key (str): Key of an entity that must exist (e.g., "hospital:1")
+        reference_field (str): Field of the referenced entity to return
+        unique_key (str): Unique index hash the entity claims a value in
+            (e.g., "patient:mpn")
+        unique_value (str): Value claimed in the unique index
+        search_key (str): Search index the entity is added to
+            (e.g., "patient:surnames")
+        search_term (str): Normalized term to index (see normalize_search_term)
+        reverse_key (str): Set of the referenced entity the new ID is added
+            to (e.g., "hospital-doctor:1")
+        version_key (str): Version counter of the entity type (e.g.,
+            "doctor:version")
+
+    Returns:
+        tuple: (keys, args) for the script
+    """
+    args = [entity_id, reference_field, unique_value, search_term]
+    for field_name, field_value in fields_dict.items():
+        args.extend((field_name, field_value))
+    keys = [
+        f"{entity_prefix}{entity_id}",
+        index_key,
+        reference_key,
+        unique_key,
+        search_key,
+        reverse_key,
+        version_key,
+    ]
+    return keys, args
+
+
+def templates_digest(template_dir=TEMPLATE_DIR):
+    """
+    Digest of the template files, part of the ETag of rendered list pages.
+
+    Args:
+        template_dir (str): Directory of the templates
+
+    Returns:
+        str: First 12 hex digits of the SHA-1 of all template files
+    """
+    digest = hashlib.sha1()
+    for name in sorted(os.listdir(template_dir)):
+        with open(os.path.join(template_dir, name), "rb") as template_file:
+            digest.update(template_file.read())
+    return digest.hexdigest()[:12]
+
+
+def csv_line_ends_in_quotes(text, in_quotes=False):
+    """
+    Tell whether a CSV record continues after a line, inside a quoted field.
+
+    Follows the quoting rules of the csv module: a quote opens a quoted field
+    only at the start of a field, "" inside it is an escaped quote, and a
+    quote inside an unquoted field (12" Main St) is taken literally.
+
+    Args:
+        text (str): Line without its newline
+        in_quotes (bool): Whether the line starts inside a quoted field
+
+    Returns:
+        bool: True when the line ends inside a quoted field
+    """
+    if '"' not in text:
+        return in_quotes
+    field_start = not in_quotes
+    closed = False
+    for char in text:
+        if in_quotes:
+            if char == '"':
+                in_quotes = False
+                closed = True
+        elif closed and char == '"':
+            # Escaped quote: the quoted field goes on
+            in_quotes = True
+            closed = False
+        elif char == ",":
+            field_start = True
+            closed = False
+        elif field_start and char == '"':
+            in_quotes = True
+            field_start = False
+        else:
+            field_start = False
+            closed = False
+    return in_quotes
+
+
+def normalize_search_term(value):
+    """
+    Normalize a value for the search indexes, so that matching ignores case.
+
+    Args:
+        value (str): Indexed value or search prefix
+
+    Returns:
+        str: Casefolded value without surrounding whitespace
+    """
+    return value.strip().casefold()
+
+
+class DuplicateEntityError(Exception):
+    """Raised when a new entity claims a unique value another entity holds."""
+
+    def __init__(self, unique_key, unique_value, entity_id):
+        """
+        Args:
+            unique_key (str): Unique index hash (e.g., "patient:mpn")
+            unique_value (str): The claimed value
+            entity_id (str): ID of the entity holding the value
+        """
+        super().__init__(
+            f"{unique_value} in {unique_key} already belongs to ID {entity_id}"
+        )
+        self.entity_id = entity_id
+
+
+create_entity_script = LuaScript(CREATE_ENTITY_LUA)
+find_unique_script = LuaScript(FIND_UNIQUE_LUA)
+reserve_ids_script = LuaScript(RESERVE_IDS_LUA)
+
+# Scripts registered with SCRIPT LOAD at startup by init_db()
+LUA_SCRIPTS = [create_entity_script, find_unique_script, reserve_ids_script]
+
+
+class IdAllocator:
+    """
+    Hi/lo allocator handing out entity IDs from locally reserved blocks.
+
+    Each process reserves block_size IDs per autoID counter with a single
+    INCRBY and then allocates them without touching Redis, so the shared
+    counters are hit once per block instead of once per create. IDs left in
+    a block when the process exits are never reused: the counter already
+    points past them, and list pages read the ID indexes, so gaps are
+    harmless. Reserved blocks are dropped after a fork so that worker
+    processes never share a block.
+    """
+
+    def __init__(self, block_size):
+        """
+        Args:
+            block_size (int): Number of IDs reserved per INCRBY
+        """
+        self.block_size = block_size
+        self.reset()
+
+    def reset(self):
+        """Forget all reserved blocks and statistics."""
+        self.pid = os.getpid()
+        # autoID key -> deque of [next_id, end_id) ranges
+        self.ranges = {}
+        self.blocks_reserved = 0
+        self.ids_allocated = 0
+        self.ids_released = 0
+
+    async def reserve(self, redis_conn, auto_id_key, count):
+        """
+        Reserve a block of consecutive IDs for this process.
+
+        Args:
+            redis_conn: Redis client (sync or asyncio)
+            auto_id_key (str): Redis key for the auto-incrementing ID
+            count (int): Number of IDs to reserve
+
+        Returns:
+            tuple: (first_id, end_id), end_id exclusive
+
+        Raises:
+            redis.exceptions.ConnectionError: If Redis connection fails
+            ValueError: If autoID is not initialized
+        """
+        try:
+            end_id = await reserve_ids_script(redis_conn, [auto_id_key], [count])
+        except redis.exceptions.ResponseError as e:
+            raise ValueError(str(e)) from e
+        self.blocks_reserved += 1
+        return end_id - count, end_id
+
+    async def next_id(self, redis_conn, auto_id_key):
+        """
+        Allocate the next ID, reserving a new block when the current one is used up.
+
+        Args:
+            redis_conn: Redis client (sync or asyncio)
+            auto_id_key (str): Redis key for the auto-incrementing ID
+
+        Returns:
+            str: The allocated ID
+
+        Raises:
+            redis.exceptions.ConnectionError: If Redis connection fails
+            ValueError: If autoID is not initialized
+        """
+        if self.pid != os.getpid():
+            self.reset()
+        ranges = self.ranges.setdefault(auto_id_key, collections.deque())
+        while not ranges:
+            first_id, end_id = await self.reserve(
+                redis_conn, auto_id_key, self.block_size
+            )
+            ranges.append([first_id, end_id])
+
+        # No await between taking the ID and advancing the range, so
+        # concurrent coroutines never receive the same ID
+        current = ranges[0]
+        entity_id = current[0]
+        current[0] += 1
+        if current[0] == current[1]:
+            ranges.popleft()
+        self.ids_allocated += 1
+        return str(entity_id)
+
+    def release(self, auto_id_key, entity_id):
+        """
+        Return an allocated but unused ID so that it is handed out again.
+
+        Args:
+            auto_id_key (str): Redis key for the auto-incrementing ID
+            entity_id (str): ID that was never written to Redis
+        """
+        entity_id = int(entity_id)
+        ranges = self.ranges.setdefault(auto_id_key, collections.deque())
+        ranges.appendleft([entity_id, entity_id + 1])
+        self.ids_allocated -= 1
+        self.ids_released += 1
+
+    def stats(self):
+        """
+        Allocation statistics for tuning block_size.
+
+        Returns:
+            dict: Block size, blocks reserved, IDs allocated and released, and
+            the IDs still available per autoID counter
+        """
+        return {
+            "block_size": self.block_size,
+            "blocks_reserved": self.blocks_reserved,
+            "ids_allocated": self.ids_allocated,
+            "ids_released": self.ids_released,
+            "ids_available": {
+                auto_id_key: sum(end - start for start, end in ranges)
+                for auto_id_key, ranges in self.ranges.items()
+            },
+        }
+
+
+# Per-process ID allocator used by all creates
+id_allocator = IdAllocator(ID_BLOCK_SIZE)
+
+
+class PageCache:
+    """
+    Per-process LRU cache of rendered list pages, validated by version counters.
+
+    Every page is stored with the version it was rendered at (its ETag,
+    derived from the version of its entity type read from Redis). A lookup
+    only hits when the version of the current request is the same, so a
+    create or link anywhere in the cluster invalidates the pages of its type
+    on the next request. Entries also
+    expire after ttl seconds, which bounds how long writes made outside the
+    application (which do not bump the versions) stay invisible.
+    """
+
+    def __init__(self, max_entries, ttl):
+        """
+        Args:
+            max_entries (int): Pages kept before the least recently used one
+                is evicted (0 disables the cache)
+            ttl (float): Seconds a page is served after it was rendered
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.reset()
+
+    def reset(self):
+        """Drop all cached pages and statistics."""
+        # key -> (version, expiry time, page)
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, version):
+        """
+        Look up a page rendered at the given version.
+
+        Args:
+            key (tuple): Page key (route and page arguments)
+            version (str): Current version of the page (see get_page_etag)
+
+        Returns:
+            str: The cached page, or None on a miss
+        """
+        entry = self.entries.get(key)
+        if entry is None or entry[0] != version or entry[1] <= time.monotonic():
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[2]
+
+    def put(self, key, version, page):
+        """
+        Store a page rendered at the given version.
+
+        Args:
+            key (tuple): Page key (route and page arguments)
+            version (str): Version the page was rendered at
+            page (str): Rendered page
+        """
+        if self.max_entries <= 0:
+            return
+        self.entries[key] = (version, time.monotonic() + self.ttl, page)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        """
+        Cache statistics for tuning max_entries and ttl.
+
+        Returns:
+            dict: Size limits, cached pages, hits, misses and evictions
+        """
+        return {
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+# Per-process cache of rendered list pages (see BaseRedisHandler.render_list_page)
+page_cache = PageCache(PAGE_CACHE_SIZE, PAGE_CACHE_TTL)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical reads into one in-flight Redis fetch.
+
+    The first request for a key (the leader) starts the fetch; requests for
+    the same key arriving while it runs (collapsed requests) await the same
+    result instead of sending their own commands, so a burst of identical
+    list or lookup requests costs Redis one read. The key is dropped as soon
+    as the fetch completes, so nothing is cached: the next request reads
+    again. Results are shared between the requests and must not be mutated,
+    and a collapsed request may miss a write committed while the fetch it
+    joined was already running, exactly as if it had arrived a moment earlier.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Forget in-flight fetches and statistics."""
+        # key -> task of the fetch in flight
+        self.calls = {}
+        self.leaders = 0
+        self.collapsed = 0
+
+    async def run(self, key, fetch, *args):
+        """
+        Return the result of fetch(*args), shared with concurrent calls for key.
+
+        The fetch runs as a task of its own, so a leader whose request is
+        cancelled does not cancel it for the requests awaiting it.
+
+        Args:
+            key (tuple): Identity of the read (e.g., index key and page arguments)
+            fetch: Coroutine function performing the read
+            *args: Arguments passed to fetch
+
+        Returns:
+            The fetch's result
+
+        Raises:
+            Exception: Whatever the fetch raised, to every request awaiting it
+        """
+        task = self.calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fetch(*args))
+            self.calls[key] = task
+            task.add_done_callback(lambda done: self.forget(key, done))
+            self.leaders += 1
+        else:
+            self.collapsed += 1
+        return await asyncio.shield(task)
+
+    def forget(self, key, task):
+        """
+        Drop a completed fetch so that the next request for its key reads again.
+
+        Args:
+            key (tuple): Identity of the read
+            task (asyncio.Future): The completed fetch
+        """
+        if self.calls.get(key) is task:
+            del self.calls[key]
+        if not task.cancelled():
+            # Mark the error as retrieved when every awaiting request went away
+            task.exception()
+
+    def stats(self):
+        """
+        Coalescing statistics.
+
+        Returns:
+            dict: Fetches in flight, fetches started and requests collapsed
+            into a fetch already in flight
+        """
+        return {
+            "in_flight": len(self.calls),
+            "leaders": self.leaders,
+            "collapsed": self.collapsed,
+        }
+
+
+# Per-process coalescing of identical reads (see BaseRedisHandler.coalesce)
+single_flight = SingleFlight()
+
+
+class KnownEntities:
+    """
+    Per-process LRU set of the keys of entities known to exist.
+
+    Entities are never deleted and the ID of a created entity is never handed
+    out again, so a key once seen to exist stays valid for the life of the
+    process and referential checks of known keys need no round trip. Keys
+    found missing are not remembered, since any worker may create them next.
+    """
+
+    def __init__(self, max_entries):
+        """
+        Args:
+            max_entries (int): Keys kept before the least recently used one is
+                evicted (0 disables the cache)
+        """
+        self.max_entries = max_entries
+        self.reset()
+
+    def reset(self):
+        """Forget all known keys and statistics."""
+        # key -> None, in least recently used order
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def contains(self, key):
+        """
+        Check whether an entity key is known to exist.
+
+        Args:
+            key (str): Entity key (e.g., "doctor:1")
+
+        Returns:
+            bool: True if the entity was seen to exist, False if Redis must
+            be asked
+        """
+        if key not in self.entries:
+            self.misses += 1
+            return False
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return True
+
+    def add(self, key):
+        """
+        Remember that an entity exists.
+
+        Args:
+            key (str): Entity key (e.g., "doctor:1")
+        """
+        if self.max_entries <= 0:
+            return
+        self.entries[key] = None
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        """
+        Cache statistics for tuning max_entries.
+
+        Returns:
+            dict: Size limit, known keys, hits, misses and evictions
+        """
+        return {
+            "max_entries": self.max_entries,
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+# Per-process cache of existing entities (see BaseRedisHandler.check_entities_exist)
+known_entities = KnownEntities(KNOWN_ENTITIES_SIZE)
+# Key prefixes of the entities existence checks ask about (both ends of a
+# doctor-patient link); other created keys would only evict them
+KNOWN_ENTITY_PREFIXES = (KEY_PREFIX_DOCTOR, KEY_PREFIX_PATIENT)
+
+
+class ClientCache:
+    """
+    Per-process LRU cache of entity hashes invalidated by Redis (client tracking).
+
+    start() opens a pub/sub connection that enables broadcast tracking of
+    the entity key prefixes (CLIENT TRACKING ON BCAST) with its invalidations
+    redirected to itself, then subscribes to TRACKING_CHANNEL. Redis then
+    publishes the name of every entity key written by any client, and a
+    listener thread drops those keys from the cache, so a cached hash is
+    served until the entity changes. redis-py 4 speaks RESP2 only, hence the
+    pub/sub redirection instead of RESP3 push messages.
+
+    A hash read while an invalidation of its key arrives is not stored, and
+    the whole cache is dropped whenever the listener connection fails or
+    reconnects (tracking starts afresh with the new connection), so the
+    cache never outlives the invalidations it relies on. Invalidations are
+    applied by the listener thread, so a process may serve a hash for the
+    moment it takes Redis to deliver the invalidation of its own write.
+    """
+
+    def __init__(self, max_entries):
+        """
+        Args:
+            max_entries (int): Hashes kept before the least recently used one
+                is evicted (0 disables the cache)
+        """
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        # True while the listener is subscribed and invalidations arrive
+        self.tracking = False
+        self.pubsub = None
+        self.reset()
+
+    def reset(self):
+        """Drop all cached hashes and statistics."""
+        with self.lock:
+            # key -> HGETALL reply
+            self.entries = collections.OrderedDict()
+            # key -> [reads in flight, invalidated during those reads]
+            self.pending = {}
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.invalidations = 0
+
+    def start(self, redis_conn):
+        """
+        Start tracking and the listener thread (no-op when max_entries is 0).
+
+        Args:
+            redis_conn: Synchronous Redis client providing the pub/sub connection
+
+        Raises:
+            redis.exceptions.RedisError: If Redis does not support tracking
+        """
+        if self.max_entries <= 0 or self.pubsub is not None:
+            return
+        pubsub = redis_conn.pubsub()
+        connection = redis_conn.connection_pool.get_connection("pubsub")
+        self.enable_tracking(connection)
+        # Reconnects enable tracking again before re-subscribing
+        connection.register_connect_callback(self.enable_tracking)
+        connection.register_connect_callback(pubsub.on_connect)
+        pubsub.connection = connection
+        pubsub.subscribe(**{TRACKING_CHANNEL: self.handle_invalidation})
+        self.pubsub = pubsub
+        threading.Thread(target=self.listen, args=(pubsub,), daemon=True).start()
+        logging.info(f"Client-side cache tracking {', '.join(CLIENT_CACHE_PREFIXES)}")
+
+    def stop(self):
+        """Stop the listener thread and stop serving cached hashes."""
+        self.pubsub = None
+        self.tracking = False
+        self.clear()
+
+    def enable_tracking(self, connection):
+        """
+        Enable broadcast tracking on a (re)connected listener connection.
+
+        The cache is dropped and stays off until the subscription to
+        TRACKING_CHANNEL is confirmed (see listen): until then Redis would
+        discard the invalidations.
+
+        Args:
+            connection (redis.connection.Connection): Listener connection,
+                not yet subscribed
+        """
+        self.tracking = False
+        self.clear()
+        connection.send_command("CLIENT", "ID")
+        client_id = connection.read_response()
+        prefixes = [
+            arg for prefix in CLIENT_CACHE_PREFIXES for arg in ("PREFIX", prefix)
+        ]
+        connection.send_command(
+            "CLIENT", "TRACKING", "ON", "REDIRECT", client_id, "BCAST", *prefixes
+        )
+        connection.read_response()
+
+    def listen(self, pubsub):
+        """
+        Apply invalidations until stop() is called (listener thread).
+
+        Invalidation messages are dispatched to handle_invalidation. The cache
+        is served once the subscription is confirmed; after a connection
+        error it is dropped and off until the next read has reconnected,
+        enabled tracking and re-subscribed.
+
+        Args:
+            pubsub (redis.client.PubSub): Subscribed listener
+        """
+        while self.pubsub is pubsub:
+            try:
+                message = pubsub.get_message(timeout=1)
+            except redis.exceptions.ConnectionError as e:
+                logging.error(f"Client-side cache listener error: {e}")
+                self.tracking = False
+                self.clear()
+                pubsub.connection.disconnect()
+                time.sleep(1)
+                continue
+            if message is not None and message["type"] == "subscribe":
+                self.tracking = True
+        pubsub.close()
+
+    def handle_invalidation(self, message):
+        """
+        Drop the keys of an invalidation message (all keys when it has none).
+
+        Args:
+            message (dict): Pub/sub message from TRACKING_CHANNEL
+        """
+        keys = message["data"]
+        if keys is None:
+            self.clear()
+            return
+        with self.lock:
+            for key in keys:
+                key = key.decode()
+                if self.entries.pop(key, None) is not None:
+                    self.invalidations += 1
+                if key in self.pending:
+                    self.pending[key][1] = True
+
+    def clear(self):
+        """Drop all cached hashes, including those of reads in flight."""
+        with self.lock:
+            self.entries.clear()
+            for read in self.pending.values():
+                read[1] = True
+
+    def get_many(self, keys):
+        """
+        Look up cached hashes.
+
+        Args:
+            keys (list): Entity keys
+
+        Returns:
+            dict: Key -> HGETALL reply for the keys in the cache
+        """
+        records = {}
+        with self.lock:
+            for key in keys:
+                record = self.entries.get(key)
+                if record is None:
+                    self.misses += 1
+                    continue
+                self.entries.move_to_end(key)
+                self.hits += 1
+                records[key] = record
+        return records
+
+    def begin(self, keys):
+        """
+        Register reads of keys so that invalidations during them are noticed.
+
+        Args:
+            keys (list): Entity keys about to be read
+        """
+        with self.lock:
+            for key in keys:
+                self.pending.setdefault(key, [0, False])[0] += 1
+
+    def end(self, keys, records):
+        """
+        Store the hashes of finished reads that were not invalidated meanwhile.
+
+        Args:
+            keys (list): Entity keys passed to begin
+            records (list): HGETALL replies in the order of keys, or None if
+                the read failed
+        """
+        with self.lock:
+            for index, key in enumerate(keys):
+                read = self.pending[key]
+                read[0] -= 1
+                if read[0] == 0:
+                    del self.pending[key]
+                if records is None or read[1] or not self.tracking:
+                    continue
+                self.entries[key] = records[index]
+                self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        """
+        Cache statistics for tuning max_entries.
+
+        Returns:
+            dict: Size limit, tracking state, cached hashes, hits, misses,
+            evictions and hashes dropped by invalidations
+        """
+        return {
+            "max_entries": self.max_entries,
+            "tracking": self.tracking,
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+# Per-process cache of entity hashes kept up to date by Redis (see fetch_entities)
+client_cache = ClientCache(CLIENT_CACHE_SIZE)
+
+
+def format_labels(label_names, label_values, extra=""):
+    """
+    Format a Prometheus label set.
+
+    Args:
+        label_names (tuple): Label names
+        label_values (tuple): Label values in the same order
+        extra (str): Already formatted label appended last (e.g., 'le="0.1"')
+
+    Returns:
+        str: Label set such as '{route="/hospital",method="GET"}', or "" if empty
+    """
+    pairs = [
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"),
+        )
+        for name, value in zip(label_names, label_values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class CounterMetric:
+    """Monotonic counter with one value per label set."""
+
+    def __init__(self, name, help_text, label_names=()):
+        """
+        Args:
+            name (str): Metric name
+            help_text (str): HELP line of the metric
+            label_names (tuple): Names of the labels of each sample
+        """
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.values = collections.defaultdict(float)
+
+    def inc(self, label_values=(), amount=1):
+        """
+        Add to the counter of one label set.
+
+        Args:
+            label_values (tuple): Label values in label_names order
+            amount (float): Increment
+        """
+        self.values[label_values] += amount
 
-# Valid sex values for patients
-VALID_SEX_VALUES = ["M", "F"]
+    def expose(self):
+        """
+        Render the counter in the Prometheus text format.
 
-# Error messages
-ERROR_REDIS_CONNECTION = "Redis connection refused"
-ERROR_SOMETHING_WRONG = "Something went terribly wrong"
+        Returns:
+            list: Exposition lines
+        """
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self.values.items()):
+            labels = format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}{labels} {value:g}")
+        return lines
+
+
+class HistogramMetric:
+    """Histogram with cumulative buckets, sum and count per label set."""
+
+    def __init__(self, name, help_text, label_names, buckets):
+        """
+        Args:
+            name (str): Metric name
+            help_text (str): HELP line of the metric
+            label_names (tuple): Names of the labels of each sample
+            buckets (tuple): Sorted bucket upper bounds (+Inf is implicit)
+        """
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        # label values -> [per-bucket counts (last one is +Inf), sum, count]
+        self.values = {}
+
+    def observe(self, label_values, value):
+        """
+        Record one observation.
+
+        Args:
+            label_values (tuple): Label values in label_names order
+            value (float): Observed value
+        """
+        state = self.values.get(label_values)
+        if state is None:
+            state = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def expose(self):
+        """
+        Render the histogram in the Prometheus text format.
+
+        Returns:
+            list: Exposition lines
+        """
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} histogram",
+        ]
+        bounds = [f"{bound:g}" for bound in self.buckets] + ["+Inf"]
+        for label_values, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                labels = format_labels(self.label_names, label_values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {total:g}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """In-process registry of the metrics exposed on /metrics."""
+
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, help_text, label_names=()):
+        """Create and register a CounterMetric."""
+        metric = CounterMetric(name, help_text, label_names)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, label_names, buckets):
+        """Create and register a HistogramMetric."""
+        metric = HistogramMetric(name, help_text, label_names, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def reset(self):
+        """Drop all recorded samples."""
+        for metric in self.metrics:
+            metric.values.clear()
+
+    def expose(self):
+        """
+        Render every registered metric in the Prometheus text format.
+
+        Returns:
+            str: Exposition text
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+# Bucket bounds for durations (seconds) and for per-request counts
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+# Per-process metrics, recorded by BaseRedisHandler and exposed on /metrics
+metrics = MetricsRegistry()
+REQUEST_LABELS = ("route", "method")
+request_duration = metrics.histogram(
+    "http_request_duration_seconds",
+    "Request latency",
+    REQUEST_LABELS,
+    LATENCY_BUCKETS,
+)
+requests_total = metrics.counter(
+    "http_requests_total", "Finished requests", ("route", "method", "status")
+)
+redis_commands = metrics.histogram(
+    "redis_commands_per_request",
+    "Redis commands sent per request",
+    REQUEST_LABELS,
+    COUNT_BUCKETS,
+)
+redis_round_trips = metrics.histogram(
+    "redis_round_trips_per_request",
+    "Redis round trips (direct commands and pipeline executions) per request",
+    REQUEST_LABELS,
+    COUNT_BUCKETS,
+)
+redis_duration = metrics.histogram(
+    "redis_duration_seconds",
+    "Time per request spent waiting for Redis",
+    REQUEST_LABELS,
+    LATENCY_BUCKETS,
+)
+render_duration = metrics.histogram(
+    "template_render_duration_seconds",
+    "Time per request spent rendering templates",
+    REQUEST_LABELS,
+    LATENCY_BUCKETS,
+)
+page_rows = metrics.histogram(
+    "list_page_rows", "Rows rendered per list page", ("route",), COUNT_BUCKETS
+)
+handler_errors = metrics.counter(
+    "handler_errors_total", "Errors reported by handlers", ("route", "type")
+)
+page_cache_lookups = metrics.counter(
+    "page_cache_lookups_total", "List page cache lookups", ("route", "result")
+)
+single_flight_requests = metrics.counter(
+    "single_flight_requests_total",
+    "Coalesced reads by whether they started a fetch or joined one in flight",
+    ("route", "result"),
+)
+
+
+# Request header enabling the Redis trace of one request: any value adds a
+# Server-Timing header to the response, "log" also logs the command sequence
+# when the trace_log setting allows it (clients cannot make a production
+# server write to its log)
+TRACE_HEADER = "X-Redis-Trace"
+TRACE_LOG = "log"
+
+
+class RedisCallStats:
+    """
+    Redis commands, round trips and wait time of one request.
+
+    When trace is a list, every round trip is also appended to it as a
+    (command, key, seconds) tuple; pipelines are recorded as one entry whose
+    command lists the queued commands (see summarize_commands).
+    """
+
+    __slots__ = ("commands", "round_trips", "seconds", "trace")
+
+    def __init__(self, trace=False):
+        """
+        Args:
+            trace (bool): Record the sequence of round trips
+        """
+        self.commands = 0
+        self.round_trips = 0
+        self.seconds = 0.0
+        self.trace = [] if trace else None
+
+
+def summarize_commands(entries):
+    """
+    Collapse consecutive runs of the same command into "NAME xN".
+
+    Args:
+        entries (list): (command, key, seconds) tuples as recorded in
+            RedisCallStats.trace
+
+    Returns:
+        list: (command, key, seconds, count) tuples; key is only kept for
+        single commands and seconds is the total time of the run
+    """
+    summary = []
+    for command, key, seconds in entries:
+        if summary and summary[-1][0] == command:
+            previous = summary[-1]
+            summary[-1] = (command, "", previous[2] + seconds, previous[3] + 1)
+        else:
+            summary.append((command, key, seconds, 1))
+    return summary
+
+
+def format_trace(entries):
+    """
+    Format a request's Redis trace as one readable line.
+
+    Args:
+        entries (list): (command, key, seconds) tuples as recorded in
+            RedisCallStats.trace
+
+    Returns:
+        str: e.g. "ZRANGE doctor:ids 0.21ms; SMEMBERS x100 9.80ms"
+    """
+    parts = []
+    for command, key, seconds, count in summarize_commands(entries):
+        label = f"{command} x{count}" if count > 1 else f"{command} {key}".rstrip()
+        parts.append(f"{label} {seconds * 1000:.2f}ms")
+    return "; ".join(parts)
+
+
+def trace_key(name, args):
+    """
+    Return the key a traced command works on, or "" when it has none.
+
+    Args:
+        name (str): Command name (upper case)
+        args (tuple): Command arguments
+
+    Returns:
+        str: First key of EVALSHA/EVAL calls, otherwise the first argument
+        when it is a string
+    """
+    if name in ("EVALSHA", "EVAL"):
+        args = args[2:] if len(args) > 2 and int(args[1]) else ()
+    elif name == "SCRIPT_LOAD":
+        args = ()
+    if args and isinstance(args[0], (str, bytes)):
+        return args[0].decode() if isinstance(args[0], bytes) else args[0]
+    return ""
+
+
+class InstrumentedRedis:
+    """
+    Proxy around a Redis client (sync or asyncio) recording RedisCallStats.
+
+    Every direct command is one command and one round trip; commands queued
+    on a pipeline are counted as commands and its execute() as one round
+    trip. Time is measured until the reply arrives, also for awaitables.
+    """
+
+    def __init__(self, client, stats):
+        """
+        Args:
+            client: Redis client or pipeline to wrap
+            stats (RedisCallStats): Statistics to update
+        """
+        self.client = client
+        self.stats = stats
+
+    def pipeline(self, *args, **kwargs):
+        """Create a pipeline whose commands and execution are recorded."""
+        return InstrumentedPipeline(self.client.pipeline(*args, **kwargs), self.stats)
+
+    def __getattr__(self, name):
+        attribute = getattr(self.client, name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            self.stats.commands += 1
+            return self.timed(name.upper(), args, attribute, *args, **kwargs)
+
+        return call
+
+    def timed(self, name, command_args, command, *args, **kwargs):
+        """
+        Run one round trip and add its duration to the statistics.
+
+        Args:
+            name (str): Command name for the trace
+            command_args (tuple): Command arguments for the trace
+            command: Bound client method
+
+        Returns:
+            The reply, or an awaitable resolving to it for asyncio clients
+        """
+        self.stats.round_trips += 1
+        started = time.perf_counter()
+        result = command(*args, **kwargs)
+        if inspect.isawaitable(result):
+            return self.timed_awaitable(name, command_args, result, started)
+        self.record(name, command_args, time.perf_counter() - started)
+        return result
+
+    async def timed_awaitable(self, name, command_args, result, started):
+        """Await an asyncio reply and add the elapsed time to the statistics."""
+        try:
+            return await result
+        finally:
+            self.record(name, command_args, time.perf_counter() - started)
+
+    def record(self, name, command_args, seconds):
+        """Add one round trip's duration to the statistics and trace."""
+        self.stats.seconds += seconds
+        if self.stats.trace is not None:
+            self.stats.trace.append((name, trace_key(name, command_args), seconds))
 
-# Initialize Redis connection
-r = redis.StrictRedis(host=REDIS_HOST, port=REDIS_PORT, db=0)
+
+class InstrumentedPipeline(InstrumentedRedis):
+    """Pipeline proxy: queued commands are counted, execute() is the round trip."""
+
+    def __init__(self, client, stats):
+        super().__init__(client, stats)
+        self.queued = []
+
+    def execute(self, *args, **kwargs):
+        """Send the queued commands in one round trip."""
+        return self.timed("PIPELINE", (), self.client.execute, *args, **kwargs)
+
+    def record(self, name, command_args, seconds):
+        """Record the round trip, tracing it with the commands it carried."""
+        if self.stats.trace is not None:
+            queued = ", ".join(
+                f"{command} x{count}" if count > 1 else command
+                for command, _, _, count in summarize_commands(self.queued)
+            )
+            name = f"PIPELINE[{queued}]"
+            self.queued = []
+        super().record(name, command_args, seconds)
+
+    def __getattr__(self, name):
+        attribute = getattr(self.client, name)
+        if not callable(attribute):
+            return attribute
+
+        def queue(*args, **kwargs):
+            self.stats.commands += 1
+            if self.stats.trace is not None:
+                self.queued.append((name.upper(), "", 0.0))
+            return attribute(*args, **kwargs)
+
+        return queue
 
 
 class BaseRedisHandler(tornado.web.RequestHandler):
@@ -45,19 +2081,202 @@ class BaseRedisHandler(tornado.web.RequestHandler):
     Base handler class providing common Redis operations and error handling.
 
     This class encapsulates common patterns used across all entity handlers:
-    - Retrieving all entities of a type
+    - Reading pages of entities of a type
     - Handling Redis connection errors
     - Creating new entities with validation
     """
 
+    # Entity managed by a subclass: key prefix, autoID counter, ID index and
+    # the fields stored in its hash (in write order)
+    ENTITY_PREFIX = None
+    AUTO_ID_KEY = None
+    INDEX_KEY = None
+    FIELDS = ()
+    # Entity a new record refers to: (ID field, key prefix of the referenced
+    # entity, referenced field to return, error when it does not exist)
+    REFERENCE = None
+    # Field whose value must be unique: (field, unique index hash of value ->
+    # ID, error when another entity holds the value)
+    UNIQUE = None
+    # Field searchable by prefix: (field, search index sorted set)
+    SEARCH = None
+    # Key prefix of the sets listing the IDs that refer to one entity of
+    # REFERENCE (e.g., the doctors of a hospital)
+    REVERSE_INDEX = None
+    # Change counter bumped by every create or link, validating cached pages
+    VERSION_KEY = None
+    # Metrics label of a route whose path captures an ID (e.g.,
+    # "/hospital/{id}/doctors"), so that every ID does not add new series;
+    # other routes are labelled with their path
+    ROUTE = None
+
+    @staticmethod
+    def validate(fields):
+        """
+        Validate the fields of a new entity.
+
+        Args:
+            fields (dict): Field values by name (see FIELDS)
+
+        Returns:
+            str: Error message, or None if the fields are valid
+        """
+
+    @classmethod
+    def get_reference(cls, fields):
+        """
+        Resolve the entity a new record refers to (see REFERENCE).
+
+        Args:
+            fields (dict): Field values by name (see FIELDS)
+
+        Returns:
+            tuple: (reference_key, reference_field) for create_entity, empty
+            strings when there is nothing to check
+        """
+        if cls.REFERENCE is None:
+            return "", ""
+        id_field, key_prefix, reference_field, _ = cls.REFERENCE
+        if not fields[id_field]:
+            return "", ""
+        return f"{key_prefix}{fields[id_field]}", reference_field
+
+    @classmethod
+    def get_reverse_key(cls, fields):
+        """
+        Resolve the reverse index set a new record is added to (see REVERSE_INDEX).
+
+        Args:
+            fields (dict): Field values by name (see FIELDS)
+
+        Returns:
+            str: Set key for create_entity, empty string when the record
+            refers to nothing
+        """
+        if cls.REVERSE_INDEX is None or not fields[cls.REFERENCE[0]]:
+            return ""
+        return f"{cls.REVERSE_INDEX}{fields[cls.REFERENCE[0]]}"
+
+    @classmethod
+    def get_unique(cls, fields):
+        """
+        Resolve the unique index entry a new record claims (see UNIQUE).
+
+        Args:
+            fields (dict): Field values by name (see FIELDS)
+
+        Returns:
+            tuple: (unique_key, unique_value) for create_entity, empty
+            strings when the entity has no unique field
+        """
+        if cls.UNIQUE is None:
+            return "", ""
+        field, unique_key, _ = cls.UNIQUE
+        return unique_key, fields[field]
+
+    @classmethod
+    def get_search(cls, fields):
+        """
+        Resolve the search index entry of a new record (see SEARCH).
+
+        Args:
+            fields (dict): Field values by name (see FIELDS)
+
+        Returns:
+            tuple: (search_key, search_term) for create_entity, empty strings
+            when the entity is not searchable
+        """
+        if cls.SEARCH is None:
+            return "", ""
+        field, search_key = cls.SEARCH
+        return search_key, normalize_search_term(fields[field])
+
+    def initialize(self):
+        """Reset the per-request Redis statistics, tracing when TRACE_HEADER is set."""
+        self.trace_mode = self.request.headers.get(TRACE_HEADER, "").strip().lower()
+        self.redis_stats = RedisCallStats(trace=bool(self.trace_mode))
+        self.redis_conn = None
+        self.render_seconds = 0.0
+
     def get_redis_connection(self):
         """
         Get the Redis connection instance.
 
+        Returns the pooled asyncio client when REDIS_ASYNC is enabled and the
+        module-level synchronous client otherwise, wrapped so that the
+        request's commands, round trips and Redis time are recorded.
+
+        Returns:
+            InstrumentedRedis: The Redis connection object
+        """
+        if self.redis_conn is None:
+            client = get_async_redis() if REDIS_ASYNC else r
+            self.redis_conn = InstrumentedRedis(client, self.redis_stats)
+        return self.redis_conn
+
+    def render(self, template_name, **kwargs):
+        """
+        Render a template, recording the number of rows on list pages.
+
+        Args:
+            template_name (str): Template path
+            **kwargs: Template arguments; the length of "items" is recorded
+                as the number of rows on the page
+        """
+        if "items" in kwargs:
+            page_rows.observe((self.route,), len(kwargs["items"]))
+        return super().render(template_name, **kwargs)
+
+    def render_string(self, template_name, **kwargs):
+        """Generate a template, adding the time taken to the request's render time."""
+        started = time.perf_counter()
+        result = super().render_string(template_name, **kwargs)
+        self.render_seconds += time.perf_counter() - started
+        return result
+
+    @property
+    def route(self):
+        """str: Route label of the request's metrics (ROUTE or the path)."""
+        return self.ROUTE or self.request.path
+
+    def get_server_timing(self):
+        """
+        Build the Server-Timing header value of a traced request.
+
         Returns:
-            redis.StrictRedis: The Redis connection object
+            str: Redis and template time in milliseconds, e.g.
+            'redis;dur=1.52;desc="12 commands, 2 round trips", render;dur=0.80'
         """
-        return r
+        stats = self.redis_stats
+        return (
+            f"redis;dur={stats.seconds * 1000:.2f};"
+            f'desc="{stats.commands} commands, {stats.round_trips} round trips", '
+            f"render;dur={self.render_seconds * 1000:.2f}"
+        )
+
+    def finish(self, chunk=None):
+        """Finish the response, adding Server-Timing when the request is traced."""
+        if self.redis_stats.trace is not None and not self._headers_written:
+            self.set_header("Server-Timing", self.get_server_timing())
+        return super().finish(chunk)
+
+    def on_finish(self):
+        """Record the request's latency, Redis usage and render time."""
+        labels = (self.route, self.request.method)
+        if self.trace_mode == TRACE_LOG and self.settings.get("trace_log"):
+            logging.info(
+                f"Redis trace {self.request.method} {self.request.uri}: "
+                f"{self.redis_stats.commands} commands, "
+                f"{self.redis_stats.round_trips} round trips: "
+                f"{format_trace(self.redis_stats.trace)}"
+            )
+        request_duration.observe(labels, self.request.request_time())
+        requests_total.inc(labels + (str(self.get_status()),))
+        redis_commands.observe(labels, self.redis_stats.commands)
+        redis_round_trips.observe(labels, self.redis_stats.round_trips)
+        redis_duration.observe(labels, self.redis_stats.seconds)
+        if self.render_seconds:
+            render_duration.observe(labels, self.render_seconds)
 
     def handle_redis_error(self, error):
         """
@@ -70,135 +2289,324 @@ class BaseRedisHandler(tornado.web.RequestHandler):
         """
         self.set_status(400)
         self.write(ERROR_REDIS_CONNECTION)
+        handler_errors.inc((self.route, "redis_connection"))
         logging.error(f"Redis connection error: {error}")
 
-    def get_all_entities(self, entity_prefix, auto_id_key):
+    def get_page_args(self):
+        """
+        Parse the pagination query parameters of a list request.
+
+        Query parameters:
+        - limit: Rows per page (1..PAGE_SIZE_MAX, defaults to PAGE_SIZE_DEFAULT)
+        - cursor: Cursor returned as next/prev link of a previous page
+
+        Returns:
+            tuple: (limit, cursor), or None after writing a 400 response for
+            invalid parameters
+        """
+        cursor = self.get_argument("cursor", None) or None
+        try:
+            limit = int(self.get_argument("limit", PAGE_SIZE_DEFAULT))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= PAGE_SIZE_MAX:
+            self.set_status(400)
+            self.write(ERROR_INVALID_LIMIT)
+            return None
+        if cursor:
+            try:
+                parse_cursor(cursor)
+            except ValueError:
+                self.set_status(400)
+                self.write(ERROR_INVALID_CURSOR)
+                return None
+        return limit, cursor
+
+    async def coalesce(self, key, fetch, *args):
         """
-        Retrieve all entities of a given type from Redis.
+        Run a read shared with concurrent requests for the same key.
 
-        This method iterates through all IDs from 0 to the current autoID value
-        and collects all non-empty hash records.
+        Identical reads in flight at the same time are collapsed into one
+        (see SingleFlight); single_flight_requests counts per route how many
+        requests started a fetch and how many joined one.
 
         Args:
-            entity_prefix (str): Redis key prefix for the entity type (e.g., "hospital:")
-            auto_id_key (str): Redis key for the auto-incrementing ID (e.g., "hospital:autoID")
+            key (tuple): Identity of the read, including every argument that
+                changes its result
+            fetch: Module-level read coroutine function taking the Redis
+                connection first (e.g., read_entity_page)
+            *args: Remaining arguments passed to fetch
 
         Returns:
-            list: List of dictionaries containing entity data, or empty list on error
+            The fetch's result, shared with the other requests (do not mutate)
+
+        Raises:
+            Exception: Whatever the fetch raised
+        """
+        result = "collapsed" if key in single_flight.calls else "leader"
+        single_flight_requests.inc((self.route, result))
+        return await single_flight.run(key, fetch, self.get_redis_connection(), *args)
 
-        Note:
-            This approach is O(n) where n is the current autoID value. For better
-            performance with large datasets, consider using Redis Sets to track
-            existing entity IDs.
+    async def get_entity_page(self, entity_prefix, index_key, version=None):
         """
-        items = []
-        try:
-            redis_conn = self.get_redis_connection()
-            auto_id_bytes = redis_conn.get(auto_id_key)
+        Retrieve the page of entities selected by the request's limit and cursor.
 
-            if not auto_id_bytes:
-                return items
+        Only the requested window of the ID index is read, followed by one
+        pipelined fetch of the hashes on that page, so the cost of a page does
+        not depend on the total number of entities. Concurrent requests for
+        the same page at the same version share one read (see coalesce).
 
-            max_id = int(auto_id_bytes.decode())
+        Args:
+            entity_prefix (str): Redis key prefix for the entity type (e.g., "hospital:")
+            index_key (str): Redis key of the entity's ID index (e.g., "hospital:ids")
+            version (bytes): Version of the entity type read before the page
+                (see render_list_page); a read started at another version is
+                never shared
+
+        Returns:
+            dict: Template arguments - items (list of (entity_id, entity_data)
+            pairs), next_cursor, prev_cursor and limit. On error the response
+            status is set and items is empty.
+        """
+        page = {"items": [], "next_cursor": None, "prev_cursor": None}
+        page_args = self.get_page_args()
+        if page_args is None:
+            return page
+        page["limit"], cursor = page_args
 
-            for i in range(max_id):
-                entity_key = f"{entity_prefix}{i}"
-                result = redis_conn.hgetall(entity_key)
-                if result:
-                    items.append(result)
+        try:
+            items, next_cursor, prev_cursor = await self.coalesce(
+                ("page", index_key, version, page["limit"], cursor),
+                read_entity_page,
+                entity_prefix,
+                index_key,
+                page["limit"],
+                cursor,
+            )
+            page["items"] = items
+            page["next_cursor"] = next_cursor
+            page["prev_cursor"] = prev_cursor
 
         except redis.exceptions.ConnectionError as e:
             self.handle_redis_error(e)
-            return []
         except (ValueError, AttributeError) as e:
-            logging.error(f"Error decoding autoID for {entity_prefix}: {e}")
-            self.set_status(500)
-            self.write(ERROR_SOMETHING_WRONG)
-            return []
+            self._handle_value_error(e)
 
-        return items
+        return page
 
-    def get_next_id(self, auto_id_key):
+    def get_page_etag(self, version):
         """
-        Get the next available ID for an entity type and increment the counter.
+        Build the ETag of a list page rendered at a version.
+
+        A page rendered at one version of its entity type is the same on
+        every worker, so the version and a digest of the templates identify
+        it. The digest is computed once by make_app; template edits restart
+        the server in debug mode (see make_app), so they still change it.
 
         Args:
-            auto_id_key (str): Redis key for the auto-incrementing ID
+            version (bytes): Version of the page's entity type
 
         Returns:
-            str: The ID to use for the new entity (as string)
+            str: Quoted ETag, e.g. '"42-0123456789ab"'
+        """
+        digest = self.settings["templates_digest"]
+        return f'"{version.decode()}-{digest}"'
 
-        Raises:
-            redis.exceptions.ConnectionError: If Redis connection fails
-            ValueError: If autoID cannot be decoded
+    async def render_list_page(self, template_name, get_page, *args):
         """
-        redis_conn = self.get_redis_connection()
-        current_id_bytes = redis_conn.get(auto_id_key)
+        Render a list page, answering conditional GETs and caching the result.
+
+        The entity type's version (VERSION_KEY) is read first and the page's
+        ETag derived from it (see get_page_etag). When the request's
+        If-None-Match already names that ETag the response is 304 Not
+        Modified; when the page with the request's limit and cursor was
+        already rendered at that ETag it is written from page_cache. Either
+        way an unchanged page costs a single round trip and no rendering.
+        Otherwise get_page fetches the template arguments and the rendered
+        page is cached. get_page receives the version so that it only shares
+        reads started at that version: a read started before a create must
+        not be rendered and cached under the ETag of the create. Types
+        without a version yet (nothing created through the application) get
+        neither an ETag nor a cache entry.
+
+        Args:
+            template_name (str): Template path
+            get_page: Coroutine function returning the template arguments
+                (e.g., get_entity_page), called with *args and the version
+                keyword; it sets the response status on error
+            *args: Arguments passed to get_page
+        """
+        page_args = self.get_page_args()
+        if page_args is None:
+            return
+        key = (self.request.path, *page_args)
+        try:
+            redis_conn = self.get_redis_connection()
+            version = await await_redis(redis_conn.get(self.VERSION_KEY))
+        except redis.exceptions.ConnectionError as e:
+            self.handle_redis_error(e)
+            return
 
-        if not current_id_bytes:
-            raise ValueError(f"AutoID key {auto_id_key} not found")
+        etag = None
+        if version is not None:
+            etag = self.get_page_etag(version)
+            self.set_header("Etag", etag)
+            # Browsers must revalidate, which costs them a 304 at most
+            self.set_header("Cache-Control", "no-cache")
+            if self.check_etag_header():
+                self.set_status(304)
+                self.finish()
+                return
+            if page_cache.max_entries > 0:
+                html = page_cache.get(key, etag)
+                result = "miss" if html is None else "hit"
+                page_cache_lookups.inc((self.route, result))
+                if html is not None:
+                    self.finish(html)
+                    return
 
-        current_id = current_id_bytes.decode()
-        redis_conn.incr(auto_id_key)
-        return current_id
+        page = await get_page(*args, version=version)
+        if self.get_status() != 200:
+            return
+        page_rows.observe((self.route,), len(page["items"]))
+        html = self.render_string(template_name, **page)
+        if etag is not None:
+            page_cache.put(key, etag, html)
+        self.finish(html)
 
-    def create_entity(self, entity_key, fields_dict, expected_field_count):
+    async def get_next_id(self, auto_id_key):
         """
-        Create a new entity in Redis using a hash structure.
+        Allocate the next available ID for an entity type.
 
-        Uses Redis pipeline for atomic batch operations to ensure all fields
-        are set together or not at all.
+        IDs come from the per-process block allocator (id_allocator), so only
+        one create per ID_BLOCK_SIZE touches the shared autoID counter.
 
         Args:
-            entity_key (str): Full Redis key for the entity (e.g., "hospital:1")
-            fields_dict (dict): Dictionary mapping field names to values
-            expected_field_count (int): Expected number of fields to be set
+            auto_id_key (str): Redis key for the auto-incrementing ID
 
         Returns:
-            bool: True if all fields were set successfully, False otherwise
+            str: The ID to use for the new entity (as string)
+
+        Raises:
+            redis.exceptions.ConnectionError: If Redis connection fails
+            ValueError: If autoID is not initialized
         """
-        try:
-            redis_conn = self.get_redis_connection()
+        return await id_allocator.next_id(self.get_redis_connection(), auto_id_key)
+
+    async def create_entity(
+        self,
+        entity_prefix,
+        auto_id_key,
+        index_key,
+        fields_dict,
+        reference_key="",
+        reference_field="",
+        unique_key="",
+        unique_value="",
+        search_key="",
+        search_term="",
+        reverse_key="",
+        version_key="",
+    ):
+        """
+        Create a new entity in Redis using a hash structure.
 
-            # Use pipeline for atomic batch operations
-            pipe = redis_conn.pipeline()
-            for field_name, field_value in fields_dict.items():
-                pipe.hset(entity_key, field_name, field_value)
-            results = pipe.execute()
+        The ID comes from the block allocator (see get_next_id); the
+        referential check, the unique index claim, the hash write and the ID,
+        search and reverse index updates and the version bump run in one
+        server-side Lua script (CREATE_ENTITY_LUA), so a create costs a single
+        atomic round trip.
+        IDs of rejected creates are released for reuse. The created entity
+        and the entity it refers to are remembered in known_entities when
+        existence checks ask about their type (KNOWN_ENTITY_PREFIXES).
 
-            # Count successful operations (hset returns 1 for new field, 0 for existing)
-            # Sum should equal expected_field_count if all fields are new
-            total_operations = sum(results)
+        Args:
+            entity_prefix (str): Redis key prefix for the entity type (e.g., "doctor:")
+            auto_id_key (str): Redis key for the auto-incrementing ID
+            index_key (str): Redis key of the entity's ID index (e.g., "doctor:ids")
+            fields_dict (dict): Dictionary mapping field names to values
+            reference_key (str): Key of an entity that must exist (e.g., "hospital:1")
+            reference_field (str): Field of the referenced entity to return
+            unique_key (str): Unique index hash the entity claims a value in
+                (e.g., "patient:mpn")
+            unique_value (str): Value claimed in the unique index
+            search_key (str): Search index the entity is added to
+                (e.g., "patient:surnames")
+            search_term (str): Normalized term to index (see normalize_search_term)
+            reverse_key (str): Set of the referenced entity the new ID is
+                added to (e.g., "hospital-doctor:1")
+            version_key (str): Version counter of the entity type (e.g.,
+                "doctor:version")
 
-            # Note: hset returns 1 for new fields, 0 for updates
-            # We check if we got the expected number of operations
-            # In practice, this validates that all fields were processed
-            return total_operations >= expected_field_count
+        Returns:
+            tuple: (entity_id, reference_value) where entity_id is None if the
+            referenced entity does not exist and reference_value is the
+            requested field as bytes (or None)
 
-        except redis.exceptions.ConnectionError as e:
-            self.handle_redis_error(e)
-            return False
-        except Exception as e:
-            logging.error(f"Error creating entity {entity_key}: {e}")
-            return False
+        Raises:
+            DuplicateEntityError: If another entity holds unique_value
+            redis.exceptions.ConnectionError: If Redis connection fails
+            ValueError: If autoID is not initialized
+        """
+        entity_id = await self.get_next_id(auto_id_key)
+        keys, args = create_entity_call(
+            entity_prefix,
+            index_key,
+            entity_id,
+            fields_dict,
+            reference_key,
+            reference_field,
+            unique_key,
+            unique_value,
+            search_key,
+            search_term,
+            reverse_key,
+            version_key,
+        )
 
-    def check_entity_exists(self, entity_key):
+        try:
+            result = await create_entity_script(self.get_redis_connection(), keys, args)
+        except redis.exceptions.ResponseError as e:
+            raise ValueError(f"Error creating {entity_prefix} entity: {e}") from e
+
+        if result is None:
+            id_allocator.release(auto_id_key, entity_id)
+            return None, None
+        if result[0] is None:
+            id_allocator.release(auto_id_key, entity_id)
+            raise DuplicateEntityError(unique_key, unique_value, result[1].decode())
+        for key in (f"{entity_prefix}{entity_id}", reference_key):
+            if key.startswith(KNOWN_ENTITY_PREFIXES):
+                known_entities.add(key)
+        return entity_id, result[1]
+
+    async def check_entities_exist(self, entity_keys):
         """
-        Check if an entity exists in Redis.
+        Check that entities exist, asking Redis only about keys not known yet.
+
+        Keys missing from known_entities are checked with one pipeline of
+        EXISTS commands and remembered when present, so checks of entities
+        seen before by this process cost no round trip.
 
         Args:
-            entity_key (str): Full Redis key for the entity
+            entity_keys (list): Full Redis keys of the entities
 
         Returns:
-            bool: True if entity exists, False otherwise
+            bool: True if every entity exists, False otherwise
+
+        Raises:
+            redis.exceptions.ConnectionError: If Redis connection fails
         """
-        try:
-            redis_conn = self.get_redis_connection()
-            result = redis_conn.hgetall(entity_key)
-            return bool(result)
-        except redis.exceptions.ConnectionError as e:
-            self.handle_redis_error(e)
-            return False
+        unknown_keys = [key for key in entity_keys if not known_entities.contains(key)]
+        if not unknown_keys:
+            return True
+        found = await fetch_pipelined(
+            self.get_redis_connection(), "exists", unknown_keys
+        )
+        for key, exists in zip(unknown_keys, found):
+            if exists:
+                known_entities.add(key)
+        return all(found)
 
     def _handle_value_error(self, error):
         """
@@ -209,6 +2617,7 @@ class BaseRedisHandler(tornado.web.RequestHandler):
         """
         self.set_status(500)
         self.write(ERROR_SOMETHING_WRONG)
+        handler_errors.inc((self.route, "value_error"))
         logging.error(f"Value error: {error}")
 
 
@@ -233,22 +2642,43 @@ class HospitalHandler(BaseRedisHandler):
     - POST: Create a new hospital with name, address, beds_number, and phone
     """
 
-    # Expected number of fields for a hospital entity
-    HOSPITAL_FIELD_COUNT = 4
+    ENTITY_PREFIX = KEY_PREFIX_HOSPITAL
+    AUTO_ID_KEY = KEY_AUTO_ID_HOSPITAL
+    INDEX_KEY = KEY_INDEX_HOSPITAL
+    VERSION_KEY = KEY_VERSION_HOSPITAL
+    FIELDS = ("name", "address", "phone", "beds_number")
 
-    def get(self):
+    @staticmethod
+    def validate(fields):
+        """
+        Validate the fields of a new hospital: name and address are required.
+
+        Args:
+            fields (dict): Field values by name (see FIELDS)
+
+        Returns:
+            str: Error message, or None if the fields are valid
         """
-        Retrieve and display all hospitals.
+        if not fields["name"] or not fields["address"]:
+            return "Hospital name and address required"
+        return None
 
-        Renders the hospital.html template with a list of all hospital records.
+    async def get(self):
         """
-        items = self.get_all_entities(KEY_PREFIX_HOSPITAL, KEY_AUTO_ID_HOSPITAL)
+        Retrieve and display one page of hospitals.
 
-        # Only render if we didn't encounter an error (items would be empty list on error)
-        if self.get_status() != 400:
-            self.render("templates/hospital.html", items=items)
+        Query parameters limit and cursor select the page (see get_page_args).
+        Renders the hospital.html template with the records of that page, served
+        from the page cache while no hospital was created (see render_list_page).
+        """
+        await self.render_list_page(
+            "templates/hospital.html",
+            self.get_entity_page,
+            KEY_PREFIX_HOSPITAL,
+            KEY_INDEX_HOSPITAL,
+        )
 
-    def post(self):
+    async def post(self):
         """
         Create a new hospital.
 
@@ -267,11 +2697,18 @@ class HospitalHandler(BaseRedisHandler):
         address = self.get_argument("address")
         beds_number = self.get_argument("beds_number")
         phone = self.get_argument("phone")
+        fields = {
+            "name": name,
+            "address": address,
+            "phone": phone,
+            "beds_number": beds_number,
+        }
 
         # Validate required fields
-        if not name or not address:
+        error = self.validate(fields)
+        if error:
             self.set_status(400)
-            self.write("Hospital name and address required")
+            self.write(error)
             return
 
         logging.debug(
@@ -279,26 +2716,15 @@ class HospitalHandler(BaseRedisHandler):
         )
 
         try:
-            # Get next available ID
-            entity_id = self.get_next_id(KEY_AUTO_ID_HOSPITAL)
-            entity_key = f"{KEY_PREFIX_HOSPITAL}{entity_id}"
-
-            # Prepare fields dictionary
-            fields = {
-                "name": name,
-                "address": address,
-                "phone": phone,
-                "beds_number": beds_number,
-            }
-
-            # Create entity using batch operation
-            success = self.create_entity(entity_key, fields, self.HOSPITAL_FIELD_COUNT)
-
-            if success:
-                self.write(f"OK: ID {entity_id} for {name}")
-            else:
-                self.set_status(500)
-                self.write(ERROR_SOMETHING_WRONG)
+            # Allocate ID and create entity in one atomic round trip
+            entity_id, _ = await self.create_entity(
+                KEY_PREFIX_HOSPITAL,
+                KEY_AUTO_ID_HOSPITAL,
+                KEY_INDEX_HOSPITAL,
+                fields,
+                version_key=KEY_VERSION_HOSPITAL,
+            )
+            self.write(f"OK: ID {entity_id} for {name}")
 
         except redis.exceptions.ConnectionError as e:
             self.handle_redis_error(e)
@@ -306,6 +2732,53 @@ class HospitalHandler(BaseRedisHandler):
             self._handle_value_error(e)
 
 
+class HospitalDoctorsHandler(BaseRedisHandler):
+    """
+    Handler for the doctor roster of one hospital.
+
+    Supports:
+    - GET: The hospital and every doctor working there as JSON
+    """
+
+    ROUTE = "/hospital/{id}/doctors"
+
+    async def get(self, hospital_id):
+        """
+        Retrieve the doctors of a hospital from its reverse index.
+
+        The roster is read with read_hospital_roster, in two round trips
+        however many doctors are stored. Concurrent requests for the same
+        hospital share one read (see coalesce).
+
+        Args:
+            hospital_id (str): ID of the hospital
+
+        Returns:
+            JSON object {"hospital": {"id", fields...}, "doctors": [{"id",
+            fields...}]} with doctors in ID order, or error message on failure
+        """
+        try:
+            hospital, doctors = await self.coalesce(
+                ("roster", hospital_id), read_hospital_roster, hospital_id
+            )
+        except redis.exceptions.ConnectionError as e:
+            self.handle_redis_error(e)
+            return
+        if not hospital:
+            self.set_status(404)
+            self.write("No hospital with such ID")
+            return
+
+        self.write(
+            {
+                "hospital": decode_record(hospital_id, hospital),
+                "doctors": [
+                    decode_record(doctor_id, doctor) for doctor_id, doctor in doctors
+                ],
+            }
+        )
+
+
 class DoctorHandler(BaseRedisHandler):
     """
     Handler for doctor-related operations.
@@ -315,21 +2788,46 @@ class DoctorHandler(BaseRedisHandler):
     - POST: Create a new doctor with surname, profession, and optional hospital_ID
     """
 
-    # Expected number of fields for a doctor entity
-    DOCTOR_FIELD_COUNT = 3
+    ENTITY_PREFIX = KEY_PREFIX_DOCTOR
+    AUTO_ID_KEY = KEY_AUTO_ID_DOCTOR
+    INDEX_KEY = KEY_INDEX_DOCTOR
+    VERSION_KEY = KEY_VERSION_DOCTOR
+    FIELDS = ("surname", "profession", "hospital_ID")
+    SEARCH = ("surname", KEY_SEARCH_DOCTOR)
+    REVERSE_INDEX = KEY_PREFIX_HOSPITAL_DOCTOR
+    REFERENCE = ("hospital_ID", KEY_PREFIX_HOSPITAL, "", "No hospital with such ID")
+
+    @staticmethod
+    def validate(fields):
+        """
+        Validate the fields of a new doctor: surname and profession are required.
+
+        Args:
+            fields (dict): Field values by name (see FIELDS)
 
-    def get(self):
+        Returns:
+            str: Error message, or None if the fields are valid
         """
-        Retrieve and display all doctors.
+        if not fields["surname"] or not fields["profession"]:
+            return "Surname and profession required"
+        return None
 
-        Renders the doctor.html template with a list of all doctor records.
+    async def get(self):
         """
-        items = self.get_all_entities(KEY_PREFIX_DOCTOR, KEY_AUTO_ID_DOCTOR)
+        Retrieve and display one page of doctors.
 
-        if self.get_status() != 400:
-            self.render("templates/doctor.html", items=items)
+        Query parameters limit and cursor select the page (see get_page_args).
+        Renders the doctor.html template with the records of that page, served
+        from the page cache while no doctor was created (see render_list_page).
+        """
+        await self.render_list_page(
+            "templates/doctor.html",
+            self.get_entity_page,
+            KEY_PREFIX_DOCTOR,
+            KEY_INDEX_DOCTOR,
+        )
 
-    def post(self):
+    async def post(self):
         """
         Create a new doctor.
 
@@ -348,43 +2846,44 @@ class DoctorHandler(BaseRedisHandler):
         surname = self.get_argument("surname")
         profession = self.get_argument("profession")
         hospital_ID = self.get_argument("hospital_ID")
+        fields = {
+            "surname": surname,
+            "profession": profession,
+            "hospital_ID": hospital_ID,
+        }
 
         # Validate required fields
-        if not surname or not profession:
+        error = self.validate(fields)
+        if error:
             self.set_status(400)
-            self.write("Surname and profession required")
+            self.write(error)
             return
 
-        logging.debug(f"Doctor creation: surname={surname}, profession={profession}")
-
-        try:
-            # Validate hospital_ID if provided
-            if hospital_ID:
-                hospital_key = f"{KEY_PREFIX_HOSPITAL}{hospital_ID}"
-                if not self.check_entity_exists(hospital_key):
-                    self.set_status(400)
-                    self.write("No hospital with such ID")
-                    return
-
-            # Get next available ID
-            entity_id = self.get_next_id(KEY_AUTO_ID_DOCTOR)
-            entity_key = f"{KEY_PREFIX_DOCTOR}{entity_id}"
-
-            # Prepare fields dictionary
-            fields = {
-                "surname": surname,
-                "profession": profession,
-                "hospital_ID": hospital_ID,
-            }
+        logging.debug(f"Doctor creation: surname={surname}, profession={profession}")
 
-            # Create entity using batch operation
-            success = self.create_entity(entity_key, fields, self.DOCTOR_FIELD_COUNT)
+        try:
+            # Validate hospital_ID (if provided), allocate ID and create entity
+            # in one atomic round trip
+            hospital_key, _ = self.get_reference(fields)
+            search_key, search_term = self.get_search(fields)
+            entity_id, _ = await self.create_entity(
+                KEY_PREFIX_DOCTOR,
+                KEY_AUTO_ID_DOCTOR,
+                KEY_INDEX_DOCTOR,
+                fields,
+                reference_key=hospital_key,
+                search_key=search_key,
+                search_term=search_term,
+                reverse_key=self.get_reverse_key(fields),
+                version_key=KEY_VERSION_DOCTOR,
+            )
+
+            if entity_id is None:
+                self.set_status(400)
+                self.write(self.REFERENCE[3])
+                return
 
-            if success:
-                self.write(f"OK: ID {entity_id} for {surname}")
-            else:
-                self.set_status(500)
-                self.write(ERROR_SOMETHING_WRONG)
+            self.write(f"OK: ID {entity_id} for {surname}")
 
         except redis.exceptions.ConnectionError as e:
             self.handle_redis_error(e)
@@ -401,21 +2900,97 @@ class PatientHandler(BaseRedisHandler):
     - POST: Create a new patient with surname, born_date, sex, and mpn
     """
 
-    # Expected number of fields for a patient entity
-    PATIENT_FIELD_COUNT = 4
+    ENTITY_PREFIX = KEY_PREFIX_PATIENT
+    AUTO_ID_KEY = KEY_AUTO_ID_PATIENT
+    INDEX_KEY = KEY_INDEX_PATIENT
+    VERSION_KEY = KEY_VERSION_PATIENT
+    FIELDS = ("surname", "born_date", "sex", "mpn")
+    UNIQUE = ("mpn", KEY_UNIQUE_MPN, "Patient with such MPN already exists")
+    SEARCH = ("surname", KEY_SEARCH_PATIENT)
 
-    def get(self):
+    @staticmethod
+    def validate(fields):
+        """
+        Validate the fields of a new patient: all fields are required and sex
+        must be one of VALID_SEX_VALUES.
+
+        Args:
+            fields (dict): Field values by name (see FIELDS)
+
+        Returns:
+            str: Error message, or None if the fields are valid
+        """
+        if not all(fields[name] for name in PatientHandler.FIELDS):
+            return "All fields required"
+        if fields["sex"] not in VALID_SEX_VALUES:
+            return "Sex must be 'M' or 'F'"
+        return None
+
+    async def get(self):
+        """
+        Retrieve and display one page of patients.
+
+        Query parameters limit and cursor select the page (see get_page_args).
+        With the mpn query parameter only the patient holding that medical
+        policy number is shown, found through the MPN index in one round trip.
+        Renders the patient.html template with the records of that page, served
+        from the page cache while no patient was created (see render_list_page).
         """
-        Retrieve and display all patients.
+        mpn = self.get_argument("mpn", None)
+        if mpn is None:
+            await self.render_list_page(
+                "templates/patient.html",
+                self.get_entity_page,
+                KEY_PREFIX_PATIENT,
+                KEY_INDEX_PATIENT,
+            )
+            return
+
+        page = await self.find_by_mpn(mpn)
+        if self.get_status() == 200:
+            self.render("templates/patient.html", **page)
 
-        Renders the patient.html template with a list of all patient records.
+    async def find_by_mpn(self, mpn):
         """
-        items = self.get_all_entities(KEY_PREFIX_PATIENT, KEY_AUTO_ID_PATIENT)
+        Look up the patient holding a medical policy number.
 
-        if self.get_status() != 400:
-            self.render("templates/patient.html", items=items)
+        Concurrent lookups of the same MPN share one script call (see coalesce).
+
+        Args:
+            mpn (str): Medical policy number
 
-    def post(self):
+        Returns:
+            dict: Template arguments as returned by get_entity_page, with the
+            patient as the only item. Sets status 404 when no patient holds
+            the MPN.
+        """
+        page = {
+            "items": [],
+            "next_cursor": None,
+            "prev_cursor": None,
+            "limit": PAGE_SIZE_DEFAULT,
+        }
+        try:
+            result = await self.coalesce(
+                ("mpn", mpn),
+                find_unique_script,
+                [KEY_UNIQUE_MPN],
+                [mpn, KEY_PREFIX_PATIENT],
+            )
+        except redis.exceptions.ConnectionError as e:
+            self.handle_redis_error(e)
+            return page
+
+        if result is None or not result[1]:
+            self.set_status(404)
+            self.write("No patient with such MPN")
+            return page
+        patient_id, flat_fields = result
+        patient = dict(zip(flat_fields[::2], flat_fields[1::2]))
+        page["items"] = [(patient_id.decode(), patient)]
+        return page
+
+    async def post(self):
         """
         Create a new patient.
 
@@ -434,17 +3009,18 @@ class PatientHandler(BaseRedisHandler):
         born_date = self.get_argument("born_date")
         sex = self.get_argument("sex")
         mpn = self.get_argument("mpn")
-
-        # Validate all required fields are provided
-        if not surname or not born_date or not sex or not mpn:
-            self.set_status(400)
-            self.write("All fields required")
-            return
-
-        # Validate sex value (must be 'M' or 'F')
-        if sex not in VALID_SEX_VALUES:
+        fields = {
+            "surname": surname,
+            "born_date": born_date,
+            "sex": sex,
+            "mpn": mpn,
+        }
+
+        # Validate required fields and sex value (must be 'M' or 'F')
+        error = self.validate(fields)
+        if error:
             self.set_status(400)
-            self.write("Sex must be 'M' or 'F'")
+            self.write(error)
             return
 
         logging.debug(
@@ -452,31 +3028,81 @@ class PatientHandler(BaseRedisHandler):
         )
 
         try:
-            # Get next available ID
-            entity_id = self.get_next_id(KEY_AUTO_ID_PATIENT)
-            entity_key = f"{KEY_PREFIX_PATIENT}{entity_id}"
-
-            # Prepare fields dictionary
-            fields = {
-                "surname": surname,
-                "born_date": born_date,
-                "sex": sex,
-                "mpn": mpn,
-            }
+            # Allocate ID, claim the MPN and create entity in one atomic round trip
+            unique_key, unique_value = self.get_unique(fields)
+            search_key, search_term = self.get_search(fields)
+            entity_id, _ = await self.create_entity(
+                KEY_PREFIX_PATIENT,
+                KEY_AUTO_ID_PATIENT,
+                KEY_INDEX_PATIENT,
+                fields,
+                unique_key=unique_key,
+                unique_value=unique_value,
+                search_key=search_key,
+                search_term=search_term,
+                version_key=KEY_VERSION_PATIENT,
+            )
+            self.write(f"OK: ID {entity_id} for {surname}")
+
+        except DuplicateEntityError:
+            self.set_status(400)
+            self.write(self.UNIQUE[2])
+        except redis.exceptions.ConnectionError as e:
+            self.handle_redis_error(e)
+        except ValueError as e:
+            self._handle_value_error(e)
 
-            # Create entity using batch operation
-            success = self.create_entity(entity_key, fields, self.PATIENT_FIELD_COUNT)
 
-            if success:
-                self.write(f"OK: ID {entity_id} for {surname}")
-            else:
-                self.set_status(500)
-                self.write(ERROR_SOMETHING_WRONG)
+class PatientChartHandler(BaseRedisHandler):
+    """
+    Handler for the chart of one patient.
+
+    Supports:
+    - GET: The patient with their diagnoses and doctors as JSON
+    """
 
+    ROUTE = "/patient/{id}/chart"
+
+    async def get(self, patient_id):
+        """
+        Retrieve a patient's chart from the patient reverse indexes.
+
+        The chart is read with read_patient_chart, in two round trips however
+        many diagnoses and doctors are stored. Concurrent requests for the
+        same patient share one read (see coalesce).
+
+        Args:
+            patient_id (str): ID of the patient
+
+        Returns:
+            JSON object {"patient": {"id", fields...}, "diagnoses": [{"id",
+            fields...}], "doctors": [{"id", fields...}]} with diagnoses and
+            doctors in ID order, or error message on failure
+        """
+        try:
+            patient, diagnoses, doctors = await self.coalesce(
+                ("chart", patient_id), read_patient_chart, patient_id
+            )
         except redis.exceptions.ConnectionError as e:
             self.handle_redis_error(e)
-        except ValueError as e:
-            self._handle_value_error(e)
+            return
+        if not patient:
+            self.set_status(404)
+            self.write("No patient with such ID")
+            return
+
+        self.write(
+            {
+                "patient": decode_record(patient_id, patient),
+                "diagnoses": [
+                    decode_record(diagnosis_id, diagnosis)
+                    for diagnosis_id, diagnosis in diagnoses
+                ],
+                "doctors": [
+                    decode_record(doctor_id, doctor) for doctor_id, doctor in doctors
+                ],
+            }
+        )
 
 
 class DiagnosisHandler(BaseRedisHandler):
@@ -488,21 +3114,45 @@ class DiagnosisHandler(BaseRedisHandler):
     - POST: Create a new diagnosis linked to a patient
     """
 
-    # Expected number of fields for a diagnosis entity
-    DIAGNOSIS_FIELD_COUNT = 3
+    ENTITY_PREFIX = KEY_PREFIX_DIAGNOSIS
+    AUTO_ID_KEY = KEY_AUTO_ID_DIAGNOSIS
+    INDEX_KEY = KEY_INDEX_DIAGNOSIS
+    VERSION_KEY = KEY_VERSION_DIAGNOSIS
+    FIELDS = ("patient_ID", "type", "information")
+    REFERENCE = ("patient_ID", KEY_PREFIX_PATIENT, "surname", "No patient with such ID")
+    REVERSE_INDEX = KEY_PREFIX_PATIENT_DIAGNOSIS
 
-    def get(self):
+    @staticmethod
+    def validate(fields):
+        """
+        Validate the fields of a new diagnosis: patient_ID and type are required.
+
+        Args:
+            fields (dict): Field values by name (see FIELDS)
+
+        Returns:
+            str: Error message, or None if the fields are valid
         """
-        Retrieve and display all diagnoses.
+        if not fields["patient_ID"] or not fields["type"]:
+            return "Patient ID and diagnosis type required"
+        return None
 
-        Renders the diagnosis.html template with a list of all diagnosis records.
+    async def get(self):
         """
-        items = self.get_all_entities(KEY_PREFIX_DIAGNOSIS, KEY_AUTO_ID_DIAGNOSIS)
+        Retrieve and display one page of diagnoses.
 
-        if self.get_status() != 400:
-            self.render("templates/diagnosis.html", items=items)
+        Query parameters limit and cursor select the page (see get_page_args).
+        Renders the diagnosis.html template with the records of that page, served
+        from the page cache while no diagnosis was created (see render_list_page).
+        """
+        await self.render_list_page(
+            "templates/diagnosis.html",
+            self.get_entity_page,
+            KEY_PREFIX_DIAGNOSIS,
+            KEY_INDEX_DIAGNOSIS,
+        )
 
-    def post(self):
+    async def post(self):
         """
         Create a new diagnosis for a patient.
 
@@ -521,11 +3171,17 @@ class DiagnosisHandler(BaseRedisHandler):
         patient_ID = self.get_argument("patient_ID")
         diagnosis_type = self.get_argument("type")
         information = self.get_argument("information")
+        fields = {
+            "patient_ID": patient_ID,
+            "type": diagnosis_type,
+            "information": information,
+        }
 
         # Validate required fields
-        if not patient_ID or not diagnosis_type:
+        error = self.validate(fields)
+        if error:
             self.set_status(400)
-            self.write("Patient ID and diagnosis type required")
+            self.write(error)
             return
 
         logging.debug(
@@ -533,36 +3189,28 @@ class DiagnosisHandler(BaseRedisHandler):
         )
 
         try:
-            # Validate that patient exists
-            patient_key = f"{KEY_PREFIX_PATIENT}{patient_ID}"
-            patient = self.get_redis_connection().hgetall(patient_key)
-
-            if not patient:
+            # Validate that patient exists, allocate ID and create entity in one
+            # atomic round trip; the patient's surname comes back with the ID
+            patient_key, surname_field = self.get_reference(fields)
+            entity_id, patient_surname = await self.create_entity(
+                KEY_PREFIX_DIAGNOSIS,
+                KEY_AUTO_ID_DIAGNOSIS,
+                KEY_INDEX_DIAGNOSIS,
+                fields,
+                reference_key=patient_key,
+                reference_field=surname_field,
+                reverse_key=self.get_reverse_key(fields),
+                version_key=KEY_VERSION_DIAGNOSIS,
+            )
+
+            if entity_id is None:
                 self.set_status(400)
-                self.write("No patient with such ID")
+                self.write(self.REFERENCE[3])
                 return
 
-            # Get next available ID
-            entity_id = self.get_next_id(KEY_AUTO_ID_DIAGNOSIS)
-            entity_key = f"{KEY_PREFIX_DIAGNOSIS}{entity_id}"
-
-            # Prepare fields dictionary
-            fields = {
-                "patient_ID": patient_ID,
-                "type": diagnosis_type,
-                "information": information,
-            }
-
-            # Create entity using batch operation
-            success = self.create_entity(entity_key, fields, self.DIAGNOSIS_FIELD_COUNT)
-
-            if success:
-                # Extract patient surname for response message
-                patient_surname = patient.get(b"surname", b"Unknown").decode()
-                self.write(f"OK: ID {entity_id} for patient {patient_surname}")
-            else:
-                self.set_status(500)
-                self.write(ERROR_SOMETHING_WRONG)
+            # Extract patient surname for response message
+            patient_surname = (patient_surname or b"Unknown").decode()
+            self.write(f"OK: ID {entity_id} for patient {patient_surname}")
 
         except redis.exceptions.ConnectionError as e:
             self.handle_redis_error(e)
@@ -579,41 +3227,63 @@ class DoctorPatientHandler(BaseRedisHandler):
     - POST: Create a link between a doctor and a patient
     """
 
-    def get(self):
+    VERSION_KEY = KEY_VERSION_DOCTOR_PATIENT
+
+    async def get(self):
         """
-        Retrieve and display all doctor-patient relationships.
+        Retrieve and display the doctor-patient relationships of one page of doctors.
 
-        Uses Redis Sets to store relationships (one set per doctor containing patient IDs).
-        Renders the doctor-patient.html template with relationship data.
+        Query parameters limit and cursor select the page (see get_page_args).
+        Renders the doctor-patient.html template with relationship data,
+        served from the page cache while no link was created (see
+        render_list_page).
         """
-        items = {}
-        try:
-            redis_conn = self.get_redis_connection()
-            auto_id_bytes = redis_conn.get(KEY_AUTO_ID_DOCTOR)
+        await self.render_list_page("templates/doctor-patient.html", self.get_link_page)
 
-            if not auto_id_bytes:
-                self.render("templates/doctor-patient.html", items=items)
-                return
+    async def get_link_page(self, version=None):
+        """
+        Retrieve the relationships of the page of doctors selected by limit and cursor.
 
-            max_id = int(auto_id_bytes.decode())
+        Uses Redis Sets to store relationships (one set per doctor containing
+        patient IDs), read with read_link_page. Concurrent requests for the
+        same page at the same version share one read (see coalesce).
+
+        Args:
+            version (bytes): Version of the links read before the page (see
+                render_list_page); a read started at another version is never
+                shared
+
+        Returns:
+            dict: Template arguments - items (list of (doctor_id,
+            doctor_surname, patient_id, patient_surname) tuples), next_cursor,
+            prev_cursor and limit. On error the response status is set and
+            items is empty.
+        """
+        page = {"items": [], "next_cursor": None, "prev_cursor": None}
+        page_args = self.get_page_args()
+        if page_args is None:
+            return page
+        page["limit"], cursor = page_args
 
-            for i in range(max_id):
-                relationship_key = f"{KEY_PREFIX_DOCTOR_PATIENT}{i}"
-                result = redis_conn.smembers(relationship_key)
-                if result:
-                    items[i] = result
+        try:
+            items, next_cursor, prev_cursor = await self.coalesce(
+                ("links", version, page["limit"], cursor),
+                read_link_page,
+                page["limit"],
+                cursor,
+            )
+            page["items"] = items
+            page["next_cursor"] = next_cursor
+            page["prev_cursor"] = prev_cursor
 
         except redis.exceptions.ConnectionError as e:
             self.handle_redis_error(e)
         except (ValueError, AttributeError) as e:
-            logging.error(f"Error retrieving doctor-patient relationships: {e}")
-            self.set_status(500)
-            self.write(ERROR_SOMETHING_WRONG)
-        else:
-            if self.get_status() != 400:
-                self.render("templates/doctor-patient.html", items=items)
+            self._handle_value_error(e)
 
-    def post(self):
+        return page
+
+    async def post(self):
         """
         Create a link between a doctor and a patient.
 
@@ -621,8 +3291,11 @@ class DoctorPatientHandler(BaseRedisHandler):
         - doctor_ID: ID of the doctor
         - patient_ID: ID of the patient
 
-        Validates that both doctor and patient exist before creating the relationship.
-        Uses Redis Set to store the relationship (allows multiple patients per doctor).
+        Validates that both doctor and patient exist before creating the
+        relationship, without a round trip when both are known to exist (see
+        check_entities_exist).
+        Uses Redis Sets to store the relationship in both directions (the
+        patients of each doctor and the doctors of each patient).
 
         Returns:
             Success message with both IDs, or error message on failure
@@ -641,23 +3314,25 @@ class DoctorPatientHandler(BaseRedisHandler):
         )
 
         try:
-            redis_conn = self.get_redis_connection()
-
             # Validate that both doctor and patient exist
-            doctor_key = f"{KEY_PREFIX_DOCTOR}{doctor_ID}"
-            patient_key = f"{KEY_PREFIX_PATIENT}{patient_ID}"
-
-            doctor = redis_conn.hgetall(doctor_key)
-            patient = redis_conn.hgetall(patient_key)
-
-            if not patient or not doctor:
+            if not await self.check_entities_exist(
+                [f"{KEY_PREFIX_DOCTOR}{doctor_ID}", f"{KEY_PREFIX_PATIENT}{patient_ID}"]
+            ):
                 self.set_status(400)
                 self.write("No such ID for doctor or patient")
                 return
 
-            # Add patient to doctor's set of patients
-            relationship_key = f"{KEY_PREFIX_DOCTOR_PATIENT}{doctor_ID}"
-            redis_conn.sadd(relationship_key, patient_ID)
+            redis_conn = self.get_redis_connection()
+
+            # Add patient to doctor's set of patients, doctor to patient's set
+            # of doctors and doctor to the index of linked doctors, and bump
+            # the links' version, in one MULTI/EXEC so they stay in step
+            pipe = redis_conn.pipeline(transaction=True)
+            pipe.sadd(f"{KEY_PREFIX_DOCTOR_PATIENT}{doctor_ID}", patient_ID)
+            pipe.sadd(f"{KEY_PREFIX_PATIENT_DOCTOR}{patient_ID}", doctor_ID)
+            pipe.zadd(KEY_INDEX_DOCTOR_PATIENT, {doctor_ID: int(doctor_ID)})
+            pipe.incr(KEY_VERSION_DOCTOR_PATIENT)
+            await await_redis(pipe.execute())
 
             self.write(f"OK: doctor ID: {doctor_ID}, patient ID: {patient_ID}")
 
@@ -665,6 +3340,531 @@ class DoctorPatientHandler(BaseRedisHandler):
             self.handle_redis_error(e)
 
 
+# Entity handlers whose records can be bulk imported, by URL name
+IMPORT_ENTITIES = {
+    "hospital": HospitalHandler,
+    "doctor": DoctorHandler,
+    "patient": PatientHandler,
+    "diagnosis": DiagnosisHandler,
+}
+
+# Entity handlers searchable by surname prefix, by type name
+SEARCH_ENTITIES = {
+    name: handler for name, handler in IMPORT_ENTITIES.items() if handler.SEARCH
+}
+
+
+class SearchHandler(BaseRedisHandler):
+    """
+    Handler for surname prefix search over patients and doctors.
+
+    Supports:
+    - GET: First matches of a surname prefix as JSON
+    """
+
+    async def get(self):
+        """
+        Find patients and doctors whose surname starts with a prefix.
+
+        Query parameters:
+        - q: Surname prefix, case-insensitive (required)
+        - type: "patient" or "doctor" to search one entity type only
+        - limit: Maximum number of matches (1..SEARCH_LIMIT_MAX, defaults to
+          SEARCH_LIMIT_DEFAULT)
+
+        A search costs two round trips however many names are indexed (see
+        read_search_matches). Concurrent identical searches share one read
+        (see coalesce).
+
+        Returns:
+            JSON object {"query": q, "results": [{"type", "id", fields...}]}
+            ordered by surname, or error message on failure
+        """
+        query = self.get_argument("q", "")
+        entity_type = self.get_argument("type", None)
+        try:
+            limit = int(self.get_argument("limit", SEARCH_LIMIT_DEFAULT))
+        except ValueError:
+            limit = 0
+
+        if not normalize_search_term(query):
+            self.set_status(400)
+            self.write("Search query required")
+            return
+        if entity_type is not None and entity_type not in SEARCH_ENTITIES:
+            self.set_status(400)
+            self.write(f"Type must be one of: {', '.join(SEARCH_ENTITIES)}")
+            return
+        if not 1 <= limit <= SEARCH_LIMIT_MAX:
+            self.set_status(400)
+            self.write(ERROR_INVALID_SEARCH_LIMIT)
+            return
+
+        entities = {
+            handler.SEARCH[1]: (name, handler)
+            for name, handler in SEARCH_ENTITIES.items()
+            if entity_type in (None, name)
+        }
+        entity_prefixes = {
+            search_key: handler.ENTITY_PREFIX
+            for search_key, (_, handler) in entities.items()
+        }
+        try:
+            matches = await self.coalesce(
+                ("search", normalize_search_term(query), entity_type, limit),
+                read_search_matches,
+                entity_prefixes,
+                query,
+                limit,
+            )
+        except redis.exceptions.ConnectionError as e:
+            self.handle_redis_error(e)
+            return
+
+        results = [
+            {"type": entities[search_key][0], **decode_record(entity_id, record)}
+            for search_key, entity_id, record in matches
+        ]
+        self.write({"query": query, "results": results})
+
+
+@tornado.web.stream_request_body
+class ImportHandler(BaseRedisHandler):
+    """
+    Handler for bulk imports of CSV or NDJSON uploads.
+
+    Supports:
+    - POST /import/<entity>: Create one entity per uploaded row
+
+    The body is parsed as it arrives and rows are written in pipelined batches
+    of IMPORT_BATCH_SIZE creates (one EVALSHA of CREATE_ENTITY_LUA per row),
+    so memory use is bounded by the batch size however large the upload is.
+    Rows longer than IMPORT_MAX_ROW_SIZE bytes are skipped and reported.
+    Every row goes through the validation of the entity's POST handler;
+    invalid rows are skipped and listed in the JSON report.
+
+    Query parameters:
+    - format: "csv" or "ndjson" (defaults to csv for a text/csv Content-Type
+      and to ndjson otherwise). CSV uploads start with a header row naming
+      the fields.
+    """
+
+    def prepare(self):
+        """Select the entity and upload format and reset the parser state."""
+        self.request.connection.set_max_body_size(IMPORT_MAX_BODY_SIZE)
+        self.entity_handler = IMPORT_ENTITIES[self.path_args[0]]
+
+        import_format = self.get_argument("format", None)
+        if import_format is None:
+            content_type = self.request.headers.get("Content-Type", "")
+            if "csv" in content_type:
+                import_format = IMPORT_FORMAT_CSV
+            else:
+                import_format = IMPORT_FORMAT_NDJSON
+        if import_format not in IMPORT_FORMATS:
+            self.set_status(400)
+            self.finish(ERROR_INVALID_IMPORT_FORMAT)
+            return
+        self.import_format = import_format
+
+        # Bytes after the last newline, whether the rest of that line is
+        # skipped as too long, lines of an unfinished quoted CSV record with
+        # their size, and the CSV header
+        self.buffer = b""
+        self.skip_line = False
+        self.record_lines = []
+        self.record_size = 0
+        self.columns = None
+        # The first line may start with a UTF-8 byte order mark (spreadsheet
+        # exports), which is not part of the first column name
+        self.first_line = True
+        # (row number, fields) of validated rows waiting to be written
+        self.batch = []
+        # Exception that stopped the import; the rest of the body is ignored
+        self.import_error = None
+        self.report = {
+            "entity": self.path_args[0],
+            "rows": 0,
+            "created": 0,
+            "failed": 0,
+            "errors": [],
+        }
+
+    async def data_received(self, chunk):
+        """
+        Parse the complete lines of a body chunk and write full batches.
+
+        Tornado waits for this coroutine before reading more of the body, so
+        a slow Redis throttles the upload instead of filling memory.
+
+        Args:
+            chunk (bytes): Next part of the request body
+        """
+        if self.import_error is not None:
+            return
+        lines = (self.buffer + chunk).split(b"\n")
+        self.buffer = lines.pop()
+        if self.skip_line and lines:
+            # End of a line already reported as too long
+            del lines[0]
+            self.skip_line = False
+        try:
+            for line in lines:
+                self.parse_line(line)
+                if len(self.batch) >= IMPORT_BATCH_SIZE:
+                    await self.write_batch()
+        except (redis.exceptions.ConnectionError, ValueError) as e:
+            self.import_error = e
+        if len(self.buffer) > IMPORT_MAX_ROW_SIZE:
+            self.buffer = b""
+            if not self.skip_line:
+                self.skip_line = True
+                self.drop_record()
+                self.add_error(ERROR_IMPORT_ROW_TOO_LONG)
+
+    def parse_line(self, line):
+        """
+        Parse one line of the upload and queue the row it completes.
+
+        Args:
+            line (bytes): Line without its trailing newline
+        """
+        encoding = "utf-8-sig" if self.first_line else "utf-8"
+        self.first_line = False
+        if len(line) > IMPORT_MAX_ROW_SIZE:
+            self.drop_record()
+            self.add_error(ERROR_IMPORT_ROW_TOO_LONG)
+            return
+        try:
+            text = line.rstrip(b"\r").decode(encoding)
+        except UnicodeDecodeError:
+            self.add_error("Invalid UTF-8")
+            return
+
+        if self.import_format == IMPORT_FORMAT_NDJSON:
+            if not text.strip():
+                return
+            try:
+                row = json.loads(text)
+            except ValueError:
+                self.add_error("Invalid JSON")
+                return
+            if not isinstance(row, dict):
+                self.add_error("Row must be a JSON object")
+                return
+            self.add_row(row)
+            return
+
+        # A quoted CSV field may contain newlines: wait for the closing quote
+        in_quotes = bool(self.record_lines)
+        self.record_lines.append(text)
+        self.record_size += len(line) + 1
+        if self.record_size > IMPORT_MAX_ROW_SIZE:
+            self.drop_record()
+            self.add_error(ERROR_IMPORT_ROW_TOO_LONG)
+            return
+        if csv_line_ends_in_quotes(text, in_quotes):
+            return
+        record = "\n".join(self.record_lines)
+        self.drop_record()
+        if not record.strip():
+            return
+        values = next(csv.reader(io.StringIO(record)))
+        if self.columns is None:
+            self.columns = [column.strip() for column in values]
+        elif len(values) != len(self.columns):
+            self.add_error(f"Expected {len(self.columns)} columns, got {len(values)}")
+        else:
+            self.add_row(dict(zip(self.columns, values)))
+
+    def drop_record(self):
+        """Forget the lines of the CSV record being read."""
+        self.record_lines = []
+        self.record_size = 0
+
+    def add_row(self, row):
+        """
+        Validate a parsed row and queue it for the next batch.
+
+        Missing fields are treated as empty, so the entity's validation
+        decides whether they are required.
+
+        Args:
+            row (dict): Uploaded values by field name
+        """
+        self.report["rows"] += 1
+        fields = {}
+        for name in self.entity_handler.FIELDS:
+            value = row.get(name)
+            fields[name] = "" if value is None else str(value)
+        error = self.entity_handler.validate(fields)
+        if error:
+            self.add_error(error, count_row=False)
+            return
+        self.batch.append((self.report["rows"], fields))
+
+    def add_error(self, error, row_number=None, count_row=True):
+        """
+        Record a rejected row in the report.
+
+        Only the first IMPORT_MAX_ERRORS errors are listed; the failed counter
+        covers all of them.
+
+        Args:
+            error (str): Reason the row was rejected
+            row_number (int): Row number (defaults to the last parsed row)
+            count_row (bool): Whether the row still has to be counted
+        """
+        if count_row:
+            self.report["rows"] += 1
+        self.report["failed"] += 1
+        if len(self.report["errors"]) < IMPORT_MAX_ERRORS:
+            self.report["errors"].append(
+                {"row": row_number or self.report["rows"], "error": error}
+            )
+
+    async def write_batch(self):
+        """
+        Create the queued rows in one pipeline.
+
+        Raises:
+            redis.exceptions.ConnectionError: If Redis connection fails
+            ValueError: If autoID is not initialized
+        """
+        batch, self.batch = self.batch, []
+        if not batch:
+            return
+        handler = self.entity_handler
+        redis_conn = self.get_redis_connection()
+
+        entity_ids = []
+        calls = []
+        for _, fields in batch:
+            entity_id = await id_allocator.next_id(redis_conn, handler.AUTO_ID_KEY)
+            reference_key, _ = handler.get_reference(fields)
+            unique_key, unique_value = handler.get_unique(fields)
+            search_key, search_term = handler.get_search(fields)
+            entity_ids.append(entity_id)
+            calls.append(
+                create_entity_call(
+                    handler.ENTITY_PREFIX,
+                    handler.INDEX_KEY,
+                    entity_id,
+                    fields,
+                    reference_key,
+                    unique_key=unique_key,
+                    unique_value=unique_value,
+                    search_key=search_key,
+                    search_term=search_term,
+                    reverse_key=handler.get_reverse_key(fields),
+                    version_key=handler.VERSION_KEY,
+                )
+            )
+        results = await create_entity_script.call_many(redis_conn, calls)
+
+        for (row_number, _), entity_id, result in zip(batch, entity_ids, results):
+            if isinstance(result, redis.exceptions.ConnectionError):
+                raise result
+            if result is None or isinstance(result, Exception) or result[0] is None:
+                id_allocator.release(handler.AUTO_ID_KEY, entity_id)
+                if result is None:
+                    error = handler.REFERENCE[3]
+                elif isinstance(result, Exception):
+                    error = str(result)
+                else:
+                    error = handler.UNIQUE[2]
+                self.add_error(error, row_number, count_row=False)
+            else:
+                self.report["created"] += 1
+
+    async def post(self, entity):
+        """
+        Finish the import and write the report.
+
+        Args:
+            entity (str): Name of the imported entity type
+
+        Returns:
+            JSON report with the number of rows read, created and failed and
+            the errors of rejected rows, or error message on failure
+        """
+        if self.import_error is None:
+            try:
+                if self.buffer and not self.skip_line:
+                    self.parse_line(self.buffer)
+                if self.record_lines:
+                    self.drop_record()
+                    self.add_error("Unterminated quoted field")
+                await self.write_batch()
+            except (redis.exceptions.ConnectionError, ValueError) as e:
+                self.import_error = e
+
+        if isinstance(self.import_error, redis.exceptions.ConnectionError):
+            self.handle_redis_error(self.import_error)
+        elif self.import_error is not None:
+            self._handle_value_error(self.import_error)
+        else:
+            logging.info(
+                f"Imported {self.report['created']} of {self.report['rows']} {entity} rows"
+            )
+            self.write(self.report)
+
+
+class ExportHandler(BaseRedisHandler):
+    """
+    Handler for streaming exports as NDJSON or CSV.
+
+    Supports:
+    - GET /export/<entity>: Every entity of a type, or every doctor-patient link
+
+    The ID index is walked in windows of EXPORT_WINDOW_SIZE IDs; the records
+    of each window are read in batched pipelines and flushed to the client as
+    one chunk before the next window is read, so memory use does not depend
+    on the number of rows and the first rows arrive right away.
+
+    Query parameters:
+    - format: "ndjson" (default) or "csv"
+    """
+
+    async def get(self, entity):
+        """
+        Stream all rows of one entity type.
+
+        Args:
+            entity (str): Name of the exported entity type
+        """
+        export_format = self.get_argument("format", IMPORT_FORMAT_NDJSON)
+        if export_format not in IMPORT_FORMATS:
+            self.set_status(400)
+            self.write(ERROR_INVALID_IMPORT_FORMAT)
+            return
+
+        if entity == "doctor-patient":
+            # One row per link, read from the sets of the linked doctors
+            index_key = KEY_INDEX_DOCTOR_PATIENT
+            key_prefix = KEY_PREFIX_DOCTOR_PATIENT
+            command = "smembers"
+            columns = ["doctor_ID", "patient_ID"]
+        else:
+            handler = IMPORT_ENTITIES[entity]
+            index_key = handler.INDEX_KEY
+            key_prefix = handler.ENTITY_PREFIX
+            command = "hgetall"
+            columns = ["ID", *handler.FIELDS]
+
+        redis_conn = self.get_redis_connection()
+        cursor = None
+        streaming = False
+        try:
+            while True:
+                entity_ids, cursor, _ = await read_id_window(
+                    redis_conn, index_key, EXPORT_WINDOW_SIZE, cursor
+                )
+                keys = [f"{key_prefix}{entity_id}" for entity_id in entity_ids]
+                results = await fetch_pipelined(redis_conn, command, keys)
+
+                if not streaming:
+                    streaming = True
+                    self.set_header("Content-Type", CONTENT_TYPES[export_format])
+                    self.set_header(
+                        "Content-Disposition",
+                        f'attachment; filename="{entity}.{export_format}"',
+                    )
+                    if export_format == IMPORT_FORMAT_CSV:
+                        header = [dict(zip(columns, columns))]
+                        self.write(self.format_rows(header, columns, export_format))
+
+                rows = []
+                for entity_id, result in zip(entity_ids, results):
+                    if command == "smembers":
+                        rows.extend(
+                            {"doctor_ID": entity_id, "patient_ID": patient_id.decode()}
+                            for patient_id in sorted(result, key=int)
+                        )
+                    elif result:
+                        row = {"ID": entity_id}
+                        for field, value in result.items():
+                            row[field.decode()] = value.decode()
+                        rows.append(row)
+                self.write(self.format_rows(rows, columns, export_format))
+                await self.flush()
+                if cursor is None:
+                    break
+
+        except tornado.iostream.StreamClosedError:
+            logging.info(f"Client disconnected during export of {entity}")
+        except (redis.exceptions.ConnectionError, ValueError, AttributeError) as e:
+            if not streaming:
+                if isinstance(e, redis.exceptions.ConnectionError):
+                    self.handle_redis_error(e)
+                else:
+                    self._handle_value_error(e)
+                return
+            # The status line is already sent: drop the connection so the
+            # client sees an incomplete transfer instead of a short export
+            logging.error(f"Export of {entity} aborted: {e}")
+            self.request.connection.close()
+
+    @staticmethod
+    def format_rows(rows, columns, export_format):
+        """
+        Serialize rows as NDJSON lines or CSV records.
+
+        Args:
+            rows (list): Row dictionaries
+            columns (list): CSV columns; other fields are left out of CSV rows
+            export_format (str): IMPORT_FORMAT_NDJSON or IMPORT_FORMAT_CSV
+
+        Returns:
+            str: Serialized rows, each terminated by a newline
+        """
+        if export_format == IMPORT_FORMAT_NDJSON:
+            return "".join(json.dumps(row) + "\n" for row in rows)
+        buffer = io.StringIO()
+        writer = csv.DictWriter(
+            buffer, columns, restval="", extrasaction="ignore", lineterminator="\n"
+        )
+        writer.writerows(rows)
+        return buffer.getvalue()
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    """
+    Handler exposing the metrics of this process in the Prometheus text format.
+
+    Supports:
+    - GET: Request latency, Redis usage, render time, page sizes and errors
+    """
+
+    def get(self):
+        """Write all registered metrics."""
+        self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.write(metrics.expose())
+
+
+class StatsHandler(tornado.web.RequestHandler):
+    """
+    Handler exposing in-process runtime statistics as JSON.
+
+    Supports:
+    - GET: Statistics of this worker process (process ID, ID allocator,
+      page cache, single-flight reads, known entities, client-side cache)
+    """
+
+    def get(self):
+        """Write the statistics of this process as a JSON object."""
+        self.write(
+            {
+                "pid": os.getpid(),
+                "id_allocator": id_allocator.stats(),
+                "page_cache": page_cache.stats(),
+                "single_flight": single_flight.stats(),
+                "known_entities": known_entities.stats(),
+                "client_cache": client_cache.stats(),
+            }
+        )
+
+
 def init_db():
     """
     Initialize the Redis database with default values.
@@ -679,6 +3879,8 @@ def init_db():
     - patient:autoID: Counter for patient IDs (starts at 1)
     - diagnosis:autoID: Counter for diagnosis IDs (starts at 1)
     - db_initiated: Flag indicating database has been initialized
+
+    Also registers the server-side Lua scripts (LUA_SCRIPTS) with SCRIPT LOAD.
     """
     try:
         db_initiated = r.get(KEY_DB_INITIATED)
@@ -692,17 +3894,49 @@ def init_db():
             pipe.set(KEY_DB_INITIATED, 1)
             pipe.execute()
             logging.info("Database initialized successfully")
+        # Register server-side scripts so the first EVALSHA calls hit the cache
+        for script in LUA_SCRIPTS:
+            r.script_load(script.source)
     except redis.exceptions.ConnectionError as e:
         logging.error(f"Failed to initialize database: {e}")
         raise
 
 
-def make_app():
+class StaticHandler(tornado.web.StaticFileHandler):
+    """
+    Static file handler with a configurable Cache-Control max-age.
+
+    The templates link static files without a version argument, which
+    Tornado would never let browsers cache; those responses are cached for
+    the static_cache_max_age application setting instead.
+    """
+
+    def get_cache_time(self, path, modified, mime_type):
+        """
+        Seconds browsers may cache the file.
+
+        Returns:
+            int: Tornado's long-lived cache time for versioned URLs, otherwise
+            the static_cache_max_age setting
+        """
+        if "v" in self.request.arguments:
+            return super().get_cache_time(path, modified, mime_type)
+        return self.settings.get("static_cache_max_age", 0)
+
+
+def make_app(debug=None):
     """
     Create and configure the Tornado web application.
 
-    Sets up all URL routes and application settings. The application runs in
-    debug mode with auto-reload enabled for development.
+    Sets up all URL routes and application settings. Settings come from the
+    runtime options and the selected profile (see get_setting): the dev
+    profile runs in debug mode with auto-reload (on code and template edits)
+    and re-reads templates on every render, the prod profile caches compiled templates and static
+    files and ignores requests to log their Redis trace.
+
+    Args:
+        debug (bool): Override the debug option (debug mode, auto-reload and
+            tracebacks in error pages)
 
     Returns:
         tornado.web.Application: Configured Tornado application instance
@@ -711,38 +3945,108 @@ def make_app():
         - /: Main page
         - /static/*: Static file serving
         - /hospital: Hospital management
+        - /hospital/<id>/doctors: Doctor roster of one hospital
         - /doctor: Doctor management
         - /patient: Patient management
+        - /patient/<id>/chart: Diagnoses and doctors of one patient
         - /diagnosis: Diagnosis management
         - /doctor-patient: Doctor-patient relationship management
+        - /import/<entity>: Bulk import of CSV or NDJSON uploads
+        - /export/<entity>: Streaming export as NDJSON or CSV
+        - /search: Surname prefix search over patients and doctors
+        - /stats: Runtime statistics of the serving process
+        - /metrics: Prometheus metrics of the serving process
     """
+    if debug is None:
+        debug = get_setting("debug")
+    if debug:
+        # Restart on template edits too, so the digest in the ETags follows them
+        for name in os.listdir(TEMPLATE_DIR):
+            tornado.autoreload.watch(os.path.join(TEMPLATE_DIR, name))
     return tornado.web.Application(
         [
             (r"/", MainHandler),
-            (r"/static/(.*)", tornado.web.StaticFileHandler, {"path": "static/"}),
+            (r"/static/(.*)", StaticHandler, {"path": STATIC_DIR}),
             (r"/hospital", HospitalHandler),
+            (r"/hospital/([0-9]+)/doctors", HospitalDoctorsHandler),
             (r"/doctor", DoctorHandler),
             (r"/patient", PatientHandler),
+            (r"/patient/([0-9]+)/chart", PatientChartHandler),
             (r"/diagnosis", DiagnosisHandler),
             (r"/doctor-patient", DoctorPatientHandler),
+            (rf"/import/({'|'.join(IMPORT_ENTITIES)})", ImportHandler),
+            (rf"/export/({'|'.join(IMPORT_ENTITIES)}|doctor-patient)", ExportHandler),
+            (r"/search", SearchHandler),
+            (r"/stats", StatsHandler),
+            (r"/metrics", MetricsHandler),
         ],
-        autoreload=True,
-        debug=True,
-        compiled_template_cache=False,
-        serve_traceback=True,
+        autoreload=debug,
+        debug=debug,
+        compiled_template_cache=get_setting("template_cache"),
+        # Digest of the templates in the ETags of list pages (see get_page_etag)
+        templates_digest=templates_digest(),
+        static_hash_cache=not debug,
+        static_cache_max_age=get_setting("static_cache_max_age"),
+        serve_traceback=debug,
+        trace_log=get_setting("trace_log"),
+    )
+
+
+def start_server(port, workers):
+    """
+    Initialize the database and serve the application until interrupted.
+
+    With a single worker the application runs in one process with the
+    settings of the selected profile. Otherwise the process forks `workers`
+    children that each run their own IOLoop with debug mode off (auto-reload
+    cannot coexist with forked workers). Where SO_REUSEPORT is available every worker binds its own
+    listening socket and the kernel balances connections between them;
+    elsewhere the socket is bound once and shared through the fork.
+
+    Redis clients are safe across the fork: the sync client's pool
+    reconnects in a new process, the asyncio pool is created lazily by
+    get_async_redis() inside each worker and id_allocator drops the blocks
+    reserved by the parent. The client-side cache (CLIENT_CACHE_SIZE) is
+    started in each worker, since its tracking connection and listener
+    thread cannot cross a fork.
+
+    Args:
+        port (int): Port to listen on
+        workers (int): Number of worker processes (0 = one per CPU core)
+    """
+    init_db()
+
+    if workers == 1:
+        sockets = tornado.netutil.bind_sockets(port)
+    else:
+        reuse_port = hasattr(socket, "SO_REUSEPORT")
+        if not reuse_port:
+            sockets = tornado.netutil.bind_sockets(port)
+        # Returns in each child; the parent only supervises the workers
+        task_id = tornado.process.fork_processes(workers)
+        if reuse_port:
+            sockets = tornado.netutil.bind_sockets(port, reuse_port=True)
+        logging.info(f"Worker {task_id} (pid {os.getpid()}) started")
+    client_cache.start(r)
+
+    server = tornado.httpserver.HTTPServer(
+        make_app(debug=None if workers == 1 else False),
+        max_buffer_size=tornado.options.options.max_buffer_size,
+        idle_connection_timeout=get_setting("idle_connection_timeout"),
     )
+    server.add_sockets(sockets)
+    logging.info(f"Listening on port {port}")
+    tornado.ioloop.IOLoop.current().start()
 
 
 if __name__ == "__main__":
     """
     Application entry point.
     
-    Initializes the database, creates the application, starts the server,
-    and begins the IOLoop to handle requests.
+    Parses the command line (see the runtime options, e.g. --profile=prod
+    --workers=0), initializes the database, starts the server and begins the
+    IOLoop to handle requests.
     """
-    init_db()
-    app = make_app()
-    app.listen(PORT)
     tornado.options.parse_command_line()
-    logging.info(f"Listening on port {PORT}")
-    tornado.ioloop.IOLoop.current().start()
+    configure_redis()
+    start_server(tornado.options.options.port, tornado.options.options.workers)
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Maintenance commands for the Hospital Management Application.
+
+One-shot migrations that (re)build the secondary Redis structures the
+application relies on from the entity hashes already stored in Redis.
+Every command is idempotent and safe to re-run, and bumps the version
+counters afterwards so that cached list pages are rendered again.
+
+Usage:
+    python maintenance.py build-id-indexes
+    python maintenance.py build-mpn-index
+    python maintenance.py build-search-indexes
+    python maintenance.py build-reverse-indexes
+"""
+
+import argparse
+import logging
+
+import main
+
+# Number of keys requested per SCAN call and commands sent per pipeline
+SCAN_BATCH_SIZE = 1000
+
+# (entity key prefix, ID index key) for every indexed entity type, plus the
+# doctor-patient sets indexed by doctor ID
+INDEXED_ENTITIES = [
+    (main.KEY_PREFIX_HOSPITAL, main.KEY_INDEX_HOSPITAL),
+    (main.KEY_PREFIX_DOCTOR, main.KEY_INDEX_DOCTOR),
+    (main.KEY_PREFIX_PATIENT, main.KEY_INDEX_PATIENT),
+    (main.KEY_PREFIX_DIAGNOSIS, main.KEY_INDEX_DIAGNOSIS),
+    (main.KEY_PREFIX_DOCTOR_PATIENT, main.KEY_INDEX_DOCTOR_PATIENT),
+]
+
+
+def iter_entity_ids(redis_conn, entity_prefix):
+    """
+    Iterate over the IDs of all stored entities of one type.
+
+    Uses SCAN so the keyspace is walked incrementally without blocking Redis.
+    Keys sharing the prefix but not ending in a numeric ID (such as
+    "hospital:autoID" or "hospital:ids") are skipped.
+
+    Args:
+        redis_conn: Synchronous Redis client
+        entity_prefix (str): Redis key prefix for the entity type (e.g., "hospital:")
+
+    Yields:
+        str: Entity ID
+    """
+    for key in redis_conn.scan_iter(match=f"{entity_prefix}*", count=SCAN_BATCH_SIZE):
+        entity_id = key.decode()[len(entity_prefix) :]
+        if entity_id.isdigit():
+            yield entity_id
+
+
+def build_id_indexes(redis_conn):
+    """
+    Build the per-entity ID indexes from the existing entity hashes.
+
+    Args:
+        redis_conn: Synchronous Redis client
+
+    Returns:
+        dict: Number of IDs registered per index key
+    """
+    counts = {}
+    for entity_prefix, index_key in INDEXED_ENTITIES:
+        count = 0
+        pipe = redis_conn.pipeline(transaction=False)
+        for entity_id in iter_entity_ids(redis_conn, entity_prefix):
+            pipe.zadd(index_key, {entity_id: int(entity_id)})
+            count += 1
+            if count % SCAN_BATCH_SIZE == 0:
+                pipe.execute()
+        pipe.execute()
+        counts[index_key] = count
+        logging.info(f"Indexed {count} IDs into {index_key}")
+    return counts
+
+
+def build_mpn_index(redis_conn):
+    """
+    Build the unique MPN index (main.KEY_UNIQUE_MPN) from the stored patients.
+
+    Patients are visited in ID order, so when several patients share a
+    medical policy number the oldest one keeps it in the index; the others
+    are counted and logged as duplicates so they can be fixed by hand.
+
+    Args:
+        redis_conn: Synchronous Redis client
+
+    Returns:
+        dict: Number of indexed patients and of duplicate MPNs
+    """
+    patient_ids = sorted(iter_entity_ids(redis_conn, main.KEY_PREFIX_PATIENT), key=int)
+    indexed = duplicates = 0
+    for start in range(0, len(patient_ids), SCAN_BATCH_SIZE):
+        batch = patient_ids[start : start + SCAN_BATCH_SIZE]
+        pipe = redis_conn.pipeline(transaction=False)
+        for patient_id in batch:
+            pipe.hget(f"{main.KEY_PREFIX_PATIENT}{patient_id}", "mpn")
+        mpns = pipe.execute()
+
+        for patient_id, mpn in zip(batch, mpns):
+            if mpn:
+                pipe.hsetnx(main.KEY_UNIQUE_MPN, mpn, patient_id)
+                pipe.hget(main.KEY_UNIQUE_MPN, mpn)
+        replies = iter(pipe.execute())
+
+        for patient_id, mpn in zip(batch, mpns):
+            if not mpn:
+                continue
+            next(replies)
+            holder = next(replies).decode()
+            if holder == patient_id:
+                indexed += 1
+            else:
+                duplicates += 1
+                logging.warning(
+                    f"Patient {patient_id} has MPN {mpn.decode()} of patient {holder}"
+                )
+    logging.info(f"Indexed {indexed} MPNs into {main.KEY_UNIQUE_MPN}")
+    return {"indexed": indexed, "duplicates": duplicates}
+
+
+def build_search_indexes(redis_conn):
+    """
+    Build the surname search indexes from the stored patients and doctors.
+
+    Args:
+        redis_conn: Synchronous Redis client
+
+    Returns:
+        dict: Number of names registered per search index key
+    """
+    counts = {}
+    for handler in main.SEARCH_ENTITIES.values():
+        field, search_key = handler.SEARCH
+        entity_ids = list(iter_entity_ids(redis_conn, handler.ENTITY_PREFIX))
+        count = 0
+        for start in range(0, len(entity_ids), SCAN_BATCH_SIZE):
+            batch = entity_ids[start : start + SCAN_BATCH_SIZE]
+            pipe = redis_conn.pipeline(transaction=False)
+            for entity_id in batch:
+                pipe.hget(f"{handler.ENTITY_PREFIX}{entity_id}", field)
+            values = pipe.execute()
+
+            for entity_id, value in zip(batch, values):
+                if value is not None:
+                    term = main.normalize_search_term(value.decode())
+                    pipe.zadd(search_key, {f"{term}\0{entity_id}": 0})
+                    count += 1
+            pipe.execute()
+        counts[search_key] = count
+        logging.info(f"Indexed {count} names into {search_key}")
+    return counts
+
+
+def build_reverse_indexes(redis_conn):
+    """
+    Build the reverse reference indexes (such as the doctors of each hospital).
+
+    Every stored entity of a type with a REVERSE_INDEX is added to the set of
+    the entity it refers to; entities without a reference are skipped. The
+    doctors of each patient are rebuilt by inverting the doctor-patient sets.
+
+    Args:
+        redis_conn: Synchronous Redis client
+
+    Returns:
+        dict: Number of IDs registered per reverse index key prefix
+    """
+    counts = {}
+    for handler in main.IMPORT_ENTITIES.values():
+        if handler.REVERSE_INDEX is None:
+            continue
+        id_field = handler.REFERENCE[0]
+        entity_ids = list(iter_entity_ids(redis_conn, handler.ENTITY_PREFIX))
+        count = 0
+        for start in range(0, len(entity_ids), SCAN_BATCH_SIZE):
+            batch = entity_ids[start : start + SCAN_BATCH_SIZE]
+            pipe = redis_conn.pipeline(transaction=False)
+            for entity_id in batch:
+                pipe.hget(f"{handler.ENTITY_PREFIX}{entity_id}", id_field)
+            references = pipe.execute()
+
+            for entity_id, reference_id in zip(batch, references):
+                if reference_id:
+                    pipe.sadd(
+                        f"{handler.REVERSE_INDEX}{reference_id.decode()}", entity_id
+                    )
+                    count += 1
+            pipe.execute()
+        counts[handler.REVERSE_INDEX] = count
+        logging.info(f"Indexed {count} IDs into {handler.REVERSE_INDEX}*")
+
+    doctor_ids = list(iter_entity_ids(redis_conn, main.KEY_PREFIX_DOCTOR_PATIENT))
+    count = 0
+    for start in range(0, len(doctor_ids), SCAN_BATCH_SIZE):
+        batch = doctor_ids[start : start + SCAN_BATCH_SIZE]
+        pipe = redis_conn.pipeline(transaction=False)
+        for doctor_id in batch:
+            pipe.smembers(f"{main.KEY_PREFIX_DOCTOR_PATIENT}{doctor_id}")
+        patient_sets = pipe.execute()
+
+        for doctor_id, patient_ids in zip(batch, patient_sets):
+            for patient_id in patient_ids:
+                pipe.sadd(
+                    f"{main.KEY_PREFIX_PATIENT_DOCTOR}{patient_id.decode()}", doctor_id
+                )
+                count += 1
+        pipe.execute()
+    counts[main.KEY_PREFIX_PATIENT_DOCTOR] = count
+    logging.info(f"Indexed {count} IDs into {main.KEY_PREFIX_PATIENT_DOCTOR}*")
+    return counts
+
+
+def bump_versions(redis_conn):
+    """
+    Increment the version counter of every entity type.
+
+    Args:
+        redis_conn: Synchronous Redis client
+    """
+    pipe = redis_conn.pipeline(transaction=False)
+    for version_key in main.VERSION_KEYS:
+        pipe.incr(version_key)
+    pipe.execute()
+
+
+COMMANDS = {
+    "build-id-indexes": build_id_indexes,
+    "build-mpn-index": build_mpn_index,
+    "build-search-indexes": build_search_indexes,
+    "build-reverse-indexes": build_reverse_indexes,
+}
+
+
+def run(argv=None):
+    """
+    Parse command line arguments and run the requested maintenance command.
+
+    Args:
+        argv (list): Command line arguments (defaults to sys.argv[1:])
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    result = COMMANDS[args.command](main.r)
+    bump_versions(main.r)
+    logging.info(f"{args.command} finished: {result}")
+
+
+if __name__ == "__main__":
+    run()
@@ -5,8 +5,25 @@ Unit tests for the hospital management application.
 Tests cover all API endpoints and business logic validation.
 """
 
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+import unittest
+from contextlib import contextmanager
+
 import fakeredis
+import fakeredis.aioredis
+import redis
 from unittest.mock import patch
+import tornado.options
+from tornado import gen
+from tornado.options import options
+from tornado.simple_httpclient import HTTPStreamClosedError
 from tornado.testing import AsyncHTTPTestCase
 import main
 
@@ -25,12 +42,42 @@ class TestApplication(AsyncHTTPTestCase):
         self.fake_redis.set("patient:autoID", 1)
         self.fake_redis.set("diagnosis:autoID", 1)
         self.fake_redis.set("db_initiated", 1)
-        # Patch Redis connection to use fake Redis for all tests
-        self.redis_patcher = patch("main.r", self.fake_redis)
+        # Patch Redis connection to use fake Redis for all tests; every
+        # command handlers send through it is counted (see assertRoundTrips)
+        self.redis_calls = main.RedisCallStats(trace=True)
+        self.redis_patcher = patch(
+            "main.r", main.InstrumentedRedis(self.fake_redis, self.redis_calls)
+        )
         self.redis_patcher.start()
+        # Handlers use the synchronous client unless a test opts into async mode
+        self.async_patcher = patch("main.REDIS_ASYNC", False)
+        self.async_patcher.start()
+        # Every test starts without reserved ID blocks
+        self.allocator_patcher = patch(
+            "main.id_allocator", main.IdAllocator(main.ID_BLOCK_SIZE)
+        )
+        self.allocator_patcher.start()
+        # ... and with an empty page cache
+        self.page_cache_patcher = patch(
+            "main.page_cache", main.PageCache(main.PAGE_CACHE_SIZE, main.PAGE_CACHE_TTL)
+        )
+        self.page_cache_patcher.start()
+        # ... and without reads in flight
+        self.single_flight_patcher = patch("main.single_flight", main.SingleFlight())
+        self.single_flight_patcher.start()
+        # ... and without known entities
+        self.known_entities_patcher = patch(
+            "main.known_entities", main.KnownEntities(main.KNOWN_ENTITIES_SIZE)
+        )
+        self.known_entities_patcher.start()
 
     def tearDown(self):
         """Clean up after each test."""
+        self.known_entities_patcher.stop()
+        self.single_flight_patcher.stop()
+        self.page_cache_patcher.stop()
+        self.allocator_patcher.stop()
+        self.async_patcher.stop()
         self.redis_patcher.stop()
         super().tearDown()
 
@@ -38,6 +85,123 @@ class TestApplication(AsyncHTTPTestCase):
         """Create and return the Tornado application."""
         return main.make_app()
 
+    def seed_hospitals(self, count):
+        """Store hospitals 1..count and register them in the ID index."""
+        for i in range(1, count + 1):
+            self.fake_redis.hset(
+                f"hospital:{i}",
+                mapping={
+                    "name": f"H{i}",
+                    "address": "A",
+                    "phone": "",
+                    "beds_number": "",
+                },
+            )
+            self.fake_redis.zadd("hospital:ids", {str(i): i})
+
+    @contextmanager
+    def assertRoundTrips(self, maximum):
+        """
+        Fail if the block sends more than maximum round trips to Redis.
+
+        Counts the commands sent through main.r (the synchronous client), so
+        an extra command per row shows up as soon as a test uses many rows.
+
+        Args:
+            maximum (int): Round trip budget of the block
+        """
+        round_trips = self.redis_calls.round_trips
+        trace_start = len(self.redis_calls.trace)
+        yield
+        used = self.redis_calls.round_trips - round_trips
+        self.assertLessEqual(
+            used,
+            maximum,
+            f"{used} Redis round trips, budget {maximum}: "
+            f"{main.format_trace(self.redis_calls.trace[trace_start:])}",
+        )
+
+
+class TestAsyncRedisMode(TestApplication):
+    """Tests for handlers running on the asyncio Redis client."""
+
+    def setUp(self):
+        """Share one fake server between the sync and asyncio clients."""
+        super().setUp()
+        server = fakeredis.FakeServer()
+        self.fake_redis = fakeredis.FakeStrictRedis(server=server)
+        self.fake_redis.set("hospital:autoID", 1)
+        self.fake_redis.set("patient:autoID", 1)
+        self.fake_redis.set("diagnosis:autoID", 1)
+        # One connection: fakeredis keeps loaded scripts per connection while
+        # a real Redis shares its script cache between all of them
+        self.async_redis_patcher = patch(
+            "main.async_r",
+            fakeredis.aioredis.FakeRedis(server=server, single_connection_client=True),
+        )
+        self.async_redis_patcher.start()
+        self.async_mode_patcher = patch("main.REDIS_ASYNC", True)
+        self.async_mode_patcher.start()
+
+    def tearDown(self):
+        """Close the asyncio client and restore the synchronous one."""
+        self.io_loop.run_sync(main.async_r.close)
+        self.async_mode_patcher.stop()
+        self.async_redis_patcher.stop()
+        super().tearDown()
+
+    def test_get_redis_connection_returns_async_client(self):
+        """Test that handlers pick the asyncio client in async mode."""
+        self.assertIs(main.get_async_redis(), main.async_r)
+
+    def test_hospital_post_and_get(self):
+        """Test creating and listing hospitals through the asyncio client."""
+        response = self.fetch(
+            "/hospital",
+            method="POST",
+            body="name=Async Hospital&address=1 Loop St&beds_number=10&phone=1",
+        )
+        self.assertEqual(response.code, 200)
+        self.assertIn(b"OK: ID 1", response.body)
+        self.assertEqual(self.fake_redis.hget("hospital:1", "name"), b"Async Hospital")
+
+        response = self.fetch("/hospital")
+        self.assertEqual(response.code, 200)
+        self.assertIn(b"Async Hospital", response.body)
+
+    def test_diagnosis_post_checks_patient(self):
+        """Test referential validation through the asyncio client."""
+        self.fake_redis.set("patient:autoID", 2)
+        self.fake_redis.hset("patient:1", mapping={"surname": "Doe"})
+
+        response = self.fetch(
+            "/diagnosis", method="POST", body="patient_ID=1&type=Flu&information="
+        )
+        self.assertEqual(response.code, 200)
+        self.assertIn(b"for patient Doe", response.body)
+
+        response = self.fetch(
+            "/diagnosis", method="POST", body="patient_ID=9&type=Flu&information="
+        )
+        self.assertEqual(response.code, 400)
+
+    def test_concurrent_creates_get_unique_ids(self):
+        """Test that interleaved creates never reuse an ID."""
+        requests = [
+            self.http_client.fetch(
+                self.get_url("/hospital"),
+                method="POST",
+                body=f"name=H{i}&address=A&beds_number=1&phone=1",
+            )
+            for i in range(20)
+        ]
+
+        responses = self.io_loop.run_sync(lambda: gen.multi(requests))
+
+        ids = {response.body.split(b" ")[2] for response in responses}
+        self.assertEqual(len(ids), 20)
+        self.assertEqual(self.fake_redis.zcard("hospital:ids"), 20)
+
 
 class TestMainHandler(TestApplication):
     """Tests for the main page handler."""
@@ -71,9 +235,11 @@ class TestHospitalHandler(TestApplication):
                 b"beds_number": b"100",
             },
         )
+        self.fake_redis.zadd("hospital:ids", {"0": 0})
 
         response = self.fetch("/hospital")
         self.assertEqual(response.code, 200)
+        self.assertIn(b"Test Hospital", response.body)
 
     def test_hospital_post_success(self):
         """Test successful POST request to create a hospital."""
@@ -163,9 +329,11 @@ class TestDoctorHandler(TestApplication):
                 b"hospital_ID": b"0",
             },
         )
+        self.fake_redis.zadd("doctor:ids", {"0": 0})
 
         response = self.fetch("/doctor")
         self.assertEqual(response.code, 200)
+        self.assertIn(b"Cardiologist", response.body)
 
     def test_doctor_post_success(self):
         """Test successful POST request to create a doctor."""
@@ -259,9 +427,11 @@ class TestPatientHandler(TestApplication):
                 b"mpn": b"123456789",
             },
         )
+        self.fake_redis.zadd("patient:ids", {"0": 0})
 
         response = self.fetch("/patient")
         self.assertEqual(response.code, 200)
+        self.assertIn(b"123456789", response.body)
 
     def test_patient_post_success_male(self):
         """Test successful POST request to create a male patient."""
@@ -350,6 +520,43 @@ class TestPatientHandler(TestApplication):
         self.assertEqual(response.code, 400)
         self.assertIn(b"All fields required", response.body)
 
+    def test_patient_post_duplicate_mpn(self):
+        """Test that a second patient with the same MPN is rejected."""
+        body = "surname=Doe&born_date=1990-01-01&sex=M&mpn=123456789"
+        self.fetch("/patient", method="POST", body=body)
+
+        response = self.fetch("/patient", method="POST", body=body)
+
+        self.assertEqual(response.code, 400)
+        self.assertIn(b"Patient with such MPN already exists", response.body)
+        self.assertEqual(self.fake_redis.hgetall("patient:mpn"), {b"123456789": b"1"})
+        self.assertEqual(self.fake_redis.zcard("patient:ids"), 1)
+        self.assertEqual(main.id_allocator.ids_released, 1)
+
+    def test_patient_get_by_mpn(self):
+        """Test that ?mpn= shows only the patient holding the MPN."""
+        main.init_db()
+        for mpn in ("111", "222"):
+            self.fetch(
+                "/patient",
+                method="POST",
+                body=f"surname=P{mpn}&born_date=1990-01-01&sex=F&mpn={mpn}",
+            )
+
+        with self.assertRoundTrips(1):
+            response = self.fetch("/patient?mpn=222")
+
+        self.assertEqual(response.code, 200)
+        self.assertIn(b"P222", response.body)
+        self.assertNotIn(b"P111", response.body)
+
+    def test_patient_get_by_unknown_mpn(self):
+        """Test that an MPN nobody holds returns 404."""
+        response = self.fetch("/patient?mpn=999")
+
+        self.assertEqual(response.code, 404)
+        self.assertIn(b"No patient with such MPN", response.body)
+
 
 class TestDiagnosisHandler(TestApplication):
     """Tests for DiagnosisHandler endpoints."""
@@ -382,9 +589,11 @@ class TestDiagnosisHandler(TestApplication):
                 b"information": b"Common cold symptoms",
             },
         )
+        self.fake_redis.zadd("diagnosis:ids", {"0": 0})
 
         response = self.fetch("/diagnosis")
         self.assertEqual(response.code, 200)
+        self.assertIn(b"Common cold symptoms", response.body)
 
     def test_diagnosis_post_success(self):
         """Test successful POST request to create a diagnosis."""
@@ -480,10 +689,42 @@ class TestDoctorPatientHandler(TestApplication):
                 b"hospital_ID": b"0",
             },
         )
+        self.fake_redis.zadd("doctor-patient:ids", {"0": 0})
         self.fake_redis.sadd("doctor-patient:0", "1")
 
         response = self.fetch("/doctor-patient")
         self.assertEqual(response.code, 200)
+        self.assertIn(b"<td>1</td>", response.body)
+        self.assertIn(b"<td>Smith</td>", response.body)
+
+    def test_doctor_patient_get_reads_only_linked_doctors(self):
+        """Test that the listing reads only doctors with links and their surnames."""
+        for i in range(1, 101):
+            self.fake_redis.hset(f"doctor:{i}", mapping={"surname": f"Doc{i}"})
+            self.fake_redis.zadd("doctor:ids", {str(i): i})
+        self.fake_redis.hset("patient:7", mapping={"surname": "Brown"})
+        self.fake_redis.hset("patient:8", mapping={"surname": "Green"})
+        self.fake_redis.zadd("doctor-patient:ids", {"50": 50})
+        self.fake_redis.sadd("doctor-patient:50", "8", "7")
+        self.redis_calls.trace.clear()
+
+        response = self.fetch("/doctor-patient")
+
+        self.assertEqual(response.code, 200)
+        body = response.body.decode()
+        self.assertRegex(
+            body, r"<td>50</td>\s*<td>Doc50</td>\s*<td>7</td>\s*<td>Brown</td>"
+        )
+        self.assertLess(body.index("<td>Brown</td>"), body.index("<td>Green</td>"))
+        self.assertEqual(
+            [(name, key) for name, key, _ in self.redis_calls.trace],
+            [
+                ("GET", "doctor-patient:version"),
+                ("ZRANGEBYSCORE", "doctor-patient:ids"),
+                ("PIPELINE[SMEMBERS]", ""),
+                ("PIPELINE[HGET x3]", ""),
+            ],
+        )
 
     def test_doctor_patient_post_success(self):
         """Test successful POST request to link doctor and patient."""
@@ -517,9 +758,11 @@ class TestDoctorPatientHandler(TestApplication):
         self.assertIn(b"OK: doctor ID: 0", response.body)
         self.assertIn(b"patient ID: 0", response.body)
 
-        # Verify relationship was stored
+        # Verify relationship was stored in both directions and indexed
         patients = self.fake_redis.smembers("doctor-patient:0")
         self.assertIn(b"0", patients)
+        self.assertEqual(self.fake_redis.smembers("patient-doctor:0"), {b"0"})
+        self.assertEqual(self.fake_redis.zrange("doctor-patient:ids", 0, -1), [b"0"])
 
     def test_doctor_patient_post_missing_doctor_id(self):
         """Test POST request with missing doctor_ID."""
@@ -626,137 +869,2445 @@ class TestDoctorPatientHandler(TestApplication):
         self.assertIn(b"1", patients)
 
 
-class TestDatabaseInitialization(TestApplication):
-    """Tests for database initialization logic."""
+class TestPipelinedFetch(TestApplication):
+    """Tests for batched pipeline reads used by the list endpoints."""
 
-    def test_init_db_creates_auto_ids(self):
-        """Test that init_db creates all required autoID keys."""
-        # Clear the fake Redis
-        self.fake_redis.flushdb()
+    def test_fetch_pipelined_preserves_key_order(self):
+        """Test that replies come back in key order across chunks."""
+        self.seed_hospitals(5)
+        keys = [f"hospital:{i}" for i in (5, 1, 4, 2, 3)]
 
-        # Call init_db (main.r is already patched in setUp)
-        main.init_db()
+        results = self.io_loop.run_sync(
+            lambda: main.fetch_pipelined(self.fake_redis, "hgetall", keys, 2)
+        )
 
-        # Verify all autoID keys were created
-        self.assertEqual(self.fake_redis.get("hospital:autoID"), b"1")
-        self.assertEqual(self.fake_redis.get("doctor:autoID"), b"1")
-        self.assertEqual(self.fake_redis.get("patient:autoID"), b"1")
-        self.assertEqual(self.fake_redis.get("diagnosis:autoID"), b"1")
-        self.assertEqual(self.fake_redis.get("db_initiated"), b"1")
+        self.assertEqual(
+            [result[b"name"] for result in results],
+            [b"H5", b"H1", b"H4", b"H2", b"H3"],
+        )
 
-    def test_init_db_idempotent(self):
-        """Test that init_db doesn't overwrite existing data."""
-        # Set up existing data
-        self.fake_redis.set("hospital:autoID", 5)
-        self.fake_redis.set("doctor:autoID", 3)
-        self.fake_redis.set("patient:autoID", 10)
-        self.fake_redis.set("diagnosis:autoID", 2)
-        self.fake_redis.set("db_initiated", 1)
+    def test_fetch_pipelined_chunks_round_trips(self):
+        """Test that each chunk is sent as one pipeline."""
+        self.seed_hospitals(5)
+        keys = [f"hospital:{i}" for i in range(1, 6)]
 
-        # Call init_db (main.r is already patched in setUp)
-        main.init_db()
+        with patch.object(
+            self.fake_redis, "pipeline", wraps=self.fake_redis.pipeline
+        ) as pipeline:
+            self.io_loop.run_sync(
+                lambda: main.fetch_pipelined(self.fake_redis, "hgetall", keys, 2)
+            )
 
-        # Verify existing values were preserved
-        self.assertEqual(self.fake_redis.get("hospital:autoID"), b"5")
-        self.assertEqual(self.fake_redis.get("doctor:autoID"), b"3")
-        self.assertEqual(self.fake_redis.get("patient:autoID"), b"10")
-        self.assertEqual(self.fake_redis.get("diagnosis:autoID"), b"2")
+        self.assertEqual(pipeline.call_count, 3)
 
+    def test_hospital_list_spans_chunks(self):
+        """Test that the list page renders every row when split into chunks."""
+        self.seed_hospitals(7)
 
-class TestEdgeCases(TestApplication):
-    """Tests for edge cases and boundary conditions."""
+        with patch("main.REDIS_PIPELINE_CHUNK_SIZE", 3):
+            response = self.fetch("/hospital")
 
-    def test_hospital_auto_id_increment(self):
-        """Test that hospital autoID increments correctly."""
-        initial_id = int(self.fake_redis.get("hospital:autoID"))
+        self.assertEqual(response.code, 200)
+        for i in range(1, 8):
+            self.assertIn(f"<td>H{i}</td>".encode(), response.body)
+
+    def test_doctor_patient_list_spans_chunks(self):
+        """Test that relationship sets are read across chunk boundaries."""
+        self.fake_redis.set("doctor:autoID", 6)
+        self.fake_redis.zadd("doctor-patient:ids", {str(i): i for i in range(6)})
+        self.fake_redis.sadd("doctor-patient:1", "10")
+        self.fake_redis.sadd("doctor-patient:4", "40")
+
+        with patch("main.REDIS_PIPELINE_CHUNK_SIZE", 2):
+            response = self.fetch("/doctor-patient")
+
+        self.assertEqual(response.code, 200)
+        self.assertIn(b"<td>10</td>", response.body)
+        self.assertIn(b"<td>40</td>", response.body)
+
+
+class TestPagination(TestApplication):
+    """Tests for limit/cursor pagination of the list endpoints."""
+
+    def seed_patients(self, count):
+        """Create patients with IDs 1..count directly in fake Redis."""
+        for i in range(1, count + 1):
+            self.fake_redis.hset(
+                f"patient:{i}",
+                mapping={
+                    "surname": f"Surname{i:03d}",
+                    "born_date": "1990-01-01",
+                    "sex": "M",
+                    "mpn": str(i),
+                },
+            )
+            self.fake_redis.zadd("patient:ids", {str(i): i})
+
+    def test_first_page_respects_limit(self):
+        """Test that the first page holds exactly limit rows and a next link."""
+        self.seed_patients(5)
+
+        response = self.fetch("/patient?limit=2")
+
+        self.assertEqual(response.code, 200)
+        self.assertIn(b"Surname001", response.body)
+        self.assertIn(b"Surname002", response.body)
+        self.assertNotIn(b"Surname003", response.body)
+        self.assertIn(b"cursor=after%3A2", response.body)
+        self.assertNotIn(b"cursor=before", response.body)
+
+    def test_next_page_follows_cursor(self):
+        """Test that an after-cursor returns the following window."""
+        self.seed_patients(5)
+
+        response = self.fetch("/patient?limit=2&cursor=after:2")
+
+        self.assertEqual(response.code, 200)
+        self.assertNotIn(b"Surname002", response.body)
+        self.assertIn(b"Surname003", response.body)
+        self.assertIn(b"Surname004", response.body)
+        self.assertIn(b"cursor=after%3A4", response.body)
+        self.assertIn(b"cursor=before%3A3", response.body)
+
+    def test_last_page_has_no_next_link(self):
+        """Test that the last page only links back."""
+        self.seed_patients(5)
+
+        response = self.fetch("/patient?limit=2&cursor=after:4")
+
+        self.assertEqual(response.code, 200)
+        self.assertIn(b"Surname005", response.body)
+        self.assertNotIn(b"cursor=after", response.body)
+        self.assertIn(b"cursor=before%3A5", response.body)
+
+    def test_prev_page_follows_cursor(self):
+        """Test that a before-cursor returns the preceding window."""
+        self.seed_patients(5)
+
+        response = self.fetch("/patient?limit=2&cursor=before:5")
+
+        self.assertEqual(response.code, 200)
+        self.assertIn(b"Surname003", response.body)
+        self.assertIn(b"Surname004", response.body)
+        self.assertNotIn(b"Surname005", response.body)
+        self.assertIn(b"cursor=before%3A3", response.body)
+        self.assertIn(b"cursor=after%3A4", response.body)
+
+    def test_page_reads_only_window(self):
+        """Test that only the hashes on the requested page are fetched."""
+        self.seed_patients(50)
+
+        with patch("main.fetch_pipelined", wraps=main.fetch_pipelined) as fetch:
+            self.fetch("/patient?limit=3&cursor=after:10")
+
+        fetch.assert_called_once()
+        self.assertEqual(
+            fetch.call_args.args[2], ["patient:11", "patient:12", "patient:13"]
+        )
+
+    def test_default_limit(self):
+        """Test that pages default to PAGE_SIZE_DEFAULT rows."""
+        self.seed_patients(5)
+
+        with patch("main.PAGE_SIZE_DEFAULT", 3):
+            response = self.fetch("/patient")
+
+        self.assertIn(b"Surname003", response.body)
+        self.assertNotIn(b"Surname004", response.body)
+
+    def test_invalid_limit(self):
+        """Test that non-numeric and out-of-range limits are rejected."""
+        for limit in ("abc", "0", str(main.PAGE_SIZE_MAX + 1)):
+            response = self.fetch(f"/hospital?limit={limit}")
+            self.assertEqual(response.code, 400)
+            self.assertIn(b"Limit must be an integer", response.body)
+
+    def test_invalid_cursor(self):
+        """Test that malformed cursors are rejected."""
+        for cursor in ("12", "after:x", "sideways:3"):
+            response = self.fetch(f"/doctor?cursor={cursor}")
+            self.assertEqual(response.code, 400)
+            self.assertIn(b"Invalid cursor", response.body)
+
+    def test_doctor_patient_pages_by_doctor(self):
+        """Test that relationships are paginated over the linked doctor index."""
+        for doctor_id in range(1, 4):
+            self.fake_redis.zadd("doctor-patient:ids", {str(doctor_id): doctor_id})
+            self.fake_redis.sadd(f"doctor-patient:{doctor_id}", f"{doctor_id}00")
+
+        response = self.fetch("/doctor-patient?limit=2")
+
+        self.assertEqual(response.code, 200)
+        self.assertIn(b"<td>100</td>", response.body)
+        self.assertIn(b"<td>200</td>", response.body)
+        self.assertNotIn(b"<td>300</td>", response.body)
+        self.assertIn(b"cursor=after%3A2", response.body)
+
+
+class TestAtomicCreate(TestApplication):
+    """Tests for the single round-trip Lua create script."""
+
+    def test_create_is_one_evalsha(self):
+        """Test that a create issues exactly one EVALSHA and no other command."""
+        self.io_loop.run_sync(lambda: main.create_entity_script.load(self.fake_redis))
+        evalsha = patch.object(
+            self.fake_redis, "evalsha", wraps=self.fake_redis.evalsha
+        ).start()
+        get = patch.object(self.fake_redis, "get").start()
+        incr = patch.object(self.fake_redis, "incr").start()
+        self.addCleanup(patch.stopall)
+        self.fake_redis.set("hospital:autoID", 100)
+        main.id_allocator.ranges["hospital:autoID"] = main.collections.deque([[5, 10]])
 
         response = self.fetch(
             "/hospital",
             method="POST",
-            body="name=Hospital1&address=Address1&beds_number=100&phone=123",
+            body="name=H&address=A&beds_number=1&phone=1",
         )
+
         self.assertEqual(response.code, 200)
+        self.assertEqual(evalsha.call_count, 1)
+        get.assert_not_called()
+        incr.assert_not_called()
+
+    def test_create_reloads_flushed_script(self):
+        """Test that creates recover when Redis forgot the script."""
+        self.fetch(
+            "/hospital", method="POST", body="name=H1&address=A&beds_number=&phone="
+        )
+        self.fake_redis.script_flush()
 
-        new_id = int(self.fake_redis.get("hospital:autoID"))
-        self.assertEqual(new_id, initial_id + 1)
+        response = self.fetch(
+            "/hospital", method="POST", body="name=H2&address=A&beds_number=&phone="
+        )
 
-    def test_doctor_auto_id_increment(self):
-        """Test that doctor autoID increments correctly."""
-        initial_id = int(self.fake_redis.get("doctor:autoID"))
+        self.assertEqual(response.code, 200)
+        self.assertIn(b"OK: ID 2", response.body)
 
+    def test_rejected_reference_releases_id(self):
+        """Test that a failed referential check writes nothing and frees the ID."""
         response = self.fetch(
             "/doctor",
             method="POST",
-            body="surname=Doctor1&profession=Surgeon&hospital_ID=",
+            body="surname=Smith&profession=Surgeon&hospital_ID=42",
         )
-        self.assertEqual(response.code, 200)
 
-        new_id = int(self.fake_redis.get("doctor:autoID"))
-        self.assertEqual(new_id, initial_id + 1)
+        self.assertEqual(response.code, 400)
+        self.assertFalse(self.fake_redis.exists("doctor:1"))
+        self.assertEqual(self.fake_redis.zcard("doctor:ids"), 0)
 
-    def test_patient_auto_id_increment(self):
-        """Test that patient autoID increments correctly."""
-        initial_id = int(self.fake_redis.get("patient:autoID"))
+        response = self.fetch(
+            "/doctor",
+            method="POST",
+            body="surname=Smith&profession=Surgeon&hospital_ID=",
+        )
+        self.assertIn(b"OK: ID 1", response.body)
+
+    def test_diagnosis_for_patient_without_surname(self):
+        """Test that a missing patient surname is reported as Unknown."""
+        self.fake_redis.hset("patient:3", mapping={"mpn": "1"})
+
+        response = self.fetch(
+            "/diagnosis", method="POST", body="patient_ID=3&type=Flu&information="
+        )
+
+        self.assertEqual(response.code, 200)
+        self.assertIn(b"for patient Unknown", response.body)
+
+    def test_missing_auto_id_is_server_error(self):
+        """Test that an uninitialized counter yields a 500 and writes nothing."""
+        self.fake_redis.delete("patient:autoID")
 
         response = self.fetch(
             "/patient",
             method="POST",
-            body="surname=Patient1&born_date=1990-01-01&sex=M&mpn=123",
+            body="surname=Doe&born_date=1990-01-01&sex=M&mpn=1",
+        )
+
+        self.assertEqual(response.code, 500)
+        self.assertFalse(self.fake_redis.exists("patient:None"))
+        self.assertEqual(self.fake_redis.zcard("patient:ids"), 0)
+
+
+class TestBulkImport(TestApplication):
+    """Tests for the streaming /import/<entity> endpoint."""
+
+    def test_import_csv(self):
+        """Test that CSV rows are created, indexed and reported."""
+        body = (
+            "name,address,phone,beds_number\n"
+            "H1,Addr 1,123,10\n"
+            '"H2, North","Street\nBuilding 2",,\n'
+        )
+
+        response = self.fetch(
+            "/import/hospital",
+            method="POST",
+            body=body,
+            headers={"Content-Type": "text/csv"},
         )
+
         self.assertEqual(response.code, 200)
+        report = json.loads(response.body)
+        self.assertEqual(report["rows"], 2)
+        self.assertEqual(report["created"], 2)
+        self.assertEqual(report["failed"], 0)
+        self.assertEqual(self.fake_redis.hget("hospital:1", "beds_number"), b"10")
+        self.assertEqual(self.fake_redis.hget("hospital:2", "name"), b"H2, North")
+        self.assertEqual(
+            self.fake_redis.hget("hospital:2", "address"), b"Street\nBuilding 2"
+        )
+        self.assertEqual(self.fake_redis.zrange("hospital:ids", 0, -1), [b"1", b"2"])
+
+    def test_import_csv_with_quote_inside_field(self):
+        """Test that a quote inside an unquoted field does not swallow later rows."""
+        body = (
+            "name,address,phone,beds_number\n"
+            'H1,12" Main St,,\n'
+            "H2,Addr 2,,\n"
+            'H3,"Street ""A""",,\n'
+            "H4,Addr 4,,\n"
+        )
 
-        new_id = int(self.fake_redis.get("patient:autoID"))
-        self.assertEqual(new_id, initial_id + 1)
+        response = self.fetch(
+            "/import/hospital",
+            method="POST",
+            body=body,
+            headers={"Content-Type": "text/csv"},
+        )
 
-    def test_diagnosis_auto_id_increment(self):
-        """Test that diagnosis autoID increments correctly."""
-        # Create a patient first
-        self.fake_redis.set("patient:autoID", 2)
-        self.fake_redis.hset(
-            "patient:0",
-            mapping={
-                b"surname": b"Doe",
-                b"born_date": b"1990-01-01",
-                b"sex": b"M",
-                b"mpn": b"123456789",
-            },
+        report = json.loads(response.body)
+        self.assertEqual(report["created"], 4)
+        self.assertEqual(report["failed"], 0)
+        self.assertEqual(self.fake_redis.hget("hospital:1", "address"), b'12" Main St')
+        self.assertEqual(self.fake_redis.hget("hospital:3", "address"), b'Street "A"')
+        self.assertEqual(self.fake_redis.zcard("hospital:ids"), 4)
+
+    def test_import_rows_longer_than_limit(self):
+        """Test that overlong lines and quoted records are reported and skipped."""
+        patch("main.IMPORT_MAX_ROW_SIZE", 64).start()
+        self.addCleanup(patch.stopall)
+        body = (
+            "name,address,phone,beds_number\n"
+            f"H1,{'x' * 100},,\n"
+            f'H2,"never closed\n{"y" * 40}\n{"z" * 40}\n'
+            "H3,Addr 3,,\n"
         )
 
-        initial_id = int(self.fake_redis.get("diagnosis:autoID"))
+        response = self.fetch(
+            "/import/hospital",
+            method="POST",
+            body=body,
+            headers={"Content-Type": "text/csv"},
+        )
+
+        report = json.loads(response.body)
+        self.assertEqual((report["rows"], report["created"]), (3, 1))
+        self.assertEqual(
+            report["errors"],
+            [
+                {"row": 1, "error": main.ERROR_IMPORT_ROW_TOO_LONG},
+                {"row": 2, "error": main.ERROR_IMPORT_ROW_TOO_LONG},
+            ],
+        )
+        self.assertEqual(self.fake_redis.hget("hospital:1", "name"), b"H3")
+
+    def test_import_line_longer_than_limit_across_chunks(self):
+        """Test that a line still unfinished past the limit is dropped as it arrives."""
+        patch("main.IMPORT_MAX_ROW_SIZE", 64).start()
+        self.addCleanup(patch.stopall)
+        chunks = [
+            b"name,address,phone,beds_number\nH1,",
+            b"x" * 50,
+            b"x" * 50,
+            b"x" * 50,
+            b"x,,\nH2,A,,\n",
+        ]
+
+        parse_line = patch.object(
+            main.ImportHandler,
+            "parse_line",
+            autospec=True,
+            side_effect=main.ImportHandler.parse_line,
+        ).start()
+
+        async def body_producer(write):
+            for chunk in chunks:
+                await write(chunk)
 
         response = self.fetch(
-            "/diagnosis", method="POST", body="patient_ID=0&type=Flu&information=Test"
+            "/import/hospital?format=csv",
+            method="POST",
+            body_producer=body_producer,
+        )
+
+        report = json.loads(response.body)
+        self.assertEqual((report["rows"], report["created"]), (2, 1))
+        self.assertEqual(
+            report["errors"], [{"row": 1, "error": main.ERROR_IMPORT_ROW_TOO_LONG}]
+        )
+        self.assertEqual(self.fake_redis.hget("hospital:1", "name"), b"H2")
+        # The overlong line was never buffered whole
+        self.assertLessEqual(
+            max(len(call.args[1]) for call in parse_line.call_args_list), 64
+        )
+
+    def test_import_csv_with_byte_order_mark(self):
+        """Test that a UTF-8 BOM before the CSV header is ignored."""
+        body = "\ufeffname,address,phone,beds_number\nH1,Addr 1,,\n".encode()
+
+        response = self.fetch(
+            "/import/hospital",
+            method="POST",
+            body=body,
+            headers={"Content-Type": "text/csv"},
         )
+
+        report = json.loads(response.body)
+        self.assertEqual((report["created"], report["failed"]), (1, 0))
+        self.assertEqual(self.fake_redis.hget("hospital:1", "name"), b"H1")
+
+    def test_import_ndjson_reports_invalid_rows(self):
+        """Test that invalid NDJSON rows are skipped and reported by row number."""
+        rows = [
+            '{"surname": "Doe", "born_date": "2000-01-01", "sex": "M", "mpn": "1"}',
+            '{"surname": "Roe", "born_date": "2000-01-01", "sex": "X", "mpn": "2"}',
+            "not json",
+            "",
+            '{"surname": "Poe", "born_date": "2000-01-01", "sex": "F"}',
+            '["Moe"]',
+            '{"surname": "Zoe", "born_date": "2000-01-01", "sex": "F", "mpn": 5}',
+        ]
+
+        response = self.fetch("/import/patient", method="POST", body="\n".join(rows))
+
         self.assertEqual(response.code, 200)
+        report = json.loads(response.body)
+        self.assertEqual(report["rows"], 6)
+        self.assertEqual(report["created"], 2)
+        self.assertEqual(report["failed"], 4)
+        self.assertEqual(
+            report["errors"],
+            [
+                {"row": 2, "error": "Sex must be 'M' or 'F'"},
+                {"row": 3, "error": "Invalid JSON"},
+                {"row": 4, "error": "All fields required"},
+                {"row": 5, "error": "Row must be a JSON object"},
+            ],
+        )
+        self.assertEqual(self.fake_redis.hget("patient:2", "mpn"), b"5")
 
-        new_id = int(self.fake_redis.get("diagnosis:autoID"))
-        self.assertEqual(new_id, initial_id + 1)
+    def test_import_checks_references(self):
+        """Test that rows referencing missing entities are rejected."""
+        self.fake_redis.hset("patient:1", mapping={"surname": "Doe"})
+        body = "patient_ID,type,information\n1,Flu,Mild\n42,Cold,\n1,Cough,\n"
 
-    def test_hospital_get_with_gaps_in_ids(self):
-        """Test GET request when there are gaps in hospital IDs."""
-        self.fake_redis.set("hospital:autoID", 5)
-        # Only create hospitals at indices 0 and 3
-        self.fake_redis.hset(
-            "hospital:0",
-            mapping={
-                b"name": b"Hospital 0",
-                b"address": b"Address 0",
-                b"phone": b"123",
-                b"beds_number": b"100",
-            },
+        response = self.fetch("/import/diagnosis?format=csv", method="POST", body=body)
+
+        report = json.loads(response.body)
+        self.assertEqual(report["created"], 2)
+        self.assertEqual(
+            report["errors"], [{"row": 2, "error": "No patient with such ID"}]
         )
-        self.fake_redis.hset(
-            "hospital:3",
-            mapping={
-                b"name": b"Hospital 3",
-                b"address": b"Address 3",
-                b"phone": b"456",
-                b"beds_number": b"200",
-            },
+        self.assertEqual(self.fake_redis.hget("diagnosis:3", "type"), b"Cough")
+        self.assertFalse(self.fake_redis.exists("diagnosis:2"))
+        self.assertEqual(main.id_allocator.ids_released, 1)
+
+    def test_import_rejects_duplicate_mpns(self):
+        """Test that MPNs already taken, also earlier in the same file, are rejected."""
+        self.fetch(
+            "/patient",
+            method="POST",
+            body="surname=Old&born_date=1990-01-01&sex=M&mpn=1",
+        )
+        body = "surname,born_date,sex,mpn\nA,2000,F,1\nB,2000,F,2\nC,2000,M,2\n"
+
+        response = self.fetch("/import/patient?format=csv", method="POST", body=body)
+
+        report = json.loads(response.body)
+        self.assertEqual(report["created"], 1)
+        self.assertEqual(
+            report["errors"],
+            [
+                {"row": 1, "error": "Patient with such MPN already exists"},
+                {"row": 3, "error": "Patient with such MPN already exists"},
+            ],
+        )
+        self.assertEqual(
+            self.fake_redis.hgetall("patient:mpn"), {b"1": b"1", b"2": b"3"}
         )
 
-        response = self.fetch("/hospital")
-        self.assertEqual(response.code, 200)
+    def test_import_writes_in_batches(self):
+        """Test that rows are written with one pipeline per batch."""
+        self.io_loop.run_sync(lambda: main.create_entity_script.load(self.fake_redis))
+        patch("main.IMPORT_BATCH_SIZE", 10).start()
+        call_many = patch.object(
+            main.create_entity_script,
+            "call_many",
+            wraps=main.create_entity_script.call_many,
+        ).start()
+        self.addCleanup(patch.stopall)
+        body = "surname,profession,hospital_ID\n" + "".join(
+            f"S{i},Surgeon,\n" for i in range(25)
+        )
+
+        response = self.fetch("/import/doctor?format=csv", method="POST", body=body)
+
+        self.assertEqual(json.loads(response.body)["created"], 25)
+        self.assertEqual(
+            [len(call.args[1]) for call in call_many.call_args_list], [10, 10, 5]
+        )
+        self.assertEqual(self.fake_redis.zcard("doctor:ids"), 25)
+
+    def test_import_reloads_flushed_script(self):
+        """Test that a batch is retried after Redis forgot the create script."""
+        self.fake_redis.script_flush()
+
+        response = self.fetch(
+            "/import/hospital",
+            method="POST",
+            body='{"name": "H", "address": "A"}',
+        )
+
+        self.assertEqual(json.loads(response.body)["created"], 1)
+        self.assertTrue(self.fake_redis.exists("hospital:1"))
+
+    def test_import_caps_error_list(self):
+        """Test that the error list is capped while all failures are counted."""
+        patch("main.IMPORT_MAX_ERRORS", 2).start()
+        self.addCleanup(patch.stopall)
+
+        response = self.fetch(
+            "/import/hospital", method="POST", body='{"name": ""}\n' * 5
+        )
+
+        report = json.loads(response.body)
+        self.assertEqual(report["failed"], 5)
+        self.assertEqual(len(report["errors"]), 2)
+
+    def test_import_unknown_format(self):
+        """Test that unsupported formats are rejected."""
+        response = self.fetch("/import/hospital?format=xml", method="POST", body="x")
+
+        self.assertEqual(response.code, 400)
+        self.assertIn(b"Import format must be one of", response.body)
+
+    def test_import_unknown_entity(self):
+        """Test that only importable entity types are routed."""
+        response = self.fetch("/import/doctor-patient", method="POST", body="")
+
+        self.assertEqual(response.code, 404)
+
+
+class TestStreamingExport(TestApplication):
+    """Tests for the streaming /export/<entity> endpoint."""
+
+    def test_export_ndjson(self):
+        """Test that every indexed entity is exported as one JSON line."""
+        self.seed_hospitals(3)
+
+        response = self.fetch("/export/hospital")
+
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in response.body.decode().splitlines()]
+        self.assertEqual([row["ID"] for row in rows], ["1", "2", "3"])
+        self.assertEqual(rows[0]["name"], "H1")
+
+    def test_export_csv(self):
+        """Test that CSV exports start with a header and quote values."""
+        self.fake_redis.hset(
+            "patient:1",
+            mapping={"surname": "Doe, Jr", "born_date": "2000", "sex": "M", "mpn": "7"},
+        )
+        self.fake_redis.zadd("patient:ids", {"1": 1})
+
+        response = self.fetch("/export/patient?format=csv")
+
+        self.assertEqual(response.code, 200)
+        self.assertIn("text/csv", response.headers["Content-Type"])
+        self.assertEqual(
+            response.body.decode().splitlines(),
+            ["ID,surname,born_date,sex,mpn", '1,"Doe, Jr",2000,M,7'],
+        )
+
+    def test_export_flushes_each_window(self):
+        """Test that rows are read and flushed one window at a time."""
+        self.seed_hospitals(25)
+        patch("main.EXPORT_WINDOW_SIZE", 10).start()
+        fetch_pipelined = patch(
+            "main.fetch_pipelined", wraps=main.fetch_pipelined
+        ).start()
+        flush = patch.object(
+            main.ExportHandler,
+            "flush",
+            autospec=True,
+            side_effect=main.ExportHandler.flush,
+        ).start()
+        self.addCleanup(patch.stopall)
+
+        response = self.fetch("/export/hospital")
+
+        self.assertEqual(len(response.body.decode().splitlines()), 25)
+        self.assertEqual(
+            [len(call.args[2]) for call in fetch_pipelined.call_args_list], [10, 10, 5]
+        )
+        self.assertGreaterEqual(flush.call_count, 3)
+
+    def test_export_doctor_patient(self):
+        """Test that links are exported one row per doctor-patient pair."""
+        self.fake_redis.zadd("doctor-patient:ids", {"1": 1, "2": 2})
+        self.fake_redis.sadd("doctor-patient:1", "10", "3")
+        self.fake_redis.sadd("doctor-patient:2", "4")
+
+        response = self.fetch("/export/doctor-patient?format=csv")
+
+        self.assertEqual(
+            response.body.decode().splitlines(),
+            ["doctor_ID,patient_ID", "1,3", "1,10", "2,4"],
+        )
+
+    def test_export_round_trips_through_import(self):
+        """Test that a CSV export can be imported again."""
+        self.seed_hospitals(2)
+        exported = self.fetch("/export/hospital?format=csv").body
+        self.fake_redis.flushall()
+        self.fake_redis.set("hospital:autoID", 1)
+        main.id_allocator.reset()
+
+        response = self.fetch(
+            "/import/hospital?format=csv", method="POST", body=exported
+        )
+
+        self.assertEqual(json.loads(response.body)["created"], 2)
+        self.assertEqual(self.fake_redis.hget("hospital:2", "name"), b"H2")
+
+    def test_export_invalid_format(self):
+        """Test that unsupported formats are rejected."""
+        response = self.fetch("/export/hospital?format=xml")
+
+        self.assertEqual(response.code, 400)
+
+    def test_export_redis_connection_error(self):
+        """Test that a Redis failure before streaming returns an error."""
+        with patch.object(
+            self.fake_redis,
+            "zrangebyscore",
+            side_effect=redis.exceptions.ConnectionError("Connection refused"),
+        ):
+            response = self.fetch("/export/hospital")
+
+        self.assertEqual(response.code, 400)
+        self.assertIn(b"Redis connection refused", response.body)
+
+    def test_export_aborts_on_redis_error_while_streaming(self):
+        """Test that a Redis failure mid-export drops the connection."""
+        self.seed_hospitals(3)
+        patch("main.EXPORT_WINDOW_SIZE", 1).start()
+        patch(
+            "main.fetch_pipelined",
+            side_effect=[
+                [{b"name": b"H1"}],
+                redis.exceptions.ConnectionError("Connection reset"),
+            ],
+        ).start()
+        self.addCleanup(patch.stopall)
+
+        with self.assertRaises(HTTPStreamClosedError):
+            self.fetch("/export/hospital")
+
+
+class TestMetrics(TestApplication):
+    """Tests for the /metrics endpoint and the handler instrumentation."""
+
+    def setUp(self):
+        """Start every test with empty metrics."""
+        super().setUp()
+        main.metrics.reset()
+        self.addCleanup(main.metrics.reset)
+
+    def test_list_page_metrics(self):
+        """Test that a list page records its Redis usage, render time and rows."""
+        self.seed_hospitals(3)
+
+        self.fetch("/hospital")
+
+        labels = ("/hospital", "GET")
+        # GET of the version, ZRANGEBYSCORE, then one pipeline with three HGETALLs
+        self.assertEqual(main.redis_commands.values[labels][1], 5)
+        self.assertEqual(main.redis_round_trips.values[labels][1], 3)
+        self.assertEqual(main.request_duration.values[labels][2], 1)
+        self.assertEqual(main.render_duration.values[labels][2], 1)
+        self.assertEqual(main.page_rows.values[("/hospital",)][1], 3)
+        self.assertEqual(main.requests_total.values[labels + ("200",)], 1)
+
+    def test_create_metrics(self):
+        """Test that a create is one script call once the ID block is reserved."""
+        for script in main.LUA_SCRIPTS:
+            self.fake_redis.script_load(script.source)
+        self.fetch(
+            "/hospital", method="POST", body="name=H&address=A&beds_number=&phone="
+        )
+        self.fetch(
+            "/hospital", method="POST", body="name=H&address=A&beds_number=&phone="
+        )
+
+        counts = main.redis_round_trips.values[("/hospital", "POST")][0]
+        # First create: reserve a block and create; second create: create only
+        bounds = list(main.COUNT_BUCKETS)
+        self.assertEqual(counts[bounds.index(1)], 1)
+        self.assertEqual(counts[bounds.index(2)], 1)
+
+    def test_error_counters(self):
+        """Test that handler errors are counted by type."""
+        with patch.object(
+            self.fake_redis,
+            "zrangebyscore",
+            side_effect=redis.exceptions.ConnectionError("Connection refused"),
+        ):
+            self.fetch("/hospital")
+        with patch.object(
+            main.id_allocator, "next_id", side_effect=ValueError("autoID missing")
+        ):
+            self.fetch(
+                "/patient", method="POST", body="surname=D&born_date=1&sex=M&mpn=1"
+            )
+
+        self.assertEqual(
+            main.handler_errors.values[("/hospital", "redis_connection")], 1
+        )
+        self.assertEqual(main.handler_errors.values[("/patient", "value_error")], 1)
+
+    def test_list_page_errors_are_counted(self):
+        """Test that failed page reads of every list route count as errors."""
+        for path, read in [
+            ("/doctor", "main.read_entity_page"),
+            ("/doctor-patient", "main.read_link_page"),
+        ]:
+            with self.subTest(path=path), patch(
+                read, side_effect=ValueError("invalid literal for int()")
+            ):
+                response = self.fetch(path)
+
+                self.assertEqual(response.code, 500)
+                self.assertEqual(main.handler_errors.values[(path, "value_error")], 1)
+
+    def test_metrics_endpoint(self):
+        """Test that /metrics serves the Prometheus text format."""
+        self.seed_hospitals(1)
+        self.fetch("/hospital")
+
+        response = self.fetch("/metrics")
+
+        self.assertEqual(response.code, 200)
+        self.assertIn("text/plain", response.headers["Content-Type"])
+        body = response.body.decode()
+        self.assertIn("# TYPE http_request_duration_seconds histogram", body)
+        self.assertIn(
+            'http_request_duration_seconds_count{route="/hospital",method="GET"} 1',
+            body,
+        )
+        self.assertIn(
+            'redis_round_trips_per_request_bucket{route="/hospital",method="GET",le="5"} 1',
+            body,
+        )
+        self.assertIn(
+            'http_requests_total{route="/hospital",method="GET",status="200"} 1', body
+        )
+
+    def test_id_routes_share_one_series(self):
+        """Test that routes capturing an ID are labelled with their pattern."""
+        self.seed_hospitals(3)
+
+        for hospital_id in (1, 2, 3):
+            self.fetch(f"/hospital/{hospital_id}/doctors")
+        self.fetch("/patient/7/chart")
+
+        body = self.fetch("/metrics").body.decode()
+        self.assertIn(
+            'http_requests_total{route="/hospital/{id}/doctors",method="GET",'
+            'status="200"} 3',
+            body,
+        )
+        self.assertIn(
+            'http_requests_total{route="/patient/{id}/chart",method="GET",'
+            'status="404"} 1',
+            body,
+        )
+        self.assertNotIn("/hospital/1/doctors", body)
+
+    def test_histogram_exposition(self):
+        """Test that histogram buckets are cumulative and labels are escaped."""
+        histogram = main.HistogramMetric("h", "help", ("path",), (1, 5))
+        histogram.observe(('a"b',), 0.5)
+        histogram.observe(('a"b',), 3)
+        histogram.observe(('a"b',), 9)
+
+        self.assertEqual(
+            histogram.expose()[2:],
+            [
+                'h_bucket{path="a\\"b",le="1"} 1',
+                'h_bucket{path="a\\"b",le="5"} 2',
+                'h_bucket{path="a\\"b",le="+Inf"} 3',
+                'h_sum{path="a\\"b"} 12.5',
+                'h_count{path="a\\"b"} 3',
+            ],
+        )
+
+    def test_instrumented_async_client(self):
+        """Test that asyncio replies are counted and timed when awaited."""
+        stats = main.RedisCallStats()
+        client = main.InstrumentedRedis(fakeredis.aioredis.FakeRedis(), stats)
+
+        async def run_commands():
+            await client.set("key", 1)
+            pipe = client.pipeline(transaction=False)
+            pipe.get("key")
+            pipe.get("key")
+            return await pipe.execute()
+
+        self.assertEqual(self.io_loop.run_sync(run_commands), [b"1", b"1"])
+        self.assertEqual(stats.commands, 3)
+        self.assertEqual(stats.round_trips, 2)
+        self.assertGreater(stats.seconds, 0)
+
+
+class TestIdAllocator(TestApplication):
+    """Tests for the block-reserving (hi/lo) ID allocator."""
+
+    def next_id(self, allocator, key="patient:autoID"):
+        """Allocate one ID from allocator against the fake Redis."""
+        return self.io_loop.run_sync(lambda: allocator.next_id(self.fake_redis, key))
+
+    def test_ids_come_from_one_reserved_block(self):
+        """Test that a block of IDs costs a single counter update."""
+        allocator = main.IdAllocator(3)
+
+        ids = [self.next_id(allocator) for _ in range(3)]
+
+        self.assertEqual(ids, ["1", "2", "3"])
+        self.assertEqual(self.fake_redis.get("patient:autoID"), b"4")
+        self.assertEqual(allocator.stats()["blocks_reserved"], 1)
+
+    def test_exhausted_block_reserves_next_block(self):
+        """Test that the allocator moves on to a fresh block when one runs out."""
+        allocator = main.IdAllocator(2)
+
+        ids = [self.next_id(allocator) for _ in range(5)]
+
+        self.assertEqual(ids, ["1", "2", "3", "4", "5"])
+        self.assertEqual(self.fake_redis.get("patient:autoID"), b"7")
+        stats = allocator.stats()
+        self.assertEqual(stats["blocks_reserved"], 3)
+        self.assertEqual(stats["ids_allocated"], 5)
+        self.assertEqual(stats["ids_available"], {"patient:autoID": 1})
+
+    def test_restart_never_reuses_ids(self):
+        """Test that a new process continues after the previous process's block."""
+        self.next_id(main.IdAllocator(10))
+
+        restarted = main.IdAllocator(10)
+
+        self.assertEqual(self.next_id(restarted), "11")
+
+    def test_processes_get_disjoint_blocks(self):
+        """Test that two processes sharing a counter never hand out the same ID."""
+        first, second = main.IdAllocator(4), main.IdAllocator(4)
+
+        ids = [self.next_id(first), self.next_id(second), self.next_id(first)]
+
+        self.assertEqual(ids, ["1", "5", "2"])
+
+    def test_fork_drops_reserved_block(self):
+        """Test that a forked child reserves its own block."""
+        allocator = main.IdAllocator(10)
+        self.next_id(allocator)
+
+        with patch("main.os.getpid", return_value=-1):
+            self.assertEqual(self.next_id(allocator), "11")
+
+    def test_released_id_is_reused(self):
+        """Test that a released ID is handed out next."""
+        allocator = main.IdAllocator(10)
+        entity_id = self.next_id(allocator)
+
+        allocator.release("patient:autoID", entity_id)
+
+        self.assertEqual(self.next_id(allocator), entity_id)
+        self.assertEqual(allocator.stats()["ids_released"], 1)
+
+    def test_missing_counter_raises_value_error(self):
+        """Test that an uninitialized counter is reported as ValueError."""
+        with self.assertRaises(ValueError):
+            self.next_id(main.IdAllocator(10), "unknown:autoID")
+
+    def test_stats_endpoint(self):
+        """Test that allocator statistics are exposed on /stats."""
+        self.fetch("/patient", method="POST", body="surname=D&born_date=1&sex=F&mpn=1")
+
+        response = self.fetch("/stats")
+
+        self.assertEqual(response.code, 200)
+        stats = json.loads(response.body)["id_allocator"]
+        self.assertEqual(stats["block_size"], main.ID_BLOCK_SIZE)
+        self.assertEqual(stats["ids_allocated"], 1)
+        self.assertEqual(
+            stats["ids_available"], {"patient:autoID": main.ID_BLOCK_SIZE - 1}
+        )
+
+
+class TestDatabaseInitialization(TestApplication):
+    """Tests for database initialization logic."""
+
+    def test_init_db_creates_auto_ids(self):
+        """Test that init_db creates all required autoID keys."""
+        # Clear the fake Redis
+        self.fake_redis.flushdb()
+
+        # Call init_db (main.r is already patched in setUp)
+        main.init_db()
+
+        # Verify all autoID keys were created
+        self.assertEqual(self.fake_redis.get("hospital:autoID"), b"1")
+        self.assertEqual(self.fake_redis.get("doctor:autoID"), b"1")
+        self.assertEqual(self.fake_redis.get("patient:autoID"), b"1")
+        self.assertEqual(self.fake_redis.get("diagnosis:autoID"), b"1")
+        self.assertEqual(self.fake_redis.get("db_initiated"), b"1")
+
+    def test_init_db_idempotent(self):
+        """Test that init_db doesn't overwrite existing data."""
+        # Set up existing data
+        self.fake_redis.set("hospital:autoID", 5)
+        self.fake_redis.set("doctor:autoID", 3)
+        self.fake_redis.set("patient:autoID", 10)
+        self.fake_redis.set("diagnosis:autoID", 2)
+        self.fake_redis.set("db_initiated", 1)
+
+        # Call init_db (main.r is already patched in setUp)
+        main.init_db()
+
+        # Verify existing values were preserved
+        self.assertEqual(self.fake_redis.get("hospital:autoID"), b"5")
+        self.assertEqual(self.fake_redis.get("doctor:autoID"), b"3")
+        self.assertEqual(self.fake_redis.get("patient:autoID"), b"10")
+        self.assertEqual(self.fake_redis.get("diagnosis:autoID"), b"2")
+
+
+class TestHospitalRoster(TestApplication):
+    """Tests for the hospital-doctor reverse index and the roster endpoint."""
+
+    def setUp(self):
+        """Store hospital 1."""
+        super().setUp()
+        self.fake_redis.hset("hospital:1", mapping={"name": "City", "address": "A"})
+
+    def create_doctor(self, surname, hospital_id):
+        """Create a doctor through the API and check that it succeeded."""
+        response = self.fetch(
+            "/doctor",
+            method="POST",
+            body=f"surname={surname}&profession=GP&hospital_ID={hospital_id}",
+        )
+        self.assertEqual(response.code, 200)
+
+    def test_doctor_create_updates_roster(self):
+        """Test that only doctors with a hospital are added to its set."""
+        self.create_doctor("Smith", "1")
+        self.create_doctor("Jones", "")
+
+        self.assertEqual(self.fake_redis.smembers("hospital-doctor:1"), {b"1"})
+        self.assertEqual(
+            self.fake_redis.keys("hospital-doctor:*"), [b"hospital-doctor:1"]
+        )
+
+    def test_rejected_doctor_not_in_roster(self):
+        """Test that a doctor of a missing hospital leaves no roster entry."""
+        response = self.fetch(
+            "/doctor", method="POST", body="surname=S&profession=GP&hospital_ID=9"
+        )
+
+        self.assertEqual(response.code, 400)
+        self.assertFalse(self.fake_redis.exists("hospital-doctor:9"))
+
+    def test_roster(self):
+        """Test that the roster lists the hospital and its doctors in ID order."""
+        self.fake_redis.hset("hospital:2", mapping={"name": "Other"})
+        for i in range(1, 12):
+            self.create_doctor(f"D{i}", "1" if i % 2 else "2")
+
+        response = self.fetch("/hospital/1/doctors")
+
+        self.assertEqual(response.code, 200)
+        roster = json.loads(response.body)
+        self.assertEqual(
+            roster["hospital"], {"id": "1", "name": "City", "address": "A"}
+        )
+        self.assertEqual(
+            [doctor["id"] for doctor in roster["doctors"]],
+            ["1", "3", "5", "7", "9", "11"],
+        )
+        self.assertEqual(
+            roster["doctors"][0],
+            {"id": "1", "surname": "D1", "profession": "GP", "hospital_ID": "1"},
+        )
+
+    def test_roster_of_unknown_hospital(self):
+        """Test that a missing hospital returns 404."""
+        response = self.fetch("/hospital/9/doctors")
+
+        self.assertEqual(response.code, 404)
+        self.assertIn(b"No hospital with such ID", response.body)
+
+    def test_roster_round_trips(self):
+        """Test that a roster costs one pipeline plus one per chunk of doctors."""
+        pipe = self.fake_redis.pipeline(transaction=False)
+        for i in range(1, 1001):
+            pipe.hset(f"doctor:{i}", mapping={"surname": "S", "hospital_ID": "1"})
+            pipe.sadd("hospital-doctor:1", i)
+        pipe.execute()
+
+        with self.assertRoundTrips(3):
+            response = self.fetch("/hospital/1/doctors")
+
+        self.assertEqual(len(json.loads(response.body)["doctors"]), 1000)
+
+    def test_import_updates_roster(self):
+        """Test that imported doctors are added to their hospital's roster."""
+        body = "surname,profession,hospital_ID\nA,GP,1\nB,GP,\n"
+
+        self.fetch("/import/doctor?format=csv", method="POST", body=body)
+
+        self.assertEqual(self.fake_redis.smembers("hospital-doctor:1"), {b"1"})
+
+
+class TestPatientChart(TestApplication):
+    """Tests for the patient reverse indexes and the chart endpoint."""
+
+    def setUp(self):
+        """Store patient 1 and doctors 1 and 2."""
+        super().setUp()
+        self.fake_redis.hset("patient:1", mapping={"surname": "Brown", "mpn": "1"})
+        self.fake_redis.hset("doctor:1", mapping={"surname": "Smith"})
+        self.fake_redis.hset("doctor:2", mapping={"surname": "Jones"})
+
+    def create(self, path, body):
+        """POST a create form and check that it succeeded."""
+        response = self.fetch(path, method="POST", body=body)
+        self.assertEqual(response.code, 200)
+
+    def test_creates_update_patient_indexes(self):
+        """Test that diagnoses and links are added to the patient's sets."""
+        self.create("/diagnosis", "patient_ID=1&type=Flu&information=")
+        self.create("/doctor-patient", "doctor_ID=2&patient_ID=1")
+
+        self.assertEqual(self.fake_redis.smembers("patient-diagnosis:1"), {b"1"})
+        self.assertEqual(self.fake_redis.smembers("patient-doctor:1"), {b"2"})
+        self.assertEqual(self.fake_redis.smembers("doctor-patient:2"), {b"1"})
+
+    def test_rejected_diagnosis_not_in_chart(self):
+        """Test that a diagnosis of a missing patient leaves no index entry."""
+        response = self.fetch(
+            "/diagnosis", method="POST", body="patient_ID=9&type=Flu&information="
+        )
+
+        self.assertEqual(response.code, 400)
+        self.assertFalse(self.fake_redis.exists("patient-diagnosis:9"))
+
+    def test_chart(self):
+        """Test that the chart lists the patient, diagnoses and doctors in ID order."""
+        self.create("/diagnosis", "patient_ID=1&type=Flu&information=Mild")
+        self.create("/diagnosis", "patient_ID=1&type=Cold&information=")
+        self.create("/doctor-patient", "doctor_ID=2&patient_ID=1")
+        self.create("/doctor-patient", "doctor_ID=1&patient_ID=1")
+
+        response = self.fetch("/patient/1/chart")
+
+        self.assertEqual(response.code, 200)
+        chart = json.loads(response.body)
+        self.assertEqual(chart["patient"], {"id": "1", "surname": "Brown", "mpn": "1"})
+        self.assertEqual(
+            chart["diagnoses"][0],
+            {"id": "1", "patient_ID": "1", "type": "Flu", "information": "Mild"},
+        )
+        self.assertEqual([d["id"] for d in chart["diagnoses"]], ["1", "2"])
+        self.assertEqual(
+            chart["doctors"],
+            [{"id": "1", "surname": "Smith"}, {"id": "2", "surname": "Jones"}],
+        )
+
+    def test_chart_of_unknown_patient(self):
+        """Test that a missing patient returns 404."""
+        response = self.fetch("/patient/9/chart")
+
+        self.assertEqual(response.code, 404)
+        self.assertIn(b"No patient with such ID", response.body)
+
+    def test_chart_round_trips(self):
+        """Test that a chart costs two round trips."""
+        pipe = self.fake_redis.pipeline(transaction=False)
+        for i in range(1, 201):
+            pipe.hset(f"diagnosis:{i}", mapping={"patient_ID": "1", "type": "T"})
+            pipe.sadd("patient-diagnosis:1", i)
+        pipe.sadd("patient-doctor:1", 1, 2)
+        pipe.execute()
+
+        with self.assertRoundTrips(2):
+            response = self.fetch("/patient/1/chart")
+
+        chart = json.loads(response.body)
+        self.assertEqual(len(chart["diagnoses"]), 200)
+        self.assertEqual(len(chart["doctors"]), 2)
+
+    def test_import_updates_chart(self):
+        """Test that imported diagnoses are added to their patient's set."""
+        body = "patient_ID,type,information\n1,Flu,\n"
+
+        self.fetch("/import/diagnosis?format=csv", method="POST", body=body)
+
+        self.assertEqual(self.fake_redis.smembers("patient-diagnosis:1"), {b"1"})
+
+
+class TestSurnameSearch(TestApplication):
+    """Tests for the surname search indexes and the /search endpoint."""
+
+    def create(self, path, body):
+        """POST a create form and check that it succeeded."""
+        response = self.fetch(path, method="POST", body=body)
+        self.assertEqual(response.code, 200)
+
+    def search(self, query_string):
+        """GET /search and return the decoded JSON body."""
+        response = self.fetch(f"/search?{query_string}")
+        self.assertEqual(response.code, 200)
+        return json.loads(response.body)
+
+    def test_creates_maintain_index(self):
+        """Test that patient and doctor creates add casefolded index members."""
+        self.create("/patient", "surname=McDonald&born_date=1&sex=M&mpn=1")
+        self.create("/doctor", "surname=Smith&profession=GP&hospital_ID=")
+
+        self.assertEqual(
+            self.fake_redis.zrange("patient:surnames", 0, -1), [b"mcdonald\x001"]
+        )
+        self.assertEqual(
+            self.fake_redis.zrange("doctor:surnames", 0, -1), [b"smith\x001"]
+        )
+
+    def test_search_prefix_across_types(self):
+        """Test that matches of both types are returned ordered by surname."""
+        self.create("/patient", "surname=Smithson&born_date=1&sex=M&mpn=1")
+        self.create("/patient", "surname=Doe&born_date=1&sex=F&mpn=2")
+        self.create("/doctor", "surname=smith&profession=GP&hospital_ID=")
+
+        result = self.search("q=SMI")
+
+        self.assertEqual(result["query"], "SMI")
+        self.assertEqual(
+            [
+                (match["type"], match["id"], match["surname"])
+                for match in result["results"]
+            ],
+            [("doctor", "1", "smith"), ("patient", "1", "Smithson")],
+        )
+        self.assertEqual(result["results"][1]["mpn"], "1")
+
+    def test_search_type_and_limit(self):
+        """Test that type restricts the indexes and limit caps the matches."""
+        for i in range(5):
+            self.create("/patient", f"surname=Lee&born_date=1&sex=M&mpn={i}")
+        self.create("/doctor", "surname=Lee&profession=GP&hospital_ID=")
+
+        self.assertEqual(len(self.search("q=lee&limit=3")["results"]), 3)
+        doctors = self.search("q=lee&type=doctor")["results"]
+        self.assertEqual([match["type"] for match in doctors], ["doctor"])
+
+    def test_search_does_not_match_inside_names(self):
+        """Test that only prefixes match."""
+        self.create("/patient", "surname=Anderson&born_date=1&sex=M&mpn=1")
+
+        self.assertEqual(self.search("q=son")["results"], [])
+
+    def test_search_rejects_invalid_parameters(self):
+        """Test the 400 responses for missing query, bad type and bad limit."""
+        for query_string, error in [
+            ("q=", b"Search query required"),
+            ("q=a&type=hospital", b"Type must be one of: doctor, patient"),
+            ("q=a&limit=0", b"Limit must be an integer between 1 and"),
+            ("q=a&limit=x", b"Limit must be an integer between 1 and"),
+        ]:
+            response = self.fetch(f"/search?{query_string}")
+            self.assertEqual(response.code, 400)
+            self.assertIn(error, response.body)
+
+    def test_import_maintains_index(self):
+        """Test that imported patients are searchable."""
+        body = "surname,born_date,sex,mpn\nBrown,2000,F,1\n"
+
+        self.fetch("/import/patient?format=csv", method="POST", body=body)
+
+        self.assertEqual(self.search("q=bro")["results"][0]["surname"], "Brown")
+
+    def test_search_round_trips_do_not_grow(self):
+        """Test that a search costs two round trips with 1,000 matching names."""
+        pipe = self.fake_redis.pipeline(transaction=False)
+        for i in range(1, 1001):
+            pipe.hset(f"patient:{i}", mapping={"surname": "Smith"})
+            pipe.zadd("patient:surnames", {f"smith\0{i}": 0})
+        pipe.execute()
+
+        with self.assertRoundTrips(2):
+            result = self.search("q=smith&limit=20")
+
+        self.assertEqual(len(result["results"]), 20)
+
+
+class TestRoundTripBudgets(TestApplication):
+    """Round trip budgets of the hot paths, so N+1 access patterns fail here."""
+
+    ROWS = 1000
+
+    def setUp(self):
+        """Register the Lua scripts as init_db does at server startup."""
+        super().setUp()
+        main.init_db()
+
+    def seed(self, entity_prefix, index_key, fields, rows=ROWS):
+        """Store rows copies of fields as entities 1..rows of one type."""
+        pipe = self.fake_redis.pipeline(transaction=False)
+        for i in range(1, rows + 1):
+            pipe.hset(f"{entity_prefix}{i}", mapping=fields)
+            pipe.zadd(index_key, {str(i): i})
+        pipe.execute()
+
+    def seed_patients(self):
+        """Store ROWS patients sharing one set of fields."""
+        self.seed(
+            "patient:",
+            "patient:ids",
+            {"surname": "Doe", "born_date": "2000-01-01", "sex": "M", "mpn": "1"},
+        )
+
+    def test_helper_fails_on_extra_round_trips(self):
+        """Test that exceeding the budget fails and lists the commands sent."""
+        with self.assertRaises(AssertionError) as context, self.assertRoundTrips(1):
+            main.r.get("hospital:autoID")
+            main.r.get("doctor:autoID")
+
+        self.assertIn("2 Redis round trips, budget 1", str(context.exception))
+        self.assertIn("GET x2", str(context.exception))
+
+    def test_patient_page(self):
+        """Test that 1,000 patients cost the version and index reads plus 2 pipelines."""
+        self.seed_patients()
+
+        with self.assertRoundTrips(4):
+            response = self.fetch(f"/patient?limit={self.ROWS}")
+
+        self.assertEqual(response.code, 200)
+
+    def test_doctor_patient_page(self):
+        """Test that 1,000 links cost 2 reads plus one pipeline per chunk.
+
+        The 1,000 sets take two pipelines and the 2,000 doctor and patient
+        surnames four more.
+        """
+        pipe = self.fake_redis.pipeline(transaction=False)
+        for i in range(1, self.ROWS + 1):
+            pipe.zadd("doctor-patient:ids", {str(i): i})
+            pipe.sadd(f"doctor-patient:{i}", i)
+        pipe.execute()
+
+        with self.assertRoundTrips(8):
+            response = self.fetch(f"/doctor-patient?limit={self.ROWS}")
+
+        self.assertEqual(response.code, 200)
+
+    def test_create_diagnosis(self):
+        """Test that a create reserves an ID block and runs one script call."""
+        self.seed_patients()
+
+        with self.assertRoundTrips(2):
+            response = self.fetch(
+                "/diagnosis",
+                method="POST",
+                body="patient_ID=1&type=Flu&information=",
+            )
+        self.assertEqual(response.code, 200)
+
+        # Later creates take their ID from the reserved block
+        with self.assertRoundTrips(1):
+            self.fetch(
+                "/diagnosis",
+                method="POST",
+                body="patient_ID=1&type=Flu&information=",
+            )
+
+    def test_create_doctor_patient_link(self):
+        """Test that a link costs one EXISTS pipeline for both IDs plus one MULTI."""
+        self.seed("doctor:", "doctor:ids", {"surname": "S", "profession": "P"}, 1)
+        self.seed_patients()
+
+        with self.assertRoundTrips(2):
+            response = self.fetch(
+                "/doctor-patient", method="POST", body="doctor_ID=1&patient_ID=1"
+            )
+
+        self.assertEqual(response.code, 200)
+
+    def test_export(self):
+        """Test that an export reads one index window and pipeline per window."""
+        self.seed_patients()
+
+        with self.assertRoundTrips(4):
+            response = self.fetch("/export/patient")
+
+        self.assertEqual(len(response.body.splitlines()), self.ROWS)
+
+    def test_import(self):
+        """Test that an import batch is one ID reservation plus one pipeline."""
+        body = "".join(
+            json.dumps({"name": f"H{i}", "address": "A"}) + "\n"
+            for i in range(self.ROWS)
+        )
+
+        with self.assertRoundTrips(2):
+            response = self.fetch(
+                "/import/hospital",
+                method="POST",
+                body=body,
+                headers={"Content-Type": "application/x-ndjson"},
+            )
+
+        self.assertEqual(json.loads(response.body)["created"], self.ROWS)
+
+
+class TestPageCache(TestApplication):
+    """Tests for the versioned cache of rendered list pages."""
+
+    def setUp(self):
+        """Preload the Lua scripts so creates cost one round trip."""
+        super().setUp()
+        main.init_db()
+        main.metrics.reset()
+        self.addCleanup(main.metrics.reset)
+
+    def create_hospital(self, name):
+        """Create a hospital through the API and check that it succeeded."""
+        response = self.fetch(
+            "/hospital",
+            method="POST",
+            body=f"name={name}&address=A&beds_number=&phone=",
+        )
+        self.assertEqual(response.code, 200)
+
+    def test_unchanged_page_costs_one_round_trip(self):
+        """Test that a repeated view is served from the cache after a version read."""
+        self.create_hospital("City")
+        first = self.fetch("/hospital")
+
+        with self.assertRoundTrips(1):
+            second = self.fetch("/hospital")
+
+        self.assertEqual(second.body, first.body)
+        self.assertIn(b"City", second.body)
+        self.assertEqual(main.page_cache.hits, 1)
+        self.assertEqual(main.page_cache.misses, 1)
+        self.assertEqual(main.page_cache_lookups.values[("/hospital", "hit")], 1)
+
+    def test_create_invalidates_page(self):
+        """Test that a create bumps the version and the next view re-renders."""
+        self.create_hospital("City")
+        self.fetch("/hospital")
+
+        self.create_hospital("Town")
+        response = self.fetch("/hospital")
+
+        self.assertIn(b"Town", response.body)
+        self.assertEqual(self.fake_redis.get("hospital:version"), b"2")
+        self.assertEqual(main.page_cache.hits, 0)
+
+    def test_other_types_stay_cached(self):
+        """Test that a create only invalidates the pages of its own type."""
+        self.create_hospital("City")
+        self.fetch("/hospital")
+
+        self.fetch(
+            "/doctor", method="POST", body="surname=S&profession=GP&hospital_ID="
+        )
+        self.fetch("/hospital")
+
+        self.assertEqual(main.page_cache.hits, 1)
+
+    def test_link_invalidates_relationship_page(self):
+        """Test that a doctor-patient link bumps the relationship version."""
+        self.fake_redis.hset("doctor:1", mapping={"surname": "Smith"})
+        self.fake_redis.hset("patient:1", mapping={"surname": "Brown"})
+        self.fake_redis.hset("patient:2", mapping={"surname": "Green"})
+        body = "doctor_ID=1&patient_ID={}"
+        self.fetch("/doctor-patient", method="POST", body=body.format(1))
+        self.fetch("/doctor-patient")
+
+        self.fetch("/doctor-patient", method="POST", body=body.format(2))
+        response = self.fetch("/doctor-patient")
+
+        self.assertIn(b"<td>Green</td>", response.body)
+        self.assertEqual(self.fake_redis.get("doctor-patient:version"), b"2")
+
+    def test_pages_cached_per_limit_and_cursor(self):
+        """Test that pages with different arguments are cached separately."""
+        for i in range(3):
+            self.create_hospital(f"Hospital{i}")
+
+        self.fetch("/hospital?limit=1")
+        response = self.fetch("/hospital?limit=2")
+
+        self.assertIn(b"Hospital1", response.body)
+        self.assertEqual(main.page_cache.stats()["entries"], 2)
+
+    def test_unversioned_types_not_cached(self):
+        """Test that types without a version (no create yet) are not cached."""
+        fields = {"address": "A", "phone": "", "beds_number": ""}
+        self.fake_redis.hset("hospital:1", mapping={"name": "City", **fields})
+        self.fake_redis.zadd("hospital:ids", {"1": 1})
+        self.fetch("/hospital")
+
+        self.fake_redis.hset("hospital:2", mapping={"name": "Town", **fields})
+        self.fake_redis.zadd("hospital:ids", {"2": 2})
+        response = self.fetch("/hospital")
+
+        self.assertIn(b"Town", response.body)
+        self.assertEqual(main.page_cache.stats()["entries"], 0)
+
+    def test_mpn_lookup_not_cached(self):
+        """Test that MPN lookups bypass the page cache."""
+        self.fetch("/patient", method="POST", body="surname=D&born_date=1&sex=F&mpn=7")
+
+        self.fetch("/patient?mpn=7")
+
+        self.assertEqual(main.page_cache.stats()["entries"], 0)
+
+    def test_ttl_expires_pages(self):
+        """Test that pages are rendered again once their TTL has passed."""
+        cache = main.PageCache(10, 30)
+        with patch("time.monotonic", return_value=100.0):
+            cache.put(("/hospital", 100, None), "1", "page")
+        with patch("time.monotonic", return_value=129.0):
+            self.assertEqual(cache.get(("/hospital", 100, None), "1"), "page")
+        with patch("time.monotonic", return_value=130.0):
+            self.assertIsNone(cache.get(("/hospital", 100, None), "1"))
+
+    def test_size_cap_evicts_least_recently_used(self):
+        """Test that the cache keeps at most max_entries pages."""
+        cache = main.PageCache(2, 30)
+        cache.put("a", "1", "A")
+        cache.put("b", "1", "B")
+        cache.get("a", "1")
+        cache.put("c", "1", "C")
+
+        self.assertIsNone(cache.get("b", "1"))
+        self.assertEqual(cache.get("a", "1"), "A")
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_disabled_cache_stores_nothing(self):
+        """Test that PAGE_CACHE_SIZE=0 renders every view."""
+        self.create_hospital("City")
+
+        with patch("main.page_cache", main.PageCache(0, 30)):
+            self.fetch("/hospital")
+            response = self.fetch("/hospital")
+            self.assertEqual(main.page_cache.stats()["entries"], 0)
+
+        self.assertIn(b"City", response.body)
+
+    def test_stats_endpoint(self):
+        """Test that cache statistics are exposed on /stats."""
+        self.create_hospital("City")
+        self.fetch("/hospital")
+        self.fetch("/hospital")
+
+        stats = json.loads(self.fetch("/stats").body)["page_cache"]
+
+        self.assertEqual(stats["max_entries"], main.PAGE_CACHE_SIZE)
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+
+class TestConditionalGet(TestApplication):
+    """Tests for the version based ETags of the list pages."""
+
+    def setUp(self):
+        """Preload the Lua scripts and create one record of every type."""
+        super().setUp()
+        main.init_db()
+        for path, body in [
+            ("/hospital", "name=City&address=A&beds_number=&phone="),
+            ("/doctor", "surname=Smith&profession=GP&hospital_ID=1"),
+            ("/patient", "surname=Brown&born_date=1&sex=F&mpn=1"),
+            ("/diagnosis", "patient_ID=1&type=Flu&information="),
+            ("/doctor-patient", "doctor_ID=1&patient_ID=1"),
+        ]:
+            response = self.fetch(path, method="POST", body=body)
+            self.assertEqual(response.code, 200)
+
+    def test_list_pages_answer_304(self):
+        """Test that every list page answers If-None-Match with one round trip."""
+        for path in [
+            "/hospital",
+            "/doctor",
+            "/patient",
+            "/diagnosis",
+            "/doctor-patient",
+        ]:
+            with self.subTest(path=path):
+                etag = self.fetch(path).headers["Etag"]
+                self.assertEqual(etag, f'"1-{main.templates_digest()}"')
+
+                with self.assertRoundTrips(1):
+                    response = self.fetch(path, headers={"If-None-Match": etag})
+
+                self.assertEqual(response.code, 304)
+                self.assertEqual(response.body, b"")
+
+    def test_304_skips_rendering(self):
+        """Test that a 304 neither reads rows nor renders the template."""
+        etag = self.fetch("/hospital").headers["Etag"]
+        main.page_cache.reset()
+
+        with patch.object(main.HospitalHandler, "render_string") as render_string:
+            response = self.fetch("/hospital", headers={"If-None-Match": etag})
+
+        self.assertEqual(response.code, 304)
+        render_string.assert_not_called()
+        self.assertEqual(main.page_cache.stats()["misses"], 0)
+
+    def test_create_changes_etag(self):
+        """Test that a create makes the old ETag stale."""
+        etag = self.fetch("/hospital").headers["Etag"]
+        self.fetch(
+            "/hospital", method="POST", body="name=Town&address=A&beds_number=&phone="
+        )
+
+        response = self.fetch("/hospital", headers={"If-None-Match": etag})
+
+        self.assertEqual(response.code, 200)
+        self.assertIn(b"Town", response.body)
+        self.assertNotEqual(response.headers["Etag"], etag)
+        self.assertEqual(response.headers["Cache-Control"], "no-cache")
+
+    def test_link_changes_etag(self):
+        """Test that a doctor-patient link makes the relationship ETag stale."""
+        etag = self.fetch("/doctor-patient").headers["Etag"]
+        self.fetch("/doctor-patient", method="POST", body="doctor_ID=1&patient_ID=1")
+
+        response = self.fetch("/doctor-patient", headers={"If-None-Match": etag})
+
+        self.assertEqual(response.code, 200)
+
+    def test_template_digest(self):
+        """Test that the digest changes with the template files."""
+        with tempfile.TemporaryDirectory() as template_dir:
+            path = os.path.join(template_dir, "page.html")
+            with open(path, "w") as template_file:
+                template_file.write("<p>one</p>")
+            first = main.templates_digest(template_dir)
+            with open(path, "w") as template_file:
+                template_file.write("<p>two</p>")
+
+            self.assertNotEqual(main.templates_digest(template_dir), first)
+            self.assertEqual(len(first), 12)
+
+    def test_digest_computed_once(self):
+        """Test that the template digest is computed at startup in both profiles."""
+        with patch.object(options.mockable(), "profile", "prod"):
+            settings = main.make_app().settings
+
+        self.assertEqual(settings["templates_digest"], main.templates_digest())
+        self.assertEqual(
+            main.make_app().settings["templates_digest"], main.templates_digest()
+        )
+
+    def test_debug_mode_reloads_on_template_edits(self):
+        """Test that debug mode restarts on template edits, changing the digest."""
+        with patch("tornado.autoreload.watch") as watch:
+            main.make_app(debug=True)
+
+        watched = {call.args[0] for call in watch.call_args_list}
+        self.assertIn(os.path.join(main.TEMPLATE_DIR, "hospital.html"), watched)
+
+    def test_pages_independent_of_working_directory(self):
+        """Test that templates and static files are found from any directory."""
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as other_dir:
+            os.chdir(other_dir)
+            try:
+                self._app = main.make_app()
+                self.http_server.request_callback = self._app
+                self.fetch(
+                    "/hospital",
+                    method="POST",
+                    body="name=Town&address=A&beds_number=&phone=",
+                )
+
+                page = self.fetch("/hospital")
+                static = self.fetch("/static/css/animate.css")
+            finally:
+                os.chdir(cwd)
+
+        self.assertEqual(page.code, 200)
+        self.assertIn(b"Town", page.body)
+        self.assertEqual(static.code, 200)
+
+
+class TestSingleFlight(TestApplication):
+    """Tests for the coalescing of concurrent identical reads."""
+
+    def setUp(self):
+        """Seed a hospital with two doctors and gate reads on an event."""
+        super().setUp()
+        main.metrics.reset()
+        self.addCleanup(main.metrics.reset)
+        self.fake_redis.hset(
+            "hospital:1",
+            mapping={"name": "City", "address": "A", "beds_number": "", "phone": ""},
+        )
+        self.fake_redis.zadd("hospital:ids", {"1": 1})
+        for doctor_id in ("1", "2"):
+            self.fake_redis.hset(
+                f"doctor:{doctor_id}",
+                mapping={"surname": f"D{doctor_id}", "hospital_ID": "1"},
+            )
+            self.fake_redis.sadd("hospital-doctor:1", doctor_id)
+        self.release = asyncio.Event()
+        self.fetches = []
+
+    def gated(self, fetch):
+        """Wrap a read coroutine function so its result waits for self.release."""
+
+        async def gated_fetch(*args):
+            self.fetches.append(args[1:])
+            result = await fetch(*args)
+            await self.release.wait()
+            return result
+
+        return gated_fetch
+
+    def fetch_concurrently(self, path, count):
+        """Send count requests for path, releasing the reads once all joined."""
+
+        async def run():
+            requests = [
+                self.http_client.fetch(self.get_url(path)) for _ in range(count)
+            ]
+            while main.single_flight.collapsed < count - 1:
+                await asyncio.sleep(0.01)
+            self.release.set()
+            return await gen.multi(requests)
+
+        return self.io_loop.run_sync(run)
+
+    def test_concurrent_roster_reads_share_one_fetch(self):
+        """Test that identical requests in flight read Redis once."""
+        with patch("main.read_hospital_roster", self.gated(main.read_hospital_roster)):
+            responses = self.fetch_concurrently("/hospital/1/doctors", 5)
+
+        self.assertEqual(self.fetches, [("1",)])
+        bodies = {response.body for response in responses}
+        self.assertEqual(len(bodies), 1)
+        self.assertEqual(len(json.loads(bodies.pop())["doctors"]), 2)
+        self.assertEqual(
+            main.single_flight.stats(), {"in_flight": 0, "leaders": 1, "collapsed": 4}
+        )
+
+    def test_read_started_before_create_is_not_shared(self):
+        """Test that a page read after a create never joins a read from before it."""
+        main.init_db()
+        self.fake_redis.set("hospital:autoID", 2)
+        self.fake_redis.set("hospital:version", 1)
+
+        async def run():
+            before = self.http_client.fetch(self.get_url("/hospital"))
+            while not self.fetches:
+                await asyncio.sleep(0.01)
+            await self.http_client.fetch(
+                self.get_url("/hospital"),
+                method="POST",
+                body="name=Town&address=A&beds_number=&phone=",
+            )
+            after = self.http_client.fetch(self.get_url("/hospital"))
+            while len(self.fetches) < 2 and not main.single_flight.collapsed:
+                await asyncio.sleep(0.01)
+            self.release.set()
+            return await gen.multi([before, after])
+
+        with patch("main.read_entity_page", self.gated(main.read_entity_page)):
+            before, after = self.io_loop.run_sync(run)
+
+        self.assertEqual(main.single_flight.stats()["collapsed"], 0)
+        self.assertNotIn(b"Town", before.body)
+        self.assertIn(b"Town", after.body)
+        self.assertEqual(after.headers["Etag"], f'"2-{main.templates_digest()}"')
+        response = self.fetch("/hospital")
+        self.assertIn(b"Town", response.body)
+        self.assertEqual(main.page_cache.stats()["hits"], 1)
+
+    def test_concurrent_page_reads_share_one_fetch(self):
+        """Test that concurrent requests for one list page read its rows once."""
+        with patch("main.read_entity_page", self.gated(main.read_entity_page)):
+            responses = self.fetch_concurrently("/hospital", 3)
+
+        self.assertEqual(len(self.fetches), 1)
+        for response in responses:
+            self.assertEqual(response.code, 200)
+            self.assertIn(b"City", response.body)
+
+        body = self.fetch("/metrics").body.decode()
+        self.assertIn(
+            'single_flight_requests_total{route="/hospital",result="leader"} 1', body
+        )
+        self.assertIn(
+            'single_flight_requests_total{route="/hospital",result="collapsed"} 2',
+            body,
+        )
+
+    def test_different_keys_are_not_collapsed(self):
+        """Test that reads of different pages run separately."""
+        single_flight = main.SingleFlight()
+
+        async def read(value):
+            await self.release.wait()
+            return value
+
+        async def run():
+            reads = [single_flight.run(("page", n), read, n) for n in range(3)]
+            await asyncio.sleep(0)
+            self.release.set()
+            return await gen.multi(reads)
+
+        self.assertEqual(self.io_loop.run_sync(run), [0, 1, 2])
+        self.assertEqual(single_flight.stats()["leaders"], 3)
+
+    def test_error_reaches_every_request(self):
+        """Test that a failed fetch fails every request that joined it."""
+        single_flight = main.SingleFlight()
+
+        async def read():
+            await self.release.wait()
+            raise redis.exceptions.ConnectionError("down")
+
+        async def run():
+            reads = [
+                asyncio.ensure_future(single_flight.run(("page",), read))
+                for _ in range(2)
+            ]
+            await asyncio.sleep(0)
+            self.release.set()
+            return await asyncio.gather(*reads, return_exceptions=True)
+
+        errors = self.io_loop.run_sync(run)
+
+        self.assertEqual(len(errors), 2)
+        for error in errors:
+            self.assertIsInstance(error, redis.exceptions.ConnectionError)
+        self.assertEqual(single_flight.stats()["collapsed"], 1)
+
+    def test_completed_read_is_not_reused(self):
+        """Test that a request after a fetch completed reads Redis again."""
+        self.fetch("/hospital/1/doctors")
+        self.fake_redis.hset("doctor:3", mapping={"surname": "D3", "hospital_ID": "1"})
+        self.fake_redis.sadd("hospital-doctor:1", "3")
+
+        response = self.fetch("/hospital/1/doctors")
+
+        self.assertEqual(len(json.loads(response.body)["doctors"]), 3)
+        self.assertEqual(main.single_flight.stats()["in_flight"], 0)
+        self.assertEqual(main.single_flight.stats()["leaders"], 2)
+
+    def test_stats_endpoint(self):
+        """Test that coalescing statistics are exposed on /stats."""
+        self.fetch("/hospital/1/doctors")
+
+        stats = json.loads(self.fetch("/stats").body)["single_flight"]
+
+        self.assertEqual(stats, {"in_flight": 0, "leaders": 1, "collapsed": 0})
+
+
+class TestKnownEntities(TestApplication):
+    """Tests for the cache of existing entities used by referential checks."""
+
+    def setUp(self):
+        """Preload the Lua scripts so creates cost one round trip."""
+        super().setUp()
+        main.init_db()
+
+    def link(self, doctor_id, patient_id):
+        """Link a doctor and a patient through the API."""
+        return self.fetch(
+            "/doctor-patient",
+            method="POST",
+            body=f"doctor_ID={doctor_id}&patient_ID={patient_id}",
+        )
+
+    def test_created_entities_are_linked_without_checks(self):
+        """Test that linking entities created by this process skips the checks."""
+        self.fetch(
+            "/doctor", method="POST", body="surname=Smith&profession=GP&hospital_ID="
+        )
+        self.fetch(
+            "/patient", method="POST", body="surname=Brown&born_date=1&sex=F&mpn=1"
+        )
+        self.redis_calls.trace.clear()
+
+        with self.assertRoundTrips(1):
+            response = self.link(1, 1)
+
+        self.assertEqual(response.code, 200)
+        self.assertNotIn("EXISTS", main.format_trace(self.redis_calls.trace))
+
+    def test_unknown_entities_are_checked_once(self):
+        """Test that unknown IDs cost one EXISTS pipeline and are then remembered."""
+        self.fake_redis.hset("doctor:5", mapping={"surname": "Smith"})
+        self.fake_redis.hset("patient:6", mapping={"surname": "Brown"})
+        self.fake_redis.hset("patient:7", mapping={"surname": "Green"})
+
+        with self.assertRoundTrips(2):
+            self.assertEqual(self.link(5, 6).code, 200)
+        self.assertIn("PIPELINE[EXISTS x2]", main.format_trace(self.redis_calls.trace))
+        with self.assertRoundTrips(2):
+            self.assertEqual(self.link(5, 7).code, 200)
+
+        self.assertEqual(self.fake_redis.smembers("doctor-patient:5"), {b"6", b"7"})
+        stats = main.known_entities.stats()
+        self.assertEqual((stats["entries"], stats["hits"]), (3, 1))
+
+    def test_missing_entity_is_not_remembered(self):
+        """Test that an entity missing at one check is found once it is created."""
+        self.fake_redis.hset("doctor:1", mapping={"surname": "Smith"})
+
+        response = self.link(1, 9)
+        self.assertEqual(response.code, 400)
+        self.assertEqual(response.body, b"No such ID for doctor or patient")
+
+        self.fake_redis.hset("patient:9", mapping={"surname": "Brown"})
+        self.assertEqual(self.link(1, 9).code, 200)
+
+    def test_diagnosis_create_remembers_patient(self):
+        """Test that a create remembers the linkable entity it refers to."""
+        self.fake_redis.hset("patient:1", mapping={"surname": "Brown"})
+
+        self.fetch(
+            "/diagnosis", method="POST", body="patient_ID=1&type=Flu&information="
+        )
+
+        self.assertEqual(list(main.known_entities.entries), ["patient:1"])
+
+    def test_only_linkable_entities_are_remembered(self):
+        """Test that hospitals and diagnoses do not take up cache entries."""
+        self.fetch(
+            "/hospital", method="POST", body="name=City&address=A&beds_number=&phone="
+        )
+        self.fetch(
+            "/doctor", method="POST", body="surname=Smith&profession=GP&hospital_ID=1"
+        )
+
+        self.assertEqual(list(main.known_entities.entries), ["doctor:1"])
+
+    def test_least_recently_used_key_is_evicted(self):
+        """Test that the cache keeps at most max_entries keys."""
+        known = main.KnownEntities(2)
+        known.add("doctor:1")
+        known.add("doctor:2")
+        known.contains("doctor:1")
+
+        known.add("doctor:3")
+
+        self.assertTrue(known.contains("doctor:1"))
+        self.assertFalse(known.contains("doctor:2"))
+        self.assertEqual(known.stats()["evictions"], 1)
+
+    def test_disabled_cache_stores_nothing(self):
+        """Test that a size of 0 checks every entity in Redis."""
+        known = main.KnownEntities(0)
+
+        known.add("doctor:1")
+
+        self.assertFalse(known.contains("doctor:1"))
+        self.assertEqual(known.stats()["entries"], 0)
+
+    def test_stats_endpoint(self):
+        """Test that cache statistics are exposed on /stats."""
+        self.fake_redis.hset("doctor:1", mapping={"surname": "Smith"})
+        self.fake_redis.hset("patient:1", mapping={"surname": "Brown"})
+        self.link(1, 1)
+
+        stats = json.loads(self.fetch("/stats").body)["known_entities"]
+
+        self.assertEqual(stats["max_entries"], main.KNOWN_ENTITIES_SIZE)
+        self.assertEqual((stats["entries"], stats["misses"]), (2, 2))
+
+
+class TestClientCache(TestApplication):
+    """Tests for the client-side cache of entity hashes."""
+
+    def setUp(self):
+        """Seed a hospital with two doctors and a tracking cache."""
+        super().setUp()
+        self.fake_redis.hset(
+            "hospital:1",
+            mapping={"name": "City", "address": "A", "beds_number": "", "phone": ""},
+        )
+        for doctor_id in ("1", "2"):
+            self.fake_redis.hset(
+                f"doctor:{doctor_id}",
+                mapping={"surname": f"D{doctor_id}", "hospital_ID": "1"},
+            )
+            self.fake_redis.sadd("hospital-doctor:1", doctor_id)
+        # Tracking as if the listener had confirmed its subscription
+        self.cache = main.ClientCache(100)
+        self.cache.tracking = True
+        self.cache_patcher = patch("main.client_cache", self.cache)
+        self.cache_patcher.start()
+        self.addCleanup(self.cache_patcher.stop)
+
+    def roster_surnames(self):
+        """Return the surnames of the doctors on the roster of hospital 1."""
+        response = self.fetch("/hospital/1/doctors")
+        self.assertEqual(response.code, 200)
+        return [doctor["surname"] for doctor in json.loads(response.body)["doctors"]]
+
+    def test_cached_hashes_skip_redis(self):
+        """Test that cached doctors are not read again."""
+        self.roster_surnames()
+        self.redis_calls.trace.clear()
+
+        with self.assertRoundTrips(1):
+            self.assertEqual(self.roster_surnames(), ["D1", "D2"])
+
+        self.assertNotIn("HGETALL x2", main.format_trace(self.redis_calls.trace))
+        self.assertEqual(self.cache.stats()["hits"], 2)
+
+    def test_invalidation_drops_key(self):
+        """Test that an invalidation message makes the next read go to Redis."""
+        self.roster_surnames()
+        self.fake_redis.hset("doctor:1", "surname", "New")
+
+        self.cache.handle_invalidation({"data": [b"doctor:1"]})
+
+        self.assertEqual(self.roster_surnames(), ["New", "D2"])
+        self.assertEqual(self.cache.stats()["invalidations"], 1)
+
+    def test_flush_message_drops_everything(self):
+        """Test that an invalidation without keys (FLUSHDB) empties the cache."""
+        self.roster_surnames()
+
+        self.cache.handle_invalidation({"data": None})
+
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+    def test_hash_invalidated_during_read_is_not_stored(self):
+        """Test that a read racing an invalidation of its key is not cached."""
+        self.cache.begin(["doctor:1", "doctor:2"])
+        self.cache.handle_invalidation({"data": [b"doctor:1"]})
+
+        self.cache.end(["doctor:1", "doctor:2"], [{b"surname": b"Old"}, {}])
+
+        self.assertEqual(list(self.cache.entries), ["doctor:2"])
+        self.assertEqual(self.cache.pending, {})
+
+    def test_failed_read_is_not_stored(self):
+        """Test that a failed read leaves nothing behind."""
+        self.cache.begin(["doctor:1"])
+
+        self.cache.end(["doctor:1"], None)
+
+        self.assertEqual((self.cache.entries, self.cache.pending), ({}, {}))
+
+    def test_cache_off_until_tracking(self):
+        """Test that nothing is cached while invalidations may be missed."""
+        self.cache.tracking = False
+
+        self.roster_surnames()
+        self.roster_surnames()
+
+        self.assertEqual(self.cache.stats()["entries"], 0)
+        self.assertEqual(self.cache.stats()["hits"], 0)
+
+    def test_least_recently_used_hash_is_evicted(self):
+        """Test that the cache keeps at most max_entries hashes."""
+        cache = main.ClientCache(1)
+        cache.tracking = True
+        cache.begin(["doctor:1", "doctor:2"])
+
+        cache.end(["doctor:1", "doctor:2"], [{b"surname": b"D1"}, {b"surname": b"D2"}])
+
+        self.assertEqual(list(cache.entries), ["doctor:2"])
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_listener_serves_cache_once_subscribed(self):
+        """Test that the listener turns the cache on when the subscription is confirmed."""
+        cache = main.ClientCache(10)
+        # fakeredis has no CLIENT command: subscribe without enabling tracking
+        with patch.object(
+            main.ClientCache, "enable_tracking", lambda cache, connection: None
+        ):
+            cache.start(self.fake_redis)
+            self.addCleanup(cache.stop)
+            deadline = time.monotonic() + 5
+            while not cache.tracking and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+        self.assertTrue(cache.tracking)
+
+    def test_disabled_cache_does_not_start(self):
+        """Test that a size of 0 opens no tracking connection."""
+        cache = main.ClientCache(0)
+
+        cache.start(self.fake_redis)
+
+        self.assertIsNone(cache.pubsub)
+        self.assertFalse(cache.tracking)
+
+    def test_stats_endpoint(self):
+        """Test that cache statistics are exposed on /stats."""
+        self.roster_surnames()
+
+        stats = json.loads(self.fetch("/stats").body)["client_cache"]
+
+        self.assertEqual(stats["max_entries"], 100)
+        self.assertTrue(stats["tracking"])
+        self.assertEqual((stats["entries"], stats["misses"]), (2, 2))
+
+
+class TestClientTracking(unittest.TestCase):
+    """Tests of the client-side cache against a locally launched redis-server."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Start a throwaway redis-server on a free port."""
+        server = shutil.which("redis-server")
+        if server is None:
+            raise unittest.SkipTest("redis-server not installed")
+        with socket.socket() as free_socket:
+            free_socket.bind(("127.0.0.1", 0))
+            cls.port = free_socket.getsockname()[1]
+        cls.server = subprocess.Popen(
+            [server, "--port", str(cls.port), "--save", "", "--appendonly", "no"],
+            stdout=subprocess.DEVNULL,
+        )
+        client = redis.StrictRedis(port=cls.port)
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                client.ping()
+                break
+            except redis.exceptions.ConnectionError:
+                if time.monotonic() > deadline:
+                    cls.server.kill()
+                    raise
+                time.sleep(0.05)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the redis-server."""
+        cls.server.terminate()
+        cls.server.wait()
+
+    def setUp(self):
+        """Start a cache tracking a fresh database."""
+        self.client = redis.StrictRedis(port=self.port)
+        self.client.flushdb()
+        self.client.hset("doctor:1", "surname", "Smith")
+        self.cache = main.ClientCache(100)
+        self.cache.start(self.client)
+        self.addCleanup(self.cache.stop)
+        self.wait_for(lambda: self.cache.tracking)
+        patcher = patch("main.client_cache", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def wait_for(self, condition):
+        """Wait up to 5 seconds for condition() to become true."""
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline, "timed out")
+            time.sleep(0.01)
+
+    def read(self, key="doctor:1"):
+        """Read one entity hash through the cache."""
+        return asyncio.run(main.fetch_entities(self.client, [key]))[0]
+
+    def test_write_invalidates_cached_hash(self):
+        """Test that a write by another client evicts the cached hash."""
+        self.assertEqual(self.read(), {b"surname": b"Smith"})
+        self.assertEqual(self.read(), {b"surname": b"Smith"})
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+        redis.StrictRedis(port=self.port).hset("doctor:1", "surname", "Jones")
+
+        self.wait_for(lambda: "doctor:1" not in self.cache.entries)
+        self.assertEqual(self.read(), {b"surname": b"Jones"})
+
+    def test_listener_reconnects(self):
+        """Test that tracking resumes after the listener connection is killed."""
+        self.read()
+        self.client.client_kill_filter(_type="pubsub")
+
+        self.wait_for(lambda: not self.cache.tracking or not self.cache.entries)
+        self.wait_for(lambda: self.cache.tracking)
+        self.read()
+        self.client.hset("doctor:1", "surname", "Jones")
+
+        self.wait_for(lambda: "doctor:1" not in self.cache.entries)
+
+
+class TestRedisTracing(TestApplication):
+    """Tests for the per-request Redis trace and the Server-Timing header."""
+
+    def test_no_server_timing_by_default(self):
+        """Test that untraced requests get no Server-Timing header."""
+        response = self.fetch("/hospital")
+
+        self.assertEqual(response.code, 200)
+        self.assertNotIn("Server-Timing", response.headers)
+
+    def test_server_timing_header(self):
+        """Test that a traced request reports Redis and render time."""
+        self.seed_hospitals(3)
+
+        response = self.fetch("/hospital", headers={"X-Redis-Trace": "1"})
+
+        self.assertEqual(response.code, 200)
+        timing = response.headers["Server-Timing"]
+        self.assertRegex(timing, r"^redis;dur=\d+\.\d{2};")
+        self.assertIn('desc="5 commands, 3 round trips"', timing)
+        self.assertRegex(timing, r"render;dur=\d+\.\d{2}$")
+
+    def test_server_timing_on_errors(self):
+        """Test that error responses of traced requests carry Server-Timing too."""
+        response = self.fetch(
+            "/hospital",
+            method="POST",
+            body="name=&address=&beds_number=&phone=",
+            headers={"X-Redis-Trace": "1"},
+        )
+
+        self.assertEqual(response.code, 400)
+        self.assertIn("redis;dur=", response.headers["Server-Timing"])
+
+    def test_trace_log(self):
+        """Test that the "log" mode logs the command sequence of the request."""
+        self.seed_hospitals(3)
+
+        with self.assertLogs(level="INFO") as logs:
+            self.fetch("/hospital", headers={"X-Redis-Trace": "log"})
+
+        [line] = [line for line in logs.output if "Redis trace" in line]
+        self.assertIn("GET /hospital: 5 commands, 3 round trips", line)
+        self.assertIn("ZRANGEBYSCORE hospital:ids", line)
+        self.assertIn("PIPELINE[HGETALL x3]", line)
+
+    def test_trace_log_disabled(self):
+        """Test that "log" only adds Server-Timing when trace_log is off."""
+        self.seed_hospitals(3)
+        self._app.settings["trace_log"] = False
+
+        with self.assertLogs(level="INFO") as logs:
+            response = self.fetch("/hospital", headers={"X-Redis-Trace": "log"})
+
+        self.assertFalse([line for line in logs.output if "Redis trace" in line])
+        self.assertIn("redis;dur=", response.headers["Server-Timing"])
+
+    def test_format_trace_collapses_runs(self):
+        """Test that repeated commands are summarized as one entry."""
+        trace = [("ZRANGE", "doctor:ids", 0.001)]
+        trace += [("SMEMBERS", f"doctor-patient:{i}", 0.0005) for i in range(4)]
+
+        self.assertEqual(
+            main.format_trace(trace), "ZRANGE doctor:ids 1.00ms; SMEMBERS x4 2.00ms"
+        )
+
+    def test_untraced_requests_record_no_trace(self):
+        """Test that the command sequence is only kept when tracing is enabled."""
+        stats = main.RedisCallStats()
+        conn = main.InstrumentedRedis(self.fake_redis, stats)
+
+        conn.get("hospital:autoID")
+
+        self.assertIsNone(stats.trace)
+        self.assertEqual(stats.round_trips, 1)
+
+
+class TestServerStartup(TestApplication):
+    """Tests for the single-process and pre-forked server entry point."""
+
+    def start_server(self, workers):
+        """Run start_server with forking, sockets and the IOLoop mocked out."""
+        self.fork = patch("tornado.process.fork_processes", return_value=0).start()
+        self.bind = patch("tornado.netutil.bind_sockets", return_value=[]).start()
+        self.make_app = patch("main.make_app").start()
+        self.server_class = patch("tornado.httpserver.HTTPServer").start()
+        patch("tornado.ioloop.IOLoop.current").start()
+        self.addCleanup(patch.stopall)
+        self.fake_redis.flushdb()
+
+        main.start_server(8000, workers)
+
+    def test_single_worker_runs_in_debug_mode(self):
+        """Test that one worker serves in-process with debug mode on."""
+        self.start_server(1)
+
+        self.fork.assert_not_called()
+        self.bind.assert_called_once_with(8000)
+        self.make_app.assert_called_once_with(debug=None)
+        self.assertEqual(self.fake_redis.get("db_initiated"), b"1")
+
+    def test_multiple_workers_fork_with_reuse_port(self):
+        """Test that workers are forked after init_db and bind with SO_REUSEPORT."""
+        self.start_server(4)
+
+        self.fork.assert_called_once_with(4)
+        self.bind.assert_called_once_with(8000, reuse_port=True)
+        self.make_app.assert_called_once_with(debug=False)
+        self.assertEqual(self.fake_redis.get("db_initiated"), b"1")
+
+    def test_shared_socket_without_reuse_port(self):
+        """Test that the socket is bound before forking without SO_REUSEPORT."""
+        with patch.object(main.socket, "SO_REUSEPORT", create=True):
+            del main.socket.SO_REUSEPORT
+            self.start_server(2)
+
+        self.bind.assert_called_once_with(8000)
+        self.fork.assert_called_once_with(2)
+
+    def test_server_options(self):
+        """Test that buffer size and idle timeout options reach the HTTP server."""
+        patch.object(options.mockable(), "max_buffer_size", 1024).start()
+        patch.object(options.mockable(), "idle_connection_timeout", 30.0).start()
+
+        self.start_server(1)
+
+        kwargs = self.server_class.call_args.kwargs
+        self.assertEqual(kwargs["max_buffer_size"], 1024)
+        self.assertEqual(kwargs["idle_connection_timeout"], 30.0)
+
+
+class TestRuntimeProfiles(TestApplication):
+    """Tests for the runtime options and dev/prod profiles."""
+
+    def use_profile(self, profile):
+        """Select a runtime profile for the rest of the test."""
+        patch.object(options.mockable(), "profile", profile).start()
+        self.addCleanup(patch.stopall)
+
+    def test_dev_profile_settings(self):
+        """Test that the default dev profile keeps debug mode and re-reads templates."""
+        settings = main.make_app().settings
+
+        self.assertTrue(settings["debug"])
+        self.assertTrue(settings["autoreload"])
+        self.assertFalse(settings["compiled_template_cache"])
+        self.assertEqual(settings["static_cache_max_age"], 0)
+
+    def test_prod_profile_settings(self):
+        """Test that the prod profile disables autoreload and caches templates."""
+        self.use_profile("prod")
+
+        settings = main.make_app().settings
+
+        self.assertFalse(settings["autoreload"])
+        self.assertFalse(settings["serve_traceback"])
+        self.assertTrue(settings["compiled_template_cache"])
+        self.assertTrue(settings["static_hash_cache"])
+        self.assertEqual(settings["static_cache_max_age"], 86400)
+        self.assertFalse(settings["trace_log"])
+
+    def test_explicit_option_overrides_profile(self):
+        """Test that options set on the command line win over the profile."""
+        self.use_profile("prod")
+        patch.object(options.mockable(), "template_cache", False).start()
+
+        self.assertFalse(main.get_setting("template_cache"))
+        self.assertFalse(main.get_setting("debug"))
+
+    def test_unknown_profile(self):
+        """Test that an unknown profile is reported."""
+        self.use_profile("staging")
+
+        with self.assertRaises(tornado.options.Error):
+            main.get_setting("debug")
+
+    def test_env_option(self):
+        """Test that environment defaults are converted to the option type."""
+        with patch.dict(main.os.environ, {"A": "yes", "B": "2.5", "C": "0"}):
+            self.assertTrue(main.env_option("A", bool))
+            self.assertEqual(main.env_option("B", float), 2.5)
+            self.assertFalse(main.env_option("C", bool))
+            self.assertIsNone(main.env_option("MISSING", int))
+
+    def test_configure_redis_applies_socket_timeouts(self):
+        """Test that the Redis clients are rebuilt with the profile's timeouts."""
+        self.use_profile("prod")
+        patch("main.r").start()
+        patch("main.async_r", object()).start()
+
+        main.configure_redis()
+
+        kwargs = main.r.connection_pool.connection_kwargs
+        self.assertEqual(kwargs["socket_timeout"], 5.0)
+        self.assertEqual(kwargs["socket_connect_timeout"], 2.0)
+        self.assertIsNone(main.async_r)
+
+    def test_static_files_cached_in_prod(self):
+        """Test that prod serves static files with a Cache-Control max-age."""
+        self.use_profile("prod")
+        self._app = main.make_app()
+        self.http_server.request_callback = self._app
+
+        response = self.fetch("/static/css/animate.css")
+
+        self.assertEqual(response.code, 200)
+        self.assertEqual(response.headers["Cache-Control"], "max-age=86400")
+
+    def test_static_files_not_cached_in_dev(self):
+        """Test that dev does not let browsers cache static files."""
+        response = self.fetch("/static/css/animate.css")
+
+        self.assertEqual(response.code, 200)
+        self.assertNotIn("Cache-Control", response.headers)
+
+
+class TestEdgeCases(TestApplication):
+    """Tests for edge cases and boundary conditions."""
+
+    def test_hospital_auto_id_increment(self):
+        """Test that hospital autoID advances by one reserved block."""
+        initial_id = int(self.fake_redis.get("hospital:autoID"))
+
+        response = self.fetch(
+            "/hospital",
+            method="POST",
+            body="name=Hospital1&address=Address1&beds_number=100&phone=123",
+        )
+        self.assertEqual(response.code, 200)
+
+        new_id = int(self.fake_redis.get("hospital:autoID"))
+        self.assertEqual(new_id, initial_id + main.ID_BLOCK_SIZE)
+
+    def test_doctor_auto_id_increment(self):
+        """Test that doctor autoID advances by one reserved block."""
+        initial_id = int(self.fake_redis.get("doctor:autoID"))
+
+        response = self.fetch(
+            "/doctor",
+            method="POST",
+            body="surname=Doctor1&profession=Surgeon&hospital_ID=",
+        )
+        self.assertEqual(response.code, 200)
+
+        new_id = int(self.fake_redis.get("doctor:autoID"))
+        self.assertEqual(new_id, initial_id + main.ID_BLOCK_SIZE)
+
+    def test_patient_auto_id_increment(self):
+        """Test that patient autoID advances by one reserved block."""
+        initial_id = int(self.fake_redis.get("patient:autoID"))
+
+        response = self.fetch(
+            "/patient",
+            method="POST",
+            body="surname=Patient1&born_date=1990-01-01&sex=M&mpn=123",
+        )
+        self.assertEqual(response.code, 200)
+
+        new_id = int(self.fake_redis.get("patient:autoID"))
+        self.assertEqual(new_id, initial_id + main.ID_BLOCK_SIZE)
+
+    def test_diagnosis_auto_id_increment(self):
+        """Test that diagnosis autoID advances by one reserved block."""
+        # Create a patient first
+        self.fake_redis.set("patient:autoID", 2)
+        self.fake_redis.hset(
+            "patient:0",
+            mapping={
+                b"surname": b"Doe",
+                b"born_date": b"1990-01-01",
+                b"sex": b"M",
+                b"mpn": b"123456789",
+            },
+        )
+
+        initial_id = int(self.fake_redis.get("diagnosis:autoID"))
+
+        response = self.fetch(
+            "/diagnosis", method="POST", body="patient_ID=0&type=Flu&information=Test"
+        )
+        self.assertEqual(response.code, 200)
+
+        new_id = int(self.fake_redis.get("diagnosis:autoID"))
+        self.assertEqual(new_id, initial_id + main.ID_BLOCK_SIZE)
+
+    def test_hospital_get_with_gaps_in_ids(self):
+        """Test GET request when there are gaps in hospital IDs."""
+        self.fake_redis.set("hospital:autoID", 5)
+        # Only create hospitals at indices 0 and 3
+        self.fake_redis.hset(
+            "hospital:0",
+            mapping={
+                b"name": b"Hospital 0",
+                b"address": b"Address 0",
+                b"phone": b"123",
+                b"beds_number": b"100",
+            },
+        )
+        self.fake_redis.hset(
+            "hospital:3",
+            mapping={
+                b"name": b"Hospital 3",
+                b"address": b"Address 3",
+                b"phone": b"456",
+                b"beds_number": b"200",
+            },
+        )
+        self.fake_redis.zadd("hospital:ids", {"0": 0, "3": 3})
+
+        response = self.fetch("/hospital")
+        self.assertEqual(response.code, 200)
+        self.assertIn(b"Hospital 0", response.body)
+        self.assertIn(b"Hospital 3", response.body)
+
+    def test_hospital_get_skips_unindexed_hashes(self):
+        """Test that only hospitals registered in the ID index are listed."""
+        self.fake_redis.hset(
+            "hospital:0",
+            mapping={
+                b"name": b"Orphan Hospital",
+                b"address": b"Nowhere",
+                b"phone": b"",
+                b"beds_number": b"",
+            },
+        )
+
+        response = self.fetch("/hospital")
+        self.assertEqual(response.code, 200)
+        self.assertNotIn(b"Orphan Hospital", response.body)
+
+    def test_create_registers_id_in_index(self):
+        """Test that every create adds the new ID to the entity's ID index."""
+        self.fetch(
+            "/hospital",
+            method="POST",
+            body="name=H1&address=A1&beds_number=1&phone=1",
+        )
+        self.fetch(
+            "/hospital",
+            method="POST",
+            body="name=H2&address=A2&beds_number=2&phone=2",
+        )
+        self.fetch(
+            "/patient",
+            method="POST",
+            body="surname=Doe&born_date=1990-01-01&sex=M&mpn=1",
+        )
+
+        self.assertEqual(self.fake_redis.zrange("hospital:ids", 0, -1), [b"1", b"2"])
+        self.assertEqual(self.fake_redis.zrange("patient:ids", 0, -1), [b"1"])
 
     def test_doctor_with_empty_hospital_id(self):
         """Test creating doctor with empty hospital_ID (should be allowed)."""
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+"""
+Unit tests for the maintenance commands.
+Tests run every migration against fakeredis.
+"""
+
+import unittest
+from unittest.mock import patch
+
+import fakeredis
+
+import maintenance
+
+
+class TestMaintenance(unittest.TestCase):
+    """Base test class for the maintenance commands."""
+
+    def setUp(self):
+        """Set up a fake Redis instance with the initialized counters."""
+        self.fake_redis = fakeredis.FakeStrictRedis(decode_responses=False)
+        self.fake_redis.set("hospital:autoID", 1)
+        self.fake_redis.set("doctor:autoID", 1)
+        self.fake_redis.set("patient:autoID", 1)
+        self.fake_redis.set("diagnosis:autoID", 1)
+        self.fake_redis.set("db_initiated", 1)
+
+
+class TestBuildIdIndexes(TestMaintenance):
+    """Tests for the build-id-indexes migration."""
+
+    def test_indexes_existing_entities(self):
+        """Test that every stored entity ends up in its ID index."""
+        self.fake_redis.hset("hospital:0", mapping={"name": "H0"})
+        self.fake_redis.hset("hospital:3", mapping={"name": "H3"})
+        self.fake_redis.hset("doctor:2", mapping={"surname": "Smith"})
+        self.fake_redis.hset("patient:1", mapping={"surname": "Doe"})
+        self.fake_redis.hset("diagnosis:5", mapping={"type": "Flu"})
+        self.fake_redis.sadd("doctor-patient:2", "1")
+
+        counts = maintenance.build_id_indexes(self.fake_redis)
+
+        self.assertEqual(counts["hospital:ids"], 2)
+        self.assertEqual(self.fake_redis.zrange("hospital:ids", 0, -1), [b"0", b"3"])
+        self.assertEqual(self.fake_redis.zrange("doctor:ids", 0, -1), [b"2"])
+        self.assertEqual(self.fake_redis.zrange("patient:ids", 0, -1), [b"1"])
+        self.assertEqual(self.fake_redis.zrange("diagnosis:ids", 0, -1), [b"5"])
+        self.assertEqual(self.fake_redis.zrange("doctor-patient:ids", 0, -1), [b"2"])
+
+    def test_skips_non_entity_keys(self):
+        """Test that counters and the indexes themselves are not indexed."""
+        self.fake_redis.hset("hospital:1", mapping={"name": "H1"})
+
+        maintenance.build_id_indexes(self.fake_redis)
+
+        self.assertEqual(self.fake_redis.zrange("hospital:ids", 0, -1), [b"1"])
+        self.assertEqual(self.fake_redis.zcard("doctor:ids"), 0)
+
+    def test_idempotent(self):
+        """Test that running the migration twice gives the same indexes."""
+        self.fake_redis.hset("patient:4", mapping={"surname": "Doe"})
+
+        maintenance.build_id_indexes(self.fake_redis)
+        maintenance.build_id_indexes(self.fake_redis)
+
+        self.assertEqual(self.fake_redis.zrange("patient:ids", 0, -1), [b"4"])
+
+
+class TestBuildMpnIndex(TestMaintenance):
+    """Tests for the build-mpn-index migration."""
+
+    def test_indexes_patients(self):
+        """Test that every patient's MPN points to its ID."""
+        self.fake_redis.hset("patient:1", mapping={"surname": "A", "mpn": "111"})
+        self.fake_redis.hset("patient:2", mapping={"surname": "B", "mpn": "222"})
+
+        result = maintenance.build_mpn_index(self.fake_redis)
+
+        self.assertEqual(result, {"indexed": 2, "duplicates": 0})
+        self.assertEqual(
+            self.fake_redis.hgetall("patient:mpn"), {b"111": b"1", b"222": b"2"}
+        )
+
+    def test_oldest_patient_keeps_duplicate_mpn(self):
+        """Test that the lowest ID keeps a shared MPN and the rest are reported."""
+        for patient_id in (12, 3, 7):
+            self.fake_redis.hset(f"patient:{patient_id}", mapping={"mpn": "555"})
+
+        result = maintenance.build_mpn_index(self.fake_redis)
+
+        self.assertEqual(result, {"indexed": 1, "duplicates": 2})
+        self.assertEqual(self.fake_redis.hgetall("patient:mpn"), {b"555": b"3"})
+
+    def test_idempotent(self):
+        """Test that running the migration twice gives the same index."""
+        self.fake_redis.hset("patient:4", mapping={"mpn": "444"})
+
+        maintenance.build_mpn_index(self.fake_redis)
+        result = maintenance.build_mpn_index(self.fake_redis)
+
+        self.assertEqual(result, {"indexed": 1, "duplicates": 0})
+        self.assertEqual(self.fake_redis.hgetall("patient:mpn"), {b"444": b"4"})
+
+
+class TestBuildSearchIndexes(TestMaintenance):
+    """Tests for the build-search-indexes migration."""
+
+    def test_indexes_surnames(self):
+        """Test that patients and doctors are indexed by casefolded surname."""
+        self.fake_redis.hset("patient:1", mapping={"surname": "Doe"})
+        self.fake_redis.hset("doctor:2", mapping={"surname": "Smith"})
+        self.fake_redis.hset("hospital:1", mapping={"name": "H"})
+
+        counts = maintenance.build_search_indexes(self.fake_redis)
+
+        self.assertEqual(counts, {"doctor:surnames": 1, "patient:surnames": 1})
+        self.assertEqual(
+            self.fake_redis.zrange("patient:surnames", 0, -1), [b"doe\x001"]
+        )
+        self.assertEqual(
+            self.fake_redis.zrange("doctor:surnames", 0, -1), [b"smith\x002"]
+        )
+
+
+class TestBuildReverseIndexes(TestMaintenance):
+    """Tests for the build-reverse-indexes migration."""
+
+    def test_indexes_doctors_by_hospital(self):
+        """Test that doctors are added to the set of their hospital."""
+        self.fake_redis.hset("doctor:1", mapping={"surname": "A", "hospital_ID": "7"})
+        self.fake_redis.hset("doctor:2", mapping={"surname": "B", "hospital_ID": ""})
+        self.fake_redis.hset("doctor:3", mapping={"surname": "C", "hospital_ID": "7"})
+
+        counts = maintenance.build_reverse_indexes(self.fake_redis)
+
+        self.assertEqual(counts["hospital-doctor:"], 2)
+        self.assertEqual(self.fake_redis.smembers("hospital-doctor:7"), {b"1", b"3"})
+
+    def test_indexes_diagnoses_and_doctors_by_patient(self):
+        """Test that diagnoses and linked doctors are added to their patient's sets."""
+        self.fake_redis.hset("diagnosis:1", mapping={"patient_ID": "4", "type": "Flu"})
+        self.fake_redis.hset("diagnosis:2", mapping={"patient_ID": "5", "type": "Flu"})
+        self.fake_redis.sadd("doctor-patient:1", "4", "5")
+        self.fake_redis.sadd("doctor-patient:2", "4")
+
+        counts = maintenance.build_reverse_indexes(self.fake_redis)
+
+        self.assertEqual(counts["patient-diagnosis:"], 2)
+        self.assertEqual(counts["patient-doctor:"], 3)
+        self.assertEqual(self.fake_redis.smembers("patient-diagnosis:4"), {b"1"})
+        self.assertEqual(self.fake_redis.smembers("patient-doctor:4"), {b"1", b"2"})
+        self.assertEqual(self.fake_redis.smembers("patient-doctor:5"), {b"1"})
+
+
+class TestRun(TestMaintenance):
+    """Tests for the command line entry point."""
+
+    def test_bumps_versions(self):
+        """Test that a command invalidates the cached list pages of every type."""
+        self.fake_redis.set("hospital:version", 4)
+
+        with patch("main.r", self.fake_redis):
+            maintenance.run(["build-id-indexes"])
+
+        self.assertEqual(self.fake_redis.get("hospital:version"), b"5")
+        self.assertEqual(self.fake_redis.get("doctor-patient:version"), b"1")